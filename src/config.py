@@ -25,6 +25,9 @@ class Config:
     # Model confidence threshold
     CONFIDENCE_THRESHOLD = 0.75
     
+    # Sequences per forward pass when several texts are analyzed together
+    INFERENCE_BATCH_SIZE = int(os.getenv('INFERENCE_BATCH_SIZE', 8))
+    
 
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     HOST = os.getenv('HOST', '0.0.0.0')
@@ -56,7 +59,10 @@ CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:9000,http://127.0.0.1
 # Session Configuration
 SESSION_TIMEOUT = int(os.getenv('SESSION_TIMEOUT', 3600))  # seconds
 MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', 100))
-SESSION_CLEANUP_INTERVAL = 300  # Clean up expired sessions every 5 minutes
+SESSION_CLEANUP_INTERVAL = int(os.getenv('SESSION_CLEANUP_INTERVAL', 300))  # Clean up expired sessions every 5 minutes
+MAX_SESSION_MEMORY = int(os.getenv('MAX_SESSION_MEMORY', 512 * 1024 * 1024))  # bytes per session store
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'process')  # process, memory or sqlite (shared across workers)
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', str(BASE_DIR / 'data' / 'sessions.db'))
 
 # Rate Limiting
 RATE_LIMIT = int(os.getenv('RATE_LIMIT', 60))  # requests per minute per IP
@@ -65,6 +71,36 @@ RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'memory')  # memory or redi
 # File Upload Configuration
 MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))  # 10MB default
 ALLOWED_EXTENSIONS = {'.txt', '.pdf', '.docx', '.xlsx', '.csv'}
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv('UPLOAD_SPOOL_THRESHOLD', 1024 * 1024))  # larger uploads are spooled to a temp file
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 64 * 1024))  # bytes read per chunk while streaming an upload
+MAX_AUDIO_SIZE = int(os.getenv('MAX_AUDIO_SIZE', 25 * 1024 * 1024))  # Whisper API limit
+
+# Document Storage (extracted text kept in memory-mapped per-session files)
+ENABLE_DOCUMENT_STORE = os.getenv('ENABLE_DOCUMENT_STORE', 'True').lower() == 'true'
+DOCUMENT_STORE_DIR = os.getenv('DOCUMENT_STORE_DIR', str(BASE_DIR / 'data' / 'documents'))
+DOCUMENT_PAGE_SIZE = int(os.getenv('DOCUMENT_PAGE_SIZE', 50000))  # max characters per document page
+
+# Document Result Cache (extracted text and entity spans by file content hash)
+ENABLE_DOCUMENT_CACHE = os.getenv('ENABLE_DOCUMENT_CACHE', 'True').lower() == 'true'
+DOCUMENT_CACHE_PATH = os.getenv('DOCUMENT_CACHE_PATH', str(BASE_DIR / 'data' / 'document_cache.db'))
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv('DOCUMENT_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # LRU eviction past this size
+
+# Background Jobs (document uploads with background=true)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))  # documents processed concurrently
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 100))  # queued jobs before uploads are rejected with 503
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 3600))  # seconds a finished job stays queryable
+
+# Multi-document Uploads (extraction overlaps batched inference)
+UPLOAD_EXTRACT_CONCURRENCY = int(os.getenv('UPLOAD_EXTRACT_CONCURRENCY', 4))  # files extracted at once
+
+# Document Extraction (process pool keeps parsers off the API process)
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', 2))  # 0 extracts in a thread instead
+EXTRACTION_TIMEOUT = float(os.getenv('EXTRACTION_TIMEOUT', 60))  # seconds per document
+PDF_PAGES_PER_SHARD = int(os.getenv('PDF_PAGES_PER_SHARD', 25))  # longer PDFs are split across workers; 0 disables
+STREAM_WINDOW_CHARS = int(os.getenv('STREAM_WINDOW_CHARS', 4000))  # characters per window in streaming analysis
+SPREADSHEET_BLOCK_ROWS = int(os.getenv('SPREADSHEET_BLOCK_ROWS', 500))  # rows per column batch in spreadsheet scans
+EXTRACTOR_BENCHMARKS = os.getenv('EXTRACTOR_BENCHMARKS', '')  # extractor_benchmark JSON output; ranks backends by speed
+LONG_DOCUMENT_MAX_CHARS = int(os.getenv('LONG_DOCUMENT_MAX_CHARS', 20_000_000))  # cap for long_document uploads (413 beyond)
 
 # OpenAI Configuration
 OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo-preview')
@@ -72,6 +108,19 @@ OPENAI_MAX_TOKENS = int(os.getenv('OPENAI_MAX_TOKENS', 2000))
 OPENAI_TEMPERATURE = float(os.getenv('OPENAI_TEMPERATURE', 0.3))
 OPENAI_TIMEOUT = int(os.getenv('OPENAI_TIMEOUT', 30))  # seconds
 
+# LLM Response Cache (keyed on masked prompts only, never raw PII)
+ENABLE_RESPONSE_CACHE = os.getenv('ENABLE_RESPONSE_CACHE', 'True').lower() == 'true'
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 3600))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+
+# Chat Prompt Budget (tokens counted locally for the target model)
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', 6000))
+CHAT_DOCUMENT_TOKEN_BUDGET = int(os.getenv('CHAT_DOCUMENT_TOKEN_BUDGET', 2500))
+
+# Document Retrieval (local BM25 over masked chunks)
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', 4))
+RETRIEVAL_CHUNK_SIZE = int(os.getenv('RETRIEVAL_CHUNK_SIZE', 800))  # characters
+
 # Input Validation
 MAX_TEXT_LENGTH = int(os.getenv('MAX_TEXT_LENGTH', 50000))  # characters
 MAX_MESSAGE_LENGTH = int(os.getenv('MAX_MESSAGE_LENGTH', 10000))  # characters
@@ -115,8 +164,17 @@ __all__ = [
     'DEBUG', 'LOG_LEVEL', 'SECRET_KEY', 'OPENAI_API_KEY',
     'HOST', 'PORT', 'MODEL_PATH', 'DEFAULT_MODEL_VERSION',
     'ALLOWED_HOSTS', 'CORS_ORIGINS', 'SESSION_TIMEOUT', 'MAX_SESSIONS',
+    'SESSION_CLEANUP_INTERVAL', 'MAX_SESSION_MEMORY', 'SESSION_BACKEND', 'SESSION_DB_PATH',
     'RATE_LIMIT', 'MAX_UPLOAD_SIZE', 'ALLOWED_EXTENSIONS',
+    'UPLOAD_SPOOL_THRESHOLD', 'UPLOAD_CHUNK_SIZE', 'MAX_AUDIO_SIZE',
+    'ENABLE_DOCUMENT_STORE', 'DOCUMENT_STORE_DIR', 'DOCUMENT_PAGE_SIZE',
+    'ENABLE_DOCUMENT_CACHE', 'DOCUMENT_CACHE_PATH', 'DOCUMENT_CACHE_MAX_BYTES',
+    'JOB_WORKERS', 'JOB_QUEUE_SIZE', 'JOB_RETENTION', 'UPLOAD_EXTRACT_CONCURRENCY',
+    'EXTRACTION_WORKERS', 'EXTRACTION_TIMEOUT', 'PDF_PAGES_PER_SHARD', 'STREAM_WINDOW_CHARS', 'SPREADSHEET_BLOCK_ROWS',
+    'EXTRACTOR_BENCHMARKS', 'LONG_DOCUMENT_MAX_CHARS',
     'OPENAI_MODEL', 'OPENAI_MAX_TOKENS', 'OPENAI_TEMPERATURE',
+    'ENABLE_RESPONSE_CACHE', 'RESPONSE_CACHE_TTL', 'RESPONSE_CACHE_MAX_ENTRIES',
+    'CHAT_CONTEXT_TOKEN_BUDGET', 'CHAT_DOCUMENT_TOKEN_BUDGET', 'RETRIEVAL_TOP_K', 'RETRIEVAL_CHUNK_SIZE',
     'MAX_TEXT_LENGTH', 'MAX_MESSAGE_LENGTH', 'SECURITY_HEADERS',
     'ENABLE_DOCUMENT_UPLOAD', 'ENABLE_PRIVACY_MODE', 'ENABLE_ENTITY_EXPORT'
 ]
\ No newline at end of file
@@ -4,7 +4,7 @@ from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from pydantic import BaseModel, ConfigDict
-from typing import List, Dict, Optional, Tuple, Union
+from typing import Any, AsyncIterator, Callable, Iterator, List, Dict, Optional, Tuple, Union
 import torch
 from transformers import AutoTokenizer, AutoModelForTokenClassification
 import os
@@ -21,6 +21,9 @@ import json
 import csv
 import io
 import hashlib
+import threading
+import time
+from array import array
 from datetime import datetime
 
 # Load environment variables
@@ -37,15 +40,157 @@ from src.models.camel_bert_model import CamelBertModel
 from src.models.entity_processor import EntityProcessor
 from src.models.entity_config import EntityConfig
 from src.models.document_processor import DocumentProcessor
-from src.config import Config
+from src.models.response_cache import ResponseCache
+from src.models.context_builder import ContextBuilder
+from src.models.document_index import DocumentIndex
+from src.models.compact_document import CompactDocument
+from src.models.document_store import DocumentStore
+from src.models.job_manager import JobManager, JobQueueFullError
+from src.models.streaming_detector import StreamingDetector
+from src.models.spreadsheet_scanner import SpreadsheetScanner
+from src.models.upload_spool import SpooledUpload, UploadTooLargeError, spool_upload
+from src.models.document_cache import DocumentResultCache
+from src.models.document_processor import DocumentSource
+from src.models.session_store import SessionStore, approximate_size
+from src.models.session_backend import SessionCodec, create_session_backend, empty_changes
+from src.config import (
+    Config, ENABLE_RESPONSE_CACHE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES,
+    CHAT_CONTEXT_TOKEN_BUDGET, CHAT_DOCUMENT_TOKEN_BUDGET, RETRIEVAL_TOP_K, RETRIEVAL_CHUNK_SIZE,
+    SESSION_TIMEOUT, MAX_SESSIONS, SESSION_CLEANUP_INTERVAL, MAX_SESSION_MEMORY,
+    SESSION_BACKEND, SESSION_DB_PATH, ENABLE_DOCUMENT_STORE, DOCUMENT_STORE_DIR, DOCUMENT_PAGE_SIZE,
+    JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RETENTION, UPLOAD_EXTRACT_CONCURRENCY,
+    EXTRACTION_WORKERS, EXTRACTION_TIMEOUT, PDF_PAGES_PER_SHARD, STREAM_WINDOW_CHARS, SPREADSHEET_BLOCK_ROWS,
+    EXTRACTOR_BENCHMARKS, LONG_DOCUMENT_MAX_CHARS, MAX_UPLOAD_SIZE, UPLOAD_SPOOL_THRESHOLD, UPLOAD_CHUNK_SIZE, MAX_AUDIO_SIZE,
+    ENABLE_DOCUMENT_CACHE, DOCUMENT_CACHE_PATH, DOCUMENT_CACHE_MAX_BYTES
+)
 
 # Application configuration
 APP_TITLE = "PII-Shield Demo"
 APP_DESCRIPTION = "Identify and extract sensitive information from text"
+CHAT_MODEL = "gpt-4.1"
 
 # Global state management
-chatbot_sessions = {}
-document_sessions = {}  # Store document content per session
+def _chatbot_memory(chatbot) -> int:
+    """Estimate memory held by a chat session: mappings, history and document context"""
+    return (
+        approximate_size(chatbot.entity_mappings)
+        + approximate_size(chatbot.reverse_mappings)
+        + approximate_size(chatbot.entity_counters)
+        + approximate_size(chatbot.conversation_history)
+        + approximate_size(chatbot.document_context)
+        + sum(approximate_size(context['masked_text']) for context in chatbot.masked_documents.values())
+    )
+
+def _document_session_memory(session: Dict) -> int:
+    """Estimate memory held by a document session: document texts, entity spans and retrieval index"""
+    size = sum(doc.memory_usage() for doc in session['documents'])
+    index = session.get('index')
+    if index is not None:
+        size += approximate_size(index.postings) + approximate_size(index.chunk_spans)
+    return size
+
+class ChatbotSessionCodec(SessionCodec):
+    """Persist a SimpleChatbot as its mapping fields plus an append-only conversation history"""
+
+    def export_state(self, chatbot) -> Dict:
+        return chatbot.export_state()
+
+    def collect_changes(self, chatbot) -> Dict:
+        return chatbot.collect_changes()
+
+    def restore(self, state: Dict):
+        return SimpleChatbot.from_state(state)
+
+class DocumentSessionCodec(SessionCodec):
+    """Persist a document session as one field per document plus the active document and order
+
+    The retrieval index is not stored; it is rebuilt from the documents on load.
+    """
+
+    def export_state(self, session: Dict) -> Dict:
+        changes = empty_changes()
+        for doc in session['documents']:
+            changes['fields'][f"doc:{doc.id}"] = doc.to_dict()
+        changes['fields']['doc_order'] = [doc.id for doc in session['documents']]
+        changes['fields']['active_doc'] = session['active_doc']
+        session['synced'] = {'doc_order': changes['fields']['doc_order'], 'active_doc': session['active_doc']}
+        return changes
+
+    def collect_changes(self, session: Dict) -> Dict:
+        changes = empty_changes()
+        synced = session.get('synced', {'doc_order': [], 'active_doc': None})
+        doc_order = [doc.id for doc in session['documents']]
+        if doc_order != synced['doc_order']:
+            known = set(synced['doc_order'])
+            for doc in session['documents']:
+                if doc.id not in known:
+                    changes['fields'][f"doc:{doc.id}"] = doc.to_dict()
+            changes['removed'] = [f"doc:{doc_id}" for doc_id in known - set(doc_order)]
+            changes['fields']['doc_order'] = doc_order
+        if session['active_doc'] != synced['active_doc']:
+            changes['fields']['active_doc'] = session['active_doc']
+        session['synced'] = {'doc_order': doc_order, 'active_doc': session['active_doc']}
+        return changes
+
+    def restore(self, state: Dict) -> Dict:
+        fields = state['fields']
+        doc_order = [doc_id for doc_id in fields.get('doc_order', []) if f"doc:{doc_id}" in fields]
+        documents = [CompactDocument.from_dict(fields[f"doc:{doc_id}"]) for doc_id in doc_order]
+        index = DocumentIndex(chunk_size=RETRIEVAL_CHUNK_SIZE)
+        for doc in documents:
+            index.add_document(doc.id, doc.original_text, doc.entities)
+        return {
+            'documents': documents,
+            'active_doc': fields.get('active_doc'),
+            'index': index,
+            'synced': {'doc_order': doc_order, 'active_doc': fields.get('active_doc')}
+        }
+
+# "process" keeps live objects only; "memory"/"sqlite" store serialized state behind the live objects
+session_backend = create_session_backend(SESSION_BACKEND, SESSION_DB_PATH)
+document_store = DocumentStore(DOCUMENT_STORE_DIR) if ENABLE_DOCUMENT_STORE else None
+
+def _release_document_files(session_id, _=None):
+    """Delete a document session's memory-mapped file"""
+    if document_store is not None:
+        document_store.drop_session(session_id)
+
+def _drop_document_session(session_id):
+    """Remove a session's documents together with their file"""
+    document_sessions.discard(session_id)
+    _release_document_files(session_id)
+
+# Bounded by SESSION_TIMEOUT / MAX_SESSIONS / MAX_SESSION_MEMORY and swept every SESSION_CLEANUP_INTERVAL
+document_sessions = SessionStore(
+    "document_sessions", MAX_SESSIONS, SESSION_TIMEOUT,
+    max_bytes=MAX_SESSION_MEMORY, size_of=_document_session_memory,
+    on_release=_release_document_files,  # also when only this worker's cached copy is dropped
+    backend=session_backend, codec=DocumentSessionCodec()
+)  # Store document content per session
+chatbot_sessions = SessionStore(
+    "chatbot_sessions", MAX_SESSIONS, SESSION_TIMEOUT,
+    max_bytes=MAX_SESSION_MEMORY, size_of=_chatbot_memory,
+    on_evict=lambda session_id, _: _drop_document_session(session_id),  # Expired chat takes its documents with it
+    backend=session_backend, codec=ChatbotSessionCodec()
+)
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESPONSE_CACHE_TTL,
+    enabled=ENABLE_RESPONSE_CACHE
+)  # Shared across sessions; keyed on masked prompts only
+context_builder = ContextBuilder(
+    model=CHAT_MODEL,
+    token_budget=CHAT_CONTEXT_TOKEN_BUDGET,
+    document_token_budget=CHAT_DOCUMENT_TOKEN_BUDGET
+)
+job_manager = JobManager(
+    max_workers=JOB_WORKERS,
+    max_queue=JOB_QUEUE_SIZE,
+    retention_seconds=JOB_RETENTION,
+    backend=session_backend
+)  # Background document processing; workers started in lifespan, state visible to all workers with SESSION_BACKEND=sqlite
+
+document_result_cache: Optional[DocumentResultCache] = None  # opened in lifespan once the model version is known
 
 # FastAPI application with lifespan for model loading
 @asynccontextmanager
@@ -53,7 +198,9 @@ async def lifespan(app: FastAPI):
     # Load models at startup
     logger.info("Loading models...")
     app.state.model_factory = ModelFactory()
-    app.state.document_processor = DocumentProcessor()
+    app.state.document_processor = DocumentProcessor(
+        EXTRACTION_WORKERS, EXTRACTION_TIMEOUT, PDF_PAGES_PER_SHARD, EXTRACTOR_BENCHMARKS
+    )
     
     logger.info("Pre-loading v2 model for faster document uploads...")
     model = app.state.model_factory.get_model("v2")
@@ -62,10 +209,35 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("Failed to pre-load v2 model")
     
+    # Analysis results of previously seen files, invalidated by extractor/model version
+    global document_result_cache
+    if ENABLE_DOCUMENT_CACHE and model:
+        document_result_cache = DocumentResultCache(
+            DOCUMENT_CACHE_PATH,
+            DOCUMENT_CACHE_MAX_BYTES,
+            extractor_version=app.state.document_processor.extractor_fingerprint(),
+            model_version=model.version_fingerprint()
+        )
+    
+    # Background sweepers expire idle sessions and enforce memory limits
+    sweeper_tasks = [
+        asyncio.create_task(chatbot_sessions.run_sweeper(SESSION_CLEANUP_INTERVAL)),
+        asyncio.create_task(document_sessions.run_sweeper(SESSION_CLEANUP_INTERVAL))
+    ]
+    
+    # Bounded worker pool for background upload jobs
+    job_manager.start()
+    
     yield
     # Clean up at shutdown
+    for task in sweeper_tasks:
+        task.cancel()
+    await job_manager.stop()
     app.state.model_factory = None
     app.state.document_processor.cleanup_temp_files()
+    app.state.document_processor.close()
+    if document_store is not None:
+        document_store.close()
     logger.info("Application shutdown, releasing resources.")
 
 app = FastAPI(title=APP_TITLE, description=APP_DESCRIPTION, lifespan=lifespan)
@@ -80,6 +252,7 @@ class TextRequest(BaseModel):
 
     text: str
     model_version: str
+    render: bool = True
 
 class EntityResult(BaseModel):
     text: str
@@ -129,21 +302,18 @@ async def set_welcome_complete():
 
 
 
-@app.post("/api/extract", response_model=TextResponse)
-async def extract_entities(request: TextRequest):
-    """Extract entities from text"""
-    logger.info(f"Extracting entities with model version: {request.model_version}")
-    
+def _extract_model(model_version: str):
+    """Model used by the text extraction endpoints, checking its files first"""
     # Check v3 separately since it doesn't need file loading
-    if request.model_version == "v3":
-        model = app.state.model_factory.get_model(request.model_version)
+    if model_version == "v3":
+        model = app.state.model_factory.get_model(model_version)
         if not model:
             logger.error("CamelBert model loading failed")
             raise HTTPException(status_code=500, detail="Failed to load CamelBert model")
     else:
         # For v1 and v2, verify model files exist
         from src.models.model_config import ModelConfig
-        model_info = ModelConfig.get_model_info(request.model_version)
+        model_info = ModelConfig.get_model_info(model_version)
         checkpoint_path = model_info.get("checkpoint")
         
         if not checkpoint_path or not os.path.exists(checkpoint_path):
@@ -151,14 +321,29 @@ async def extract_entities(request: TextRequest):
             raise HTTPException(status_code=404, detail=f"Model file not found. Please check if model files are correctly placed.")
             
         # Get model if files exist
-        model = app.state.model_factory.get_model(request.model_version)
+        model = app.state.model_factory.get_model(model_version)
     
     if not model:
-        logger.error(f"Failed to load model: {request.model_version}")
-        raise HTTPException(status_code=400, detail=f"Invalid model version or model loading error: {request.model_version}")
+        logger.error(f"Failed to load model: {model_version}")
+        raise HTTPException(status_code=400, detail=f"Invalid model version or model loading error: {model_version}")
+    return model
+
+@app.post("/api/extract", response_model=TextResponse)
+async def extract_entities(request: TextRequest):
+    """Extract entities from text
+    
+    With `render` false, no highlighted HTML is rendered and entities are
+    returned as parallel arrays (see `EntityProcessor.entity_columns`) plus
+    `entity_counts`, without a validated model per entity.
+    """
+    logger.info(f"Extracting entities with model version: {request.model_version}")
+    model = _extract_model(request.model_version)
+    entity_processor = EntityProcessor()
     
     # Process text
     if not request.text.strip():
+        if not request.render:
+            return JSONResponse({**entity_processor.entity_columns([]), 'entity_counts': {}})
         return TextResponse(highlighted_text="", entities=[], entity_counts={})
     
     try:
@@ -166,12 +351,15 @@ async def extract_entities(request: TextRequest):
         entities = model.predict(request.text)
         
         # Process entities for display
-        entity_processor = EntityProcessor()
         # Split any combined entities first
         split_entities = entity_processor.split_combined_entities(request.text, entities)
-        highlighted_text = entity_processor.highlight_entities_in_text(request.text, entities)
         entity_counts = entity_processor.get_entity_stats(split_entities)
         
+        if not request.render:
+            return JSONResponse({**entity_processor.entity_columns(split_entities), 'entity_counts': entity_counts})
+        
+        highlighted_text = entity_processor.highlight_entities_in_text(request.text, entities)
+        
         # Convert to API response format using split entities
         entity_results = [
             EntityResult(
@@ -192,6 +380,55 @@ async def extract_entities(request: TextRequest):
         raise HTTPException(status_code=500, detail=f"Error processing text: {str(e)}")
 
 
+@app.post("/api/extract/stream")
+async def extract_entities_stream(request: TextRequest):
+    """Extract entities from text, streaming the highlighted HTML as it is produced
+    
+    The text is analyzed in windows of whole lines, like a streamed document,
+    and each window's highlighted HTML is sent as soon as it is ready, so the
+    first part can be shown before the rest of a large text is analyzed.
+    Concatenating the `html` of all lines gives the whole highlighted text.
+    Entity offsets are into the whole text. Lines:
+    
+        {"event": "html", "html", "entities"}
+        {"event": "done", "entity_counts"}
+        {"event": "error", "error"}
+    """
+    logger.info(f"Streaming entity extraction with model version: {request.model_version}")
+    model = _extract_model(request.model_version)
+    detector = StreamingDetector(model, STREAM_WINDOW_CHARS, Config.INFERENCE_BATCH_SIZE)
+    entity_processor = EntityProcessor()
+    
+    async def generate():
+        entity_counts: Dict[str, int] = {}
+        windows = _iterate_in_thread(lambda: detector.detect(request.text.split('\n')))
+        try:
+            async for offset, text, entities in windows:
+                for entity in entities:
+                    entity_counts[entity[1]] = entity_counts.get(entity[1], 0) + 1
+                html = ''.join(entity_processor.iter_highlight_fragments(
+                    text, [(entity_text, entity_type, start - offset, end - offset)
+                           for entity_text, entity_type, start, end in entities]
+                ))
+                yield json.dumps({
+                    'event': 'html',
+                    'html': ('\n' if offset else '') + html,
+                    'entities': [
+                        {'text': entity_text, 'entity_type': entity_type, 'start': start, 'end': end}
+                        for entity_text, entity_type, start, end in entities
+                    ]
+                }) + "\n"
+        except Exception as e:
+            logger.exception(f"Error streaming text extraction: {str(e)}")
+            yield json.dumps({'event': 'error', 'error': str(e)}) + "\n"
+            return
+        finally:
+            # Stop the detection thread when the client disconnects
+            await windows.aclose()
+        yield json.dumps({'event': 'done', 'entity_counts': entity_counts}) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @app.get("/welcome", response_class=HTMLResponse)
 async def welcome(request: Request):
     """Display welcome screen"""
@@ -236,6 +473,7 @@ class PrivacyChatRequest(BaseModel):
     message: str
     privacy_mode: bool = True
     session_id: Optional[int] = 1
+    use_response_cache: Optional[bool] = None  # Opt the session in or out of the shared response cache (kept for later messages)
 
 class PrivacyChatResponse(BaseModel):
     original_message: str
@@ -246,6 +484,9 @@ class PrivacyChatResponse(BaseModel):
     response_entities: Optional[List[Dict]] = None
 
 class SimpleChatbot:
+    # Session fields persisted as whole values; the conversation history is persisted as an append-only list
+    STATE_FIELDS = ('entity_mappings', 'reverse_mappings', 'entity_counters', 'document_context', 'use_response_cache')
+
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.gemini_api_key = os.getenv("GOOGLE_API_KEY")  # Fallback provider (Gemini 2.5 Flash)
@@ -253,8 +494,14 @@ class SimpleChatbot:
         self.reverse_mappings = {}  # Masked -> Original
         self.entity_counters = {}  # Track entity numbering
         self.conversation_history = []  # Store conversation history for context
-        self.max_history_length = 10  # Keep last 10 messages for context
+        self.max_history_length = 10  # Keep last 10 exchanges; the context builder decides how many fit the prompt
         self.document_context = None  # Store current document context
+        self.masked_documents = {}  # doc_id -> masked document context, built once per session
+        self.document_index = None  # Session-wide retrieval index over all uploaded documents
+        self.indexed_documents = {}  # doc_id -> document data covered by document_index
+        self.use_response_cache = ENABLE_RESPONSE_CACHE  # Per-session opt-out of the shared response cache
+        self._dirty_fields = set()  # STATE_FIELDS changed since the last commit to the session backend
+        self._pending_history = []  # History messages not yet written to the session backend
         logger.info(f"SimpleChatbot initialized with API key: {'***' + (self.api_key[-4:] if self.api_key else 'None')}")
         logger.info(f"SimpleChatbot Gemini fallback key: {'***' + (self.gemini_api_key[-4:] if self.gemini_api_key else 'None')}")
         logger.info(f"SimpleChatbot initialized with fresh entity_counters: {self.entity_counters}")
@@ -326,6 +573,7 @@ class SimpleChatbot:
         # Store bidirectional mapping
         self.entity_mappings[original_text] = placeholder
         self.reverse_mappings[placeholder] = original_text
+        self._dirty_fields.update(('entity_mappings', 'reverse_mappings', 'entity_counters'))
         
         return placeholder
 
@@ -339,19 +587,24 @@ class SimpleChatbot:
         
         filtered = []
         for entity in sorted_entities:
-            # Check if this entity overlaps with any already selected entity
+            # Selected entities don't overlap and were added in start order, so only
+            # the trailing ones that end after this entity starts can overlap it
+            index = len(filtered)
+            while index > 0 and filtered[index - 1]['end'] > entity['start']:
+                index -= 1
             overlaps = False
-            for selected in filtered:
-                # Check for any overlap
+            while index < len(filtered):
+                selected = filtered[index]
                 if not (entity['end'] <= selected['start'] or entity['start'] >= selected['end']):
                     # There is overlap - keep the longer entity
                     if (entity['end'] - entity['start']) > (selected['end'] - selected['start']):
                         # Current entity is longer, replace the selected one
-                        filtered.remove(selected)
-                    else:
-                        # Selected entity is longer or equal, skip current
-                        overlaps = True
-                        break
+                        del filtered[index]
+                        continue
+                    # Selected entity is longer or equal, skip current
+                    overlaps = True
+                    break
+                index += 1
             
             if not overlaps:
                 filtered.append(entity)
@@ -386,6 +639,7 @@ class SimpleChatbot:
     def chat_with_ai(self, masked_message: str) -> str:
         """Get AI response using OpenAI, falling back to Gemini 2.5 Flash, then static responses."""
         messages = []  # built below; declared here so the Gemini fallback is safe even on early errors
+        cache_key = None
         try:
             if not self.api_key:
                 logger.error(f"No OpenAI API key found. API key value: '{self.api_key}' (length: {len(self.api_key or '')})")
@@ -397,11 +651,8 @@ class SimpleChatbot:
                 "Content-Type": "application/json"
             }
             
-            # Build messages with enhanced Omani cultural prompt
-            messages = [
-                {
-                    "role": "system", 
-                    "content": """You are Blot (بلوت in Arabic), an intelligent, knowledgeable, and helpful AI assistant. Your name is Blot — never refer to yourself by any other name. You can discuss any topic, provide information, help with problems, engage in casual conversation. You should be conversational, friendly, and naturally helpful.
+            # Enhanced Omani cultural prompt
+            system_prompt = """You are Blot (بلوت in Arabic), an intelligent, knowledgeable, and helpful AI assistant. Your name is Blot — never refer to yourself by any other name. You can discuss any topic, provide information, help with problems, engage in casual conversation. You should be conversational, friendly, and naturally helpful.
 
 ABOUT YOURSELF:
 - When the user asks about you (e.g. "who are you", "what do you know about yourself", "من أنت"), introduce yourself as Blot, an Omani assistant here to help with anything while keeping the user's data safe and private.
@@ -435,23 +686,24 @@ CAPABILITIES:
 - Provide explanations, advice, and recommendations
 - Be curious and ask clarifying questions when needed
 Respond naturally as if you were having a conversation with a friend who asked for your help."""
-                }
-            ]
 
-            # Add conversation history for context (last 5 exchanges)
-            for msg in self.conversation_history[-10:]:  # Last 10 messages (5 exchanges)
-                messages.append(msg)
-            
-            # Add current message
-            messages.append({"role": "user", "content": masked_message})
+            # Pack system prompt, history (newest first) and current message into the token budget
+            messages = context_builder.build(system_prompt, self.conversation_history, masked_message)
             
             data = {
-                "model": "gpt-4.1",
+                "model": CHAT_MODEL,
                 "messages": messages,
                 "max_tokens": 1000,
                 "temperature": 0.7
             }
             
+            # Serve repeated masked prompts from the shared cache and skip the provider call
+            cache_key = self._response_cache_key(messages, "chat", data)
+            cached_response = self._get_cached_response(cache_key)
+            if cached_response is not None:
+                self._remember_exchange(masked_message, cached_response)
+                return cached_response
+            
             response = requests.post(
                 "https://api.openai.com/v1/chat/completions",
                 headers=headers,
@@ -463,14 +715,10 @@ Respond naturally as if you were having a conversation with a friend who asked f
                 result = response.json()
                 ai_response = result["choices"][0]["message"]["content"]
                 logger.info(f"OpenAI response: {ai_response}")
+                self._store_cached_response(cache_key, ai_response)
                 
                 # Add to conversation history for context
-                self.conversation_history.append({"role": "user", "content": masked_message})
-                self.conversation_history.append({"role": "assistant", "content": ai_response})
-                
-                # Keep only last N messages to avoid token limit
-                if len(self.conversation_history) > self.max_history_length * 2:
-                    self.conversation_history = self.conversation_history[-(self.max_history_length * 2):]
+                self._remember_exchange(masked_message, ai_response)
                 
                 return ai_response
             else:
@@ -481,10 +729,8 @@ Respond naturally as if you were having a conversation with a friend who asked f
                 ai_response = self._chat_with_gemini(messages, max_tokens=1000, temperature=0.7)
                 if ai_response is None:
                     return self.fallback_response(masked_message)
-                self.conversation_history.append({"role": "user", "content": masked_message})
-                self.conversation_history.append({"role": "assistant", "content": ai_response})
-                if len(self.conversation_history) > self.max_history_length * 2:
-                    self.conversation_history = self.conversation_history[-(self.max_history_length * 2):]
+                self._store_cached_response(cache_key, ai_response)
+                self._remember_exchange(masked_message, ai_response)
                 return ai_response
             
         except Exception as e:
@@ -493,12 +739,80 @@ Respond naturally as if you were having a conversation with a friend who asked f
             ai_response = self._chat_with_gemini(messages, max_tokens=1000, temperature=0.7)
             if ai_response is None:
                 return self.fallback_response(masked_message)
-            self.conversation_history.append({"role": "user", "content": masked_message})
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
-            if len(self.conversation_history) > self.max_history_length * 2:
-                self.conversation_history = self.conversation_history[-(self.max_history_length * 2):]
+            self._store_cached_response(cache_key, ai_response)
+            self._remember_exchange(masked_message, ai_response)
             return ai_response
     
+    def _remember_exchange(self, masked_message: str, ai_response: str):
+        """Store a masked exchange in the history, keeping the last N exchanges
+
+        Prompt size is bounded separately by the token-budgeted context builder.
+        """
+        self.append_history({"role": "user", "content": masked_message})
+        self.append_history({"role": "assistant", "content": ai_response})
+
+    def append_history(self, message: Dict):
+        """Append a message to the conversation history, keeping the last N exchanges"""
+        self.conversation_history.append(message)
+        self._pending_history.append(message)
+        if len(self.conversation_history) > self.max_history_length * 2:
+            self.conversation_history = self.conversation_history[-(self.max_history_length * 2):]
+
+    def export_state(self) -> Dict:
+        """Return the full session state as plain data for a session backend"""
+        self._dirty_fields.clear()
+        self._pending_history = []
+        return {
+            'fields': {name: getattr(self, name) for name in self.STATE_FIELDS},
+            'appends': {'conversation_history': list(self.conversation_history)}
+        }
+
+    def collect_changes(self) -> Dict:
+        """Return the fields changed and messages added since the last export or collection"""
+        changes = {
+            'fields': {name: getattr(self, name) for name in self._dirty_fields},
+            'appends': {},
+            'trims': {}
+        }
+        if self._pending_history:
+            changes['appends']['conversation_history'] = self._pending_history
+            changes['trims']['conversation_history'] = self.max_history_length * 2
+        self._dirty_fields.clear()
+        self._pending_history = []
+        return changes
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'SimpleChatbot':
+        """Rebuild a chatbot from state loaded from a session backend"""
+        chatbot = cls()
+        for name in cls.STATE_FIELDS:
+            if name in state['fields']:
+                setattr(chatbot, name, state['fields'][name])
+        chatbot.conversation_history = state['lists'].get('conversation_history', [])[-(chatbot.max_history_length * 2):]
+        if chatbot.document_context and chatbot.document_context.get('doc_id') is not None:
+            chatbot.masked_documents[chatbot.document_context['doc_id']] = chatbot.document_context
+        return chatbot
+
+    def _response_cache_key(self, messages: List[Dict], prompt_variant: str, data: Dict) -> Optional[str]:
+        """Build the shared response cache key for a masked request, or None when caching is off"""
+        if not self.use_response_cache or not response_cache.enabled:
+            return None
+        return ResponseCache.make_key(messages, prompt_variant, data["model"], data["temperature"])
+
+    def _get_cached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        """Look up a cached LLM response for a masked request"""
+        if cache_key is None:
+            return None
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info("Serving LLM response from cache (masked prompt hit)")
+        return cached_response
+
+    def _store_cached_response(self, cache_key: Optional[str], ai_response: str):
+        """Cache a provider response; static fallbacks are never cached"""
+        if cache_key is not None:
+            response_cache.set(cache_key, ai_response)
+
     def fallback_response(self, masked_message: str) -> str:
         """Fallback response when OpenAI fails - Omani style"""
         if "person" in masked_message.lower():
@@ -634,6 +948,7 @@ You are the assistant Blot answering the user directly. Do not mention which mod
     def unmask_response(self, masked_response: str) -> str:
         """Replace placeholders in response with original entities"""
         unmasked = masked_response
+        mappings_before = len(self.reverse_mappings)
         
         # Log the mappings for debugging
         logger.info(f"=== UNMASK_RESPONSE START ===")
@@ -708,6 +1023,9 @@ You are the assistant Blot answering the user directly. Do not mention which mod
                         self.reverse_mappings[placeholder] = original
                         logger.info(f"Mapped {placeholder} to {original} (fallback to last)")
         
+        if len(self.reverse_mappings) != mappings_before:
+            self._dirty_fields.add('reverse_mappings')
+        
         # Sort placeholders by length (longest first) to avoid partial replacements
         sorted_mappings = sorted(self.reverse_mappings.items(), key=lambda x: len(x[0]), reverse=True)
         
@@ -748,42 +1066,88 @@ You are the assistant Blot answering the user directly. Do not mention which mod
         logger.info(f"Final unmasked: {unmasked}")
         return unmasked
     
-    def set_document_context(self, document_data: Dict):
-        """Set the current document context for AI to reference"""
-        if document_data:
-            # Create a masked version of the document for AI context
-            doc_entities = document_data.get('entities', [])
-            original_text = document_data.get('original_text', '')
-            
-            # Process document entities to create mappings
-            for entity in doc_entities:
-                self.get_or_create_placeholder(entity['text'], entity['entity_type'])
-            
-            # Mask the document text
-            masked_doc_text = self.mask_entities(original_text, doc_entities)
+    def set_document_context(self, document_data: Optional[CompactDocument]):
+        """Set the current document context for AI to reference
+        
+        Placeholders are never reassigned within a session, so a document's masked
+        text stays valid once built: it is masked on first use and reused on later
+        turns and when switching back to it.
+        """
+        if document_data is not None:
+            doc_id = document_data.id
+            if self.document_context and self.document_context.get('doc_id') == doc_id:
+                return
             
-            self.document_context = {
-                'filename': document_data.get('filename', 'document'),
-                'original_text': original_text,
-                'masked_text': masked_doc_text,
-                'entities': doc_entities,
-                'word_count': document_data.get('word_count', 0),
-                'uploaded_at': document_data.get('uploaded_at', '')
-            }
-            logger.info(f"Document context set: {document_data.get('filename', 'Unknown')}")
+            context = self.masked_documents.get(doc_id)
+            if context is None:
+                context = self._build_document_context(document_data)
+                self.masked_documents[doc_id] = context
+            self.document_context = context
+            logger.info(f"Document context set: {document_data.filename}")
         else:
             self.document_context = None
             logger.info("Document context cleared")
+        self._dirty_fields.add('document_context')
+    
+    def set_response_cache(self, enabled: bool) -> None:
+        """Opt this session in or out of the shared response cache"""
+        if enabled != self.use_response_cache:
+            self.use_response_cache = enabled
+            self._dirty_fields.add('use_response_cache')
+    
+    def _build_document_context(self, document_data: CompactDocument) -> Dict:
+        """Mask a document with this session's placeholders
+        
+        Only the masked text is kept; the original text and entities stay on the document.
+        """
+        doc_entities = document_data.entities
+        
+        # Process document entities to create mappings
+        for entity in doc_entities:
+            self.get_or_create_placeholder(entity['text'], entity['entity_type'])
+        
+        # Mask the document text
+        masked_doc_text = self.mask_entities(document_data.original_text, doc_entities)
+        
+        return {
+            'doc_id': document_data.id,
+            'filename': document_data.filename,
+            'masked_text': masked_doc_text,
+            'word_count': document_data.word_count,
+            'uploaded_at': document_data.uploaded_at
+        }
+    
+    def forget_document(self, doc_id: str):
+        """Drop a deleted document's cached masked context"""
+        self.masked_documents.pop(doc_id, None)
+        if self.document_context and self.document_context.get('doc_id') == doc_id:
+            self.document_context = None
+            self._dirty_fields.add('document_context')
     
     def has_document_context(self) -> bool:
         """Check if there's an active document context"""
         return self.document_context is not None
     
-    def get_document_summary(self) -> str:
-        """Get a summary of the current document for AI context"""
+    def set_document_index(self, document_index: Optional[DocumentIndex], documents: List[CompactDocument]):
+        """Attach the session's retrieval index and the documents it covers"""
+        self.document_index = document_index
+        self.indexed_documents = {doc.id: doc for doc in documents} if document_index else {}
+    
+    def get_document_summary(self, query: Optional[str] = None) -> str:
+        """Get a summary of the current document for AI context
+        
+        When a masked query is given and the session has a retrieval index, the
+        most relevant chunks across all session documents are used instead of
+        the fixed preview of the active document.
+        """
         if not self.document_context:
             return ""
         
+        if query and self.document_index is not None and len(self.document_index):
+            excerpts = self.get_relevant_excerpts(query)
+            if excerpts:
+                return excerpts
+        
         doc = self.document_context
         summary = f"Document: {doc['filename']}\n"
         summary += f"Word count: {doc['word_count']}\n"
@@ -797,9 +1161,32 @@ You are the assistant Blot answering the user directly. Do not mention which mod
         summary += preview
         return summary
     
+    def get_relevant_excerpts(self, query: str) -> str:
+        """Retrieve the top-k chunks for a masked query, masked with this session's placeholders"""
+        hits = self.document_index.search(query, top_k=RETRIEVAL_TOP_K)
+        if not hits:
+            return ""
+        
+        filenames = [doc.filename for doc in self.indexed_documents.values()]
+        summary = f"Documents: {', '.join(filenames)}\n"
+        summary += "Relevant excerpts:\n"
+        
+        for hit in hits:
+            doc = self.indexed_documents.get(hit['doc_id'])
+            if not doc:
+                continue
+            start, end = hit['start'], hit['end']
+            # Chunk boundaries never split an entity, so every entity is either fully inside or outside
+            excerpt_entities = doc.entities_in(start, end, relative=True)
+            masked_excerpt = self.mask_entities(doc.text_slice(start, end), excerpt_entities)
+            summary += f"\n[{doc.filename}]\n{masked_excerpt.strip()}\n"
+        
+        return summary
+    
     def chat_with_ai_document_context(self, masked_message: str) -> str:
         """Enhanced chat method (OpenAI with Gemini 2.5 Flash fallback) that includes document context"""
         messages = []  # built below; declared here so the Gemini fallback is safe even on early errors
+        cache_key = None
         if not self.api_key:
             logger.error("No OpenAI API key found for document chat - will try Gemini 2.5 Flash")
 
@@ -856,30 +1243,29 @@ CAPABILITIES:
 
 Respond naturally as if you were having a conversation with a friend who asked for your help."""
             
-            messages = [{"role": "system", "content": system_prompt}]
-            
             # Add document context if available
+            document_context = None
             if self.has_document_context():
-                doc_context = f"\n\nDOCUMENT CONTEXT:\n{self.get_document_summary()}\n"
-                messages.append({
-                    "role": "system", 
-                    "content": f"You now have access to a document. Use this context to answer questions about the document:{doc_context}"
-                })
+                doc_context = f"\n\nDOCUMENT CONTEXT:\n{self.get_document_summary(masked_message)}\n"
+                document_context = f"You now have access to a document. Use this context to answer questions about the document:{doc_context}"
             
-            # Add conversation history for context (last 10 messages)
-            for msg in self.conversation_history[-10:]:
-                messages.append(msg)
-            
-            # Add current message
-            messages.append({"role": "user", "content": masked_message})
+            # Pack system prompt, document context, history (newest first) and current message into the token budget
+            messages = context_builder.build(system_prompt, self.conversation_history, masked_message, document_context)
             
             data = {
-                "model": "gpt-4.1",
+                "model": CHAT_MODEL,
                 "messages": messages,
                 "max_tokens": 3000 if self.has_document_context() else 1000,  # More tokens for document analysis
                 "temperature": 0.7
             }
             
+            # Serve repeated masked prompts from the shared cache and skip the provider call
+            cache_key = self._response_cache_key(messages, "document", data)
+            cached_response = self._get_cached_response(cache_key)
+            if cached_response is not None:
+                self._remember_exchange(masked_message, cached_response)
+                return cached_response
+            
             response = requests.post(
                 "https://api.openai.com/v1/chat/completions",
                 headers=headers,
@@ -891,37 +1277,31 @@ Respond naturally as if you were having a conversation with a friend who asked f
                 result = response.json()
                 ai_response = result["choices"][0]["message"]["content"]
                 logger.info(f"OpenAI response (with document context): {ai_response}")
+                self._store_cached_response(cache_key, ai_response)
                 
                 # Store in conversation history
-                self.conversation_history.append({"role": "user", "content": masked_message})
-                self.conversation_history.append({"role": "assistant", "content": ai_response})
-                
-                # Trim history if too long
-                if len(self.conversation_history) > self.max_history_length:
-                    self.conversation_history = self.conversation_history[-self.max_history_length:]
+                self._remember_exchange(masked_message, ai_response)
                 
                 return ai_response
             else:
                 logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
-                return self._gemini_fallback_with_document(messages, masked_message)
+                return self._gemini_fallback_with_document(messages, masked_message, cache_key)
 
         except requests.RequestException as e:
             logger.error(f"Request error: {e}")
-            return self._gemini_fallback_with_document(messages, masked_message)
+            return self._gemini_fallback_with_document(messages, masked_message, cache_key)
         except Exception as e:
             logger.error(f"Unexpected error in chat_with_ai_document_context: {e}")
-            return self._gemini_fallback_with_document(messages, masked_message)
+            return self._gemini_fallback_with_document(messages, masked_message, cache_key)
 
-    def _gemini_fallback_with_document(self, messages: List[Dict], masked_message: str) -> str:
+    def _gemini_fallback_with_document(self, messages: List[Dict], masked_message: str, cache_key: Optional[str] = None) -> str:
         """Try Gemini 2.5 Flash with the same prompt + document context; else the static document fallback."""
         max_tokens = 3000 if self.has_document_context() else 1000
         ai_response = self._chat_with_gemini(messages, max_tokens=max_tokens, temperature=0.7)
         if ai_response is None:
             return self._get_fallback_response_with_document()
-        self.conversation_history.append({"role": "user", "content": masked_message})
-        self.conversation_history.append({"role": "assistant", "content": ai_response})
-        if len(self.conversation_history) > self.max_history_length:
-            self.conversation_history = self.conversation_history[-self.max_history_length:]
+        self._store_cached_response(cache_key, ai_response)
+        self._remember_exchange(masked_message, ai_response)
         return ai_response
     
     def _get_fallback_response_with_document(self) -> str:
@@ -946,9 +1326,484 @@ Respond naturally as if you were having a conversation with a friend who asked f
 
 
 # Document processing endpoints
+DOCUMENT_UPLOAD_STAGES = ['extract', 'detect', 'mask']
+
+async def _spool_upload(file: UploadFile, max_size: int = MAX_UPLOAD_SIZE, suffix: str = '') -> SpooledUpload:
+    """Read an upload in chunks (see `spool_upload`), rejecting it with 413 once it exceeds `max_size`"""
+    read_start = time.time()
+    try:
+        upload = await spool_upload(file, max_size, UPLOAD_SPOOL_THRESHOLD, UPLOAD_CHUNK_SIZE, suffix)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    logger.info(f"File read time: {(time.time() - read_start) * 1000:.2f}ms for {file.filename} ({upload.size} bytes)")
+    return upload
+
+async def _extract_document_upload(filename: str, file_content: DocumentSource) -> Dict:
+    """Extract text from an uploaded file, raising 400 if it cannot be processed"""
+    process_start = time.time()
+    doc_processor = app.state.document_processor
+    result = await doc_processor.process_document(file_content, filename)
+    logger.info(f"Document processing time: {(time.time() - process_start) * 1000:.2f}ms")
+    
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['error'])
+    return result
+
+def _upload_model():
+    """PII model used to analyze uploaded documents"""
+    model_factory = app.state.model_factory
+    model = model_factory.get_model("v2")
+    
+    if not model:
+        raise HTTPException(status_code=500, detail="Model not available")
+    return model
+
+def _new_document_id(session_id: int, filename: str) -> str:
+    return hashlib.md5(f"{session_id}_{filename}_{datetime.now().isoformat()}".encode()).hexdigest()[:12]
+
+def _build_document(session_id: int, filename: str, result: Dict, entities_tuples) -> CompactDocument:
+    """Split detected entities and build the compact document for an extraction result"""
+    entity_processor = EntityProcessor()
+    
+    # Split combined entities BEFORE processing
+    split_start = time.time()
+    entities_for_processor = [tuple(entity_tuple[:4]) for entity_tuple in entities_tuples or [] if len(entity_tuple) >= 4]
+    entities_for_processor = entity_processor.split_combined_entities(result['text'], entities_for_processor)
+    logger.info(f"Entity splitting time: {(time.time() - split_start) * 1000:.2f}ms")
+    
+    # Convert to dictionary format for the session
+    entities = []
+    for entity_tuple in entities_for_processor:
+        entities.append({
+            'text': entity_tuple[0],
+            'entity_type': entity_tuple[1],
+            'start': entity_tuple[2],
+            'end': entity_tuple[3]
+        })
+    
+    entity_counts = entity_processor.get_entity_stats(entities_for_processor)
+    
+    # Masked and highlighted views are rendered when the document is fetched
+    return CompactDocument(
+        doc_id=_new_document_id(session_id, filename),
+        filename=filename,
+        text=result['text'],
+        entities=entities,
+        entity_counts=entity_counts,
+        file_info=result['file_info'],
+        uploaded_at=datetime.now().isoformat(),
+        word_count=result['word_count'],
+        text_length=result['text_length'],
+        cell_map=result.get('cell_map')
+    )
+
+def _number_placeholders(doc_data: CompactDocument) -> None:
+    """Record the placeholder each entity gets when the whole document is masked
+    
+    Pages of the document are then masked with the same numbering by looking
+    up the entities of the page only.
+    """
+    chatbot = SimpleChatbot()
+    entities = list(doc_data.iter_entities(DOCUMENT_PAGE_SIZE))
+    placeholder_ids = array('i', [-1]) * len(entities)
+    placeholders = []
+    known = {}
+    for entity in chatbot.filter_overlapping_entities(entities):
+        placeholder = chatbot.get_or_create_placeholder(entity['text'], entity['entity_type'])
+        if placeholder not in known:
+            known[placeholder] = len(placeholders)
+            placeholders.append(placeholder)
+        placeholder_ids[entity['index']] = known[placeholder]
+    doc_data.set_placeholders(placeholder_ids, placeholders)
+
+def _add_document_to_session(session_id: int, doc_data: CompactDocument) -> None:
+    """Index and store a document and make it the session's active one"""
+    storage_start = time.time()
+    
+    # Initialize session if needed
+    if session_id not in document_sessions:
+        document_sessions[session_id] = {'documents': [], 'active_doc': None, 'index': DocumentIndex(chunk_size=RETRIEVAL_CHUNK_SIZE)}
+    
+    document_sessions[session_id]['index'].add_document(doc_data.id, doc_data.original_text, doc_data.entities)
+    _number_placeholders(doc_data)
+    if document_store is not None:
+        doc_data.move_to_store(document_store, session_id)
+    
+    # Add document to session and make it the active one
+    document_sessions[session_id]['documents'].append(doc_data)
+    document_sessions[session_id]['active_doc'] = doc_data.id
+    document_sessions.commit(session_id)
+    logger.info(f"Session storage time: {(time.time() - storage_start) * 1000:.2f}ms")
+
+def _content_hash(file_content: DocumentSource) -> str:
+    if isinstance(file_content, SpooledUpload):
+        return file_content.md5
+    return hashlib.md5(file_content).hexdigest()
+
+async def _cached_document(session_id: int, filename: str, file_content: DocumentSource) -> Optional[CompactDocument]:
+    """A new document built from the cached result for this file's content, or None"""
+    if document_result_cache is None:
+        return None
+    payload = await asyncio.to_thread(document_result_cache.get, _content_hash(file_content))
+    if payload is None:
+        return None
+    logger.info(f"Document result cache hit for {filename}")
+    return CompactDocument.from_dict({
+        **payload,
+        'id': _new_document_id(session_id, filename),
+        'filename': filename,
+        'file_info': app.state.document_processor.get_file_info(file_content, filename),
+        'uploaded_at': datetime.now().isoformat()
+    })
+
+async def _cache_document(doc_data: CompactDocument) -> None:
+    """Cache a freshly analyzed document's text and span table under its content hash"""
+    if document_result_cache is None:
+        return
+    payload = {
+        key: value for key, value in doc_data.to_dict().items()
+        if key not in ('id', 'filename', 'file_info', 'uploaded_at')
+    }
+    try:
+        await asyncio.to_thread(document_result_cache.put, doc_data.file_info['hash'], payload)
+    except Exception as e:
+        logger.warning(f"Could not cache result for {doc_data.filename}: {e}")
+
+async def _process_document_upload(session_id: int, filename: str, file_content: DocumentSource,
+                                   on_stage=None) -> CompactDocument:
+    """Extract, analyze and store one uploaded document in the session
+    
+    Args:
+        session_id: Document session to add the document to
+        filename: Uploaded file name
+        file_content: Raw file bytes or a spooled upload
+        on_stage: Optional callback(stage, progress) reporting extract -> detect -> mask
+    
+    Returns:
+        The stored document
+    """
+    start_time = time.time()
+    
+    def report(stage: str, progress: float):
+        if on_stage:
+            on_stage(stage, progress)
+    
+    # A file analyzed before (in any session) skips extraction and inference
+    doc_data = await _cached_document(session_id, filename, file_content)
+    if doc_data is not None:
+        report('mask', 0.8)
+        _add_document_to_session(session_id, doc_data)
+        return doc_data
+    
+    # Process document
+    report('extract', 0.0)
+    result = await _extract_document_upload(filename, file_content)
+    
+    # Analyze document for PII
+    report('detect', 0.3)
+    model = _upload_model()
+    
+    # Extract entities from document text off the event loop
+    predict_start = time.time()
+    entities_tuples = await asyncio.to_thread(model.predict, result['text'])
+    logger.info(f"Entity prediction time: {(time.time() - predict_start) * 1000:.2f}ms")
+    
+    report('mask', 0.8)
+    doc_data = _build_document(session_id, filename, result, entities_tuples)
+    await _cache_document(doc_data)
+    _add_document_to_session(session_id, doc_data)
+    
+    total_time = (time.time() - start_time) * 1000
+    logger.info(f"Total processing time: {total_time:.2f}ms for {filename} ({result['word_count']} words)")
+    return doc_data
+
+async def _iterate_in_thread(make_iterator: Callable[[], Iterator], max_ahead: int = 4) -> AsyncIterator:
+    """Run a blocking iterator in a worker thread and yield its items on the event loop
+    
+    At most `max_ahead` items are buffered, so a slow consumer holds the
+    producer back. If the consumer stops early the thread stops at its next item;
+    an exception raised by the iterator is re-raised here.
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue(maxsize=max_ahead)
+    stopped = threading.Event()
+    finished = object()
+    
+    def produce():
+        def put(item):
+            asyncio.run_coroutine_threadsafe(items.put(item), loop).result()
+        try:
+            for item in make_iterator():
+                if stopped.is_set():
+                    return
+                put((True, item))
+        except Exception as e:
+            if not stopped.is_set():
+                put((False, e))
+            return
+        if not stopped.is_set():
+            put((True, finished))
+    
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            ok, item = await items.get()
+            if not ok:
+                raise item
+            if item is finished:
+                return
+            yield item
+    finally:
+        # Release a producer blocked on the full queue
+        stopped.set()
+        while not items.empty():
+            items.get_nowait()
+        await producer
+
+async def _process_long_document_upload(session_id: int, filename: str, file_content: DocumentSource,
+                                        on_stage=None) -> CompactDocument:
+    """Analyze and store a document of any length in bounded memory
+    
+    Instead of extracting the whole text (truncated to MAX_TEXT_LENGTH) and
+    predicting it in one call, the text is streamed segment by segment through
+    a StreamingDetector. Each analyzed window is appended to the document store,
+    the span table and the retrieval index as it arrives, so memory holds a few
+    windows plus the span table. Throughput is logged and returned in
+    file_info['processing']. The file size is bounded by MAX_UPLOAD_SIZE (enforced
+    while the upload is received) and the text by LONG_DOCUMENT_MAX_CHARS.
+    """
+    start_time = time.time()
+    
+    def report(stage: str, progress: float):
+        if on_stage:
+            on_stage(stage, progress)
+    
+    report('extract', 0.0)
+    model = _upload_model()
+    detector = StreamingDetector(model, STREAM_WINDOW_CHARS, Config.INFERENCE_BATCH_SIZE)
+    doc_processor = app.state.document_processor
+    entity_processor = EntityProcessor()
+    
+    if session_id not in document_sessions:
+        document_sessions[session_id] = {'documents': [], 'active_doc': None, 'index': DocumentIndex(chunk_size=RETRIEVAL_CHUNK_SIZE)}
+    session = document_sessions[session_id]
+    
+    writer = document_store.open_writer(session_id) if document_store is not None else None
+    doc_data = CompactDocument.begin(
+        doc_id=_new_document_id(session_id, filename),
+        filename=filename,
+        file_info=doc_processor.get_file_info(file_content, filename),
+        uploaded_at=datetime.now().isoformat(),
+        writer=writer
+    )
+    
+    report('detect', 0.3)
+    windows = _iterate_in_thread(lambda: detector.detect(doc_processor.iter_segments(file_content, filename)))
+    try:
+        async for offset, text, entities_tuples in windows:
+            if offset + len(text) > LONG_DOCUMENT_MAX_CHARS:
+                raise HTTPException(status_code=413, detail=f"Document exceeds {LONG_DOCUMENT_MAX_CHARS} characters")
+            entities = [
+                {'text': entity_text, 'entity_type': entity_type, 'start': start, 'end': end}
+                for entity_text, entity_type, start, end in entities_tuples
+            ]
+            doc_data.append_window(offset, text, entities)
+            for entity_type, count in entity_processor.get_entity_stats(entities_tuples).items():
+                doc_data.entity_counts[entity_type] = doc_data.entity_counts.get(entity_type, 0) + count
+            session['index'].extend_document(doc_data.id, text, entities, offset)
+        
+        report('mask', 0.8)
+        doc_data.finish()
+        _number_placeholders(doc_data)
+    except ValueError as e:
+        session['index'].remove_document(doc_data.id)
+        if writer is not None:
+            writer.discard()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        session['index'].remove_document(doc_data.id)
+        if writer is not None:
+            writer.discard()
+        raise
+    finally:
+        await windows.aclose()
+    
+    elapsed = max(time.time() - start_time, 1e-6)
+    chars_per_second = doc_data.char_count / elapsed
+    doc_data.file_info['processing'] = {
+        'mode': 'long_document',
+        'seconds': round(elapsed, 3),
+        'chars_per_second': round(chars_per_second)
+    }
+    
+    session['documents'].append(doc_data)
+    session['active_doc'] = doc_data.id
+    document_sessions.commit(session_id)
+    logger.info(
+        f"Long-document processing of {filename}: {doc_data.char_count} characters in {elapsed:.2f}s "
+        f"({chars_per_second:.0f} chars/s, {sum(doc_data.entity_counts.values())} entities)"
+    )
+    return doc_data
+
+async def _process_document_uploads(session_id: int, files: List[UploadFile]) -> List[Optional[CompactDocument]]:
+    """Process several uploads as an extract -> detect -> store pipeline
+    
+    Up to UPLOAD_EXTRACT_CONCURRENCY files are read and extracted at once while
+    the model analyzes whatever texts are already extracted, batched across files
+    (up to Config.INFERENCE_BATCH_SIZE per call). Documents are stored strictly in
+    upload order, so the session's document order and active document match a
+    sequential upload.
+    
+    Returns:
+        One entry per file in input order: the stored document, or None if the
+        file was skipped or failed
+    """
+    model = _upload_model()
+    extract_slots = asyncio.Semaphore(UPLOAD_EXTRACT_CONCURRENCY)
+    extracted: asyncio.Queue = asyncio.Queue()
+    
+    async def extract(file_index: int, file: UploadFile):
+        async with extract_slots:
+            try:
+                upload = await _spool_upload(file)
+                try:
+                    outcome = await _cached_document(session_id, file.filename, upload)
+                    if outcome is None:
+                        outcome = await _extract_document_upload(file.filename, upload)
+                finally:
+                    upload.close()
+            except Exception as e:
+                outcome = e
+        await extracted.put((file_index, outcome))
+    
+    async def predict(ready: List[int]) -> List[Any]:
+        """Entities per ready document; if the batch fails, each document is predicted
+        on its own so a bad one gets its own error (returned in place of its entities)"""
+        texts = [results[file_index]['text'] for file_index in ready]
+        try:
+            return await asyncio.to_thread(model.predict_batch, texts)
+        except Exception as e:
+            logger.warning(f"Batched prediction of {len(texts)} documents failed ({e}), predicting them one by one")
+        outcomes = []
+        for text in texts:
+            try:
+                outcomes.append(await asyncio.to_thread(model.predict, text))
+            except Exception as doc_error:
+                outcomes.append(doc_error)
+        return outcomes
+    
+    pending = [file_index for file_index, file in enumerate(files) if file.filename]
+    for file_index, file in enumerate(files):
+        if not file.filename:
+            logger.warning(f"Skipping file {file_index + 1}: No filename provided")
+    extract_tasks = [asyncio.create_task(extract(file_index, files[file_index])) for file_index in pending]
+    
+    results: Dict[int, Dict] = {}
+    built: Dict[int, Optional[CompactDocument]] = {}
+    documents: List[Optional[CompactDocument]] = [None] * len(files)
+    next_position = 0
+    
+    try:
+        remaining = len(pending)
+        while remaining:
+            # Wait for one extracted file, then take whatever else is ready up to the batch size
+            batch = [await extracted.get()]
+            while len(batch) < Config.INFERENCE_BATCH_SIZE and not extracted.empty():
+                batch.append(extracted.get_nowait())
+            remaining -= len(batch)
+            
+            ready = []
+            for file_index, outcome in batch:
+                if isinstance(outcome, Exception):
+                    detail = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+                    logger.error(f"Error processing document {file_index + 1} ({files[file_index].filename}): {detail}")
+                    built[file_index] = None
+                elif isinstance(outcome, CompactDocument):
+                    built[file_index] = outcome  # cached result
+                else:
+                    results[file_index] = outcome
+                    ready.append(file_index)
+            
+            if ready:
+                predict_start = time.time()
+                batch_entities = await predict(ready)
+                logger.info(f"Entity prediction time: {(time.time() - predict_start) * 1000:.2f}ms for {len(ready)} documents")
+                for file_index, entities_tuples in zip(ready, batch_entities):
+                    if isinstance(entities_tuples, Exception):
+                        logger.error(f"Error processing document {file_index + 1} ({files[file_index].filename}): {str(entities_tuples)}")
+                        built[file_index] = None
+                        continue
+                    try:
+                        built[file_index] = _build_document(session_id, files[file_index].filename, results.pop(file_index), entities_tuples)
+                        await _cache_document(built[file_index])
+                    except Exception as doc_error:
+                        logger.error(f"Error processing document {file_index + 1} ({files[file_index].filename}): {str(doc_error)}")
+                        built[file_index] = None
+            
+            # Store the documents whose predecessors are all stored
+            while next_position < len(pending) and pending[next_position] in built:
+                file_index = pending[next_position]
+                next_position += 1
+                if built[file_index] is None:
+                    continue
+                try:
+                    _add_document_to_session(session_id, built[file_index])
+                    documents[file_index] = built[file_index]
+                    logger.info(f"Successfully processed document {file_index + 1}: {files[file_index].filename}")
+                except Exception as doc_error:
+                    logger.error(f"Error processing document {file_index + 1} ({files[file_index].filename}): {str(doc_error)}")
+    finally:
+        for task in extract_tasks:
+            task.cancel()
+        await asyncio.gather(*extract_tasks, return_exceptions=True)
+    
+    return documents
+
+def _uploaded_document_info(doc_data: CompactDocument) -> Dict:
+    """Summary returned to the client for an uploaded document"""
+    return {
+        **doc_data.summary(),
+        'file_info': doc_data.file_info
+    }
+
+def _submit_upload_job(session_id: int, upload: SpooledUpload, long_document: bool = False) -> Dict:
+    """Queue background processing of an uploaded document, returning the job reference
+    
+    The job takes ownership of `upload` and closes it when it finishes.
+    """
+    filename = upload.filename
+    process = _process_long_document_upload if long_document else _process_document_upload
+    
+    async def handler(job):
+        def on_stage(stage, progress):
+            job_manager.update(job, stage=stage, progress=progress, message=f"{stage}: {filename}")
+        doc_data = await process(session_id, filename, upload, on_stage)
+        return {'document': _uploaded_document_info(doc_data)}
+    
+    try:
+        # The upload is closed when the job finishes, including a job still queued at shutdown
+        job = job_manager.submit('document_upload', session_id, DOCUMENT_UPLOAD_STAGES, handler, cleanup=upload.close)
+    except JobQueueFullError as e:
+        upload.close()
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        'job_id': job.id,
+        'filename': filename,
+        'status_url': f"/api/jobs/{job.id}",
+        'events_url': f"/api/jobs/{job.id}/events"
+    }
+
 @app.post("/api/document/upload")
-async def upload_document(session_id: int, file: UploadFile = File(...)):
-    """Upload and process a document"""
+async def upload_document(session_id: int, file: UploadFile = File(...), background: bool = False,
+                          long_document: bool = False):
+    """Upload and process a document
+    
+    With `background=true` the upload returns 202 with a job id right after the
+    file is received; progress and the result are available from /api/jobs/{job_id}.
+    With `long_document=true` the full text is analyzed without the
+    MAX_TEXT_LENGTH truncation (see `_process_long_document_upload`); the file
+    is still limited to MAX_UPLOAD_SIZE bytes.
+    """
     import time
     start_time = time.time()
     
@@ -957,129 +1812,30 @@ async def upload_document(session_id: int, file: UploadFile = File(...)):
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
         
-        # Read file content
-        read_start = time.time()
-        file_content = await file.read()
-        logger.info(f"File read time: {(time.time() - read_start) * 1000:.2f}ms")
-        
-        # Process document
-        process_start = time.time()
-        doc_processor = app.state.document_processor
-        result = await doc_processor.process_document(file_content, file.filename)
-        logger.info(f"Document processing time: {(time.time() - process_start) * 1000:.2f}ms")
-        
-        if not result['success']:
-            raise HTTPException(status_code=400, detail=result['error'])
-        
-        # Analyze document for PII
-        model_start = time.time()
-        model_factory = app.state.model_factory
-        model = model_factory.get_model("v2")
-        
-        if not model:
-            raise HTTPException(status_code=500, detail="Model not available")
-        
-        # Extract entities from document text using the predict method
-        predict_start = time.time()
-        entities_tuples = model.predict(result['text'])
-        logger.info(f"Entity prediction time: {(time.time() - predict_start) * 1000:.2f}ms")
-        
-        # Convert tuples to dictionary format
-        entities = []
-        if entities_tuples:
-            for entity_tuple in entities_tuples:
-                if len(entity_tuple) >= 4:
-                    entities.append({
-                        'text': entity_tuple[0],
-                        'entity_type': entity_tuple[1],
-                        'start': entity_tuple[2],
-                        'end': entity_tuple[3]
-                    })
-        
-        entity_processor = EntityProcessor()
-        
-        # Convert entities back to tuple format for entity_processor
-        entities_for_processor = []
-        for entity in entities:
-            entities_for_processor.append((
-                entity['text'],
-                entity['entity_type'],
-                entity['start'],
-                entity['end']
-            ))
-        
-        # Split combined entities BEFORE processing
-        split_start = time.time()
-        entities_for_processor = entity_processor.split_combined_entities(result['text'], entities_for_processor)
-        logger.info(f"Entity splitting time: {(time.time() - split_start) * 1000:.2f}ms")
-        
-        # Update the entities list with split entities for frontend
-        entities = []
-        for entity_tuple in entities_for_processor:
-            entities.append({
-                'text': entity_tuple[0],
-                'entity_type': entity_tuple[1],
-                'start': entity_tuple[2],
-                'end': entity_tuple[3]
-            })
-        
-        # Process entities for display
-        highlight_start = time.time()
-        highlighted_text = entity_processor.highlight_entities_in_text(result['text'], entities_for_processor)
-        entity_counts = entity_processor.get_entity_stats(entities_for_processor)
-        logger.info(f"Entity highlighting time: {(time.time() - highlight_start) * 1000:.2f}ms")
-        
-        # Create masked version of text using a TEMPORARY chatbot to avoid affecting session counters
-        mask_start = time.time()
-        # Create a temporary chatbot just for document masking
-        # This ensures document uploads don't affect the main chat session's entity counters
-        temp_chatbot = SimpleChatbot()
-        logger.info(f"Created temporary chatbot for document upload masking (session {session_id})")
-        masked_text = temp_chatbot.mask_entities(result['text'], entities)
-        logger.info(f"Text masking time: {(time.time() - mask_start) * 1000:.2f}ms")
-        # Note: temp_chatbot goes out of scope and is garbage collected, not affecting the session
-        
-        # Store document in session
-        storage_start = time.time()
-        doc_data = {
-            'id': hashlib.md5(f"{session_id}_{file.filename}_{datetime.now().isoformat()}".encode()).hexdigest()[:12],
-            'filename': file.filename,
-            'original_text': result['text'],
-            'masked_text': masked_text,
-            'highlighted_text': highlighted_text,
-            'entities': entities,
-            'entity_counts': entity_counts,
-            'file_info': result['file_info'],
-            'uploaded_at': datetime.now().isoformat(),
-            'word_count': result['word_count'],
-            'text_length': result['text_length']
-        }
+        # Stream the file in, enforcing the size limit
+        upload = await _spool_upload(file)
         
-        # Initialize session if needed
-        if session_id not in document_sessions:
-            document_sessions[session_id] = {'documents': [], 'active_doc': None}
+        if background:
+            return JSONResponse({'success': True, **_submit_upload_job(session_id, upload, long_document)}, status_code=202)
         
-        # Add document to session
-        document_sessions[session_id]['documents'].append(doc_data)
-        document_sessions[session_id]['active_doc'] = doc_data['id']
-        logger.info(f"Session storage time: {(time.time() - storage_start) * 1000:.2f}ms")
+        try:
+            if long_document:
+                doc_data = await _process_long_document_upload(session_id, file.filename, upload)
+            else:
+                doc_data = await _process_document_upload(session_id, file.filename, upload)
+        finally:
+            upload.close()
         
         total_time = (time.time() - start_time) * 1000
-        logger.info(f"Total upload time: {total_time:.2f}ms for {file.filename} ({result['word_count']} words)")
+        logger.info(f"Total upload time: {total_time:.2f}ms for {file.filename}")
         
         return JSONResponse({
             'success': True,
-            'document': {
-                'id': doc_data['id'],
-                'filename': doc_data['filename'],
-                'text_length': doc_data['text_length'],
-                'word_count': doc_data['word_count'],
-                'entity_count': sum(entity_counts.values()) if entity_counts else 0,
-                'entity_types': list(entity_counts.keys()) if entity_counts else [],
-                'file_info': doc_data['file_info']
-            }
+            'document': _uploaded_document_info(doc_data)
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -1087,151 +1843,35 @@ async def upload_document(session_id: int, file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Document processing failed: {str(e)}")
 
 @app.post("/api/document/upload-multiple")
-async def upload_multiple_documents(session_id: int, files: List[UploadFile] = File(...)):
-    """Upload and process multiple documents sequentially"""
-    import time
+async def upload_multiple_documents(session_id: int, files: List[UploadFile] = File(...), background: bool = False):
+    """Upload and process multiple documents
+    
+    Files go through a concurrent extract -> detect -> store pipeline (see
+    `_process_document_uploads`); the response lists documents in upload order.
+    With `background=true` each file becomes its own job and the response lists the job ids.
+    """
     start_time = time.time()
     
     try:
         if not files:
             raise HTTPException(status_code=400, detail="No files provided")
         
-        results = []
-        
-        # Initialize session if needed
-        if session_id not in document_sessions:
-            document_sessions[session_id] = {'documents': [], 'active_doc': None}
-        
-        # Process each document sequentially
-        for file_index, file in enumerate(files):
-            logger.info(f"Processing document {file_index + 1}/{len(files)}: {file.filename}")
-            
-            if not file.filename:
-                logger.warning(f"Skipping file {file_index + 1}: No filename provided")
-                continue
-            
-            try:
-                # Read file content
-                read_start = time.time()
-                file_content = await file.read()
-                logger.info(f"File {file_index + 1} read time: {(time.time() - read_start) * 1000:.2f}ms")
-                
-                # Process document
-                process_start = time.time()
-                doc_processor = app.state.document_processor
-                result = await doc_processor.process_document(file_content, file.filename)
-                logger.info(f"Document {file_index + 1} processing time: {(time.time() - process_start) * 1000:.2f}ms")
-                
-                if not result['success']:
-                    logger.error(f"Failed to process document {file_index + 1}: {result['error']}")
+        if background:
+            jobs = []
+            for file_index, file in enumerate(files):
+                if not file.filename:
+                    logger.warning(f"Skipping file {file_index + 1}: No filename provided")
                     continue
-                
-                # Analyze document for PII
-                model_start = time.time()
-                model_factory = app.state.model_factory
-                model = model_factory.get_model("v2")
-                
-                if not model:
-                    logger.error(f"Model not available for document {file_index + 1}")
-                    continue
-                
-                # Extract entities from document text
-                predict_start = time.time()
-                entities_tuples = model.predict(result['text'])
-                logger.info(f"Document {file_index + 1} entity prediction time: {(time.time() - predict_start) * 1000:.2f}ms")
-                
-                # Convert tuples to dictionary format
-                entities = []
-                if entities_tuples:
-                    for entity_tuple in entities_tuples:
-                        if len(entity_tuple) >= 4:
-                            entities.append({
-                                'text': entity_tuple[0],
-                                'entity_type': entity_tuple[1],
-                                'start': entity_tuple[2],
-                                'end': entity_tuple[3]
-                            })
-                
-                entity_processor = EntityProcessor()
-                
-                # Convert entities back to tuple format for entity_processor
-                entities_for_processor = []
-                for entity in entities:
-                    entities_for_processor.append((
-                        entity['text'],
-                        entity['entity_type'],
-                        entity['start'],
-                        entity['end']
-                    ))
-                
-                # Split combined entities BEFORE processing
-                split_start = time.time()
-                entities_for_processor = entity_processor.split_combined_entities(result['text'], entities_for_processor)
-                logger.info(f"Document {file_index + 1} entity splitting time: {(time.time() - split_start) * 1000:.2f}ms")
-                
-                # Update the entities list with split entities
-                entities = []
-                for entity_tuple in entities_for_processor:
-                    entities.append({
-                        'text': entity_tuple[0],
-                        'entity_type': entity_tuple[1],
-                        'start': entity_tuple[2],
-                        'end': entity_tuple[3]
-                    })
-                
-                # Process entities for display
-                highlight_start = time.time()
-                highlighted_text = entity_processor.highlight_entities_in_text(result['text'], entities_for_processor)
-                entity_counts = entity_processor.get_entity_stats(entities_for_processor)
-                logger.info(f"Document {file_index + 1} highlighting time: {(time.time() - highlight_start) * 1000:.2f}ms")
-                
-                # Create masked version of text using a TEMPORARY chatbot to avoid affecting session counters
-                mask_start = time.time()
-                # Create a temporary chatbot just for document masking
-                # This ensures document uploads don't affect the main chat session's entity counters
-                temp_chatbot = SimpleChatbot()
-                logger.info(f"Created temporary chatbot for multi-document upload masking (session {session_id}, doc {file_index + 1})")
-                masked_text = temp_chatbot.mask_entities(result['text'], entities)
-                logger.info(f"Document {file_index + 1} masking time: {(time.time() - mask_start) * 1000:.2f}ms")
-                # Note: temp_chatbot goes out of scope and is garbage collected, not affecting the session
-                
-                # Store document data
-                doc_data = {
-                    'id': hashlib.md5(f"{session_id}_{file.filename}_{datetime.now().isoformat()}".encode()).hexdigest()[:12],
-                    'filename': file.filename,
-                    'original_text': result['text'],
-                    'masked_text': masked_text,
-                    'highlighted_text': highlighted_text,
-                    'entities': entities,
-                    'entity_counts': entity_counts,
-                    'file_info': result['file_info'],
-                    'uploaded_at': datetime.now().isoformat(),
-                    'word_count': result['word_count'],
-                    'text_length': result['text_length']
-                }
-                
-                # Add document to session
-                document_sessions[session_id]['documents'].append(doc_data)
-                
-                # Set the last processed document as active
-                document_sessions[session_id]['active_doc'] = doc_data['id']
-                
-                # Add to results
-                results.append({
-                    'id': doc_data['id'],
-                    'filename': doc_data['filename'],
-                    'text_length': doc_data['text_length'],
-                    'word_count': doc_data['word_count'],
-                    'entity_count': sum(entity_counts.values()) if entity_counts else 0,
-                    'entity_types': list(entity_counts.keys()) if entity_counts else [],
-                    'file_info': doc_data['file_info']
-                })
-                
-                logger.info(f"Successfully processed document {file_index + 1}: {file.filename}")
-                
-            except Exception as doc_error:
-                logger.error(f"Error processing document {file_index + 1} ({file.filename}): {str(doc_error)}")
-                continue
+                jobs.append(_submit_upload_job(session_id, await _spool_upload(file)))
+            return JSONResponse({
+                'success': True,
+                'queued_count': len(jobs),
+                'total_count': len(files),
+                'jobs': jobs
+            }, status_code=202)
+        
+        documents = await _process_document_uploads(session_id, files)
+        results = [_uploaded_document_info(doc_data) for doc_data in documents if doc_data is not None]
         
         total_time = (time.time() - start_time) * 1000
         logger.info(f"Total multi-document upload time: {total_time:.2f}ms for {len(results)} documents")
@@ -1243,12 +1883,147 @@ async def upload_multiple_documents(session_id: int, files: List[UploadFile] = F
             'documents': results
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         logger.error(f"Multi-document upload error: {str(e)}\n{error_details}")
         raise HTTPException(status_code=500, detail=f"Multi-document processing failed: {str(e)}")
 
+@app.post("/api/document/analyze-stream")
+async def analyze_document_stream(file: UploadFile = File(...)):
+    """Detect PII in a document while it is being parsed
+    
+    The file is extracted segment by segment (PDF pages, DOCX paragraphs, row
+    blocks) and analyzed in windows as the segments arrive; each window's
+    entities are streamed back as one NDJSON line, with offsets into the whole
+    text. Nothing is stored in a session and the text is not truncated to the
+    upload limit. Lines:
+    
+        {"event": "window", "offset", "text", "entities"}
+        {"event": "done", "text_length", "window_count", "entity_counts"}
+        {"event": "error", "error"}
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    upload = await _spool_upload(file)
+    try:
+        model = _upload_model()
+    except HTTPException:
+        upload.close()
+        raise
+    detector = StreamingDetector(model, STREAM_WINDOW_CHARS, Config.INFERENCE_BATCH_SIZE)
+    doc_processor = app.state.document_processor
+    
+    async def generate():
+        text_length = 0
+        window_count = 0
+        entity_counts: Dict[str, int] = {}
+        # Extraction and inference run in a thread, a few windows ahead of the client
+        windows = _iterate_in_thread(lambda: detector.detect(doc_processor.iter_segments(upload, file.filename)))
+        try:
+            async for offset, text, entities in windows:
+                text_length = offset + len(text)
+                window_count += 1
+                for entity in entities:
+                    entity_counts[entity[1]] = entity_counts.get(entity[1], 0) + 1
+                yield json.dumps({
+                    'event': 'window',
+                    'offset': offset,
+                    'text': text,
+                    'entities': [
+                        {'text': entity_text, 'entity_type': entity_type, 'start': start, 'end': end}
+                        for entity_text, entity_type, start, end in entities
+                    ]
+                }) + "\n"
+        except Exception as e:
+            logger.error(f"Streaming analysis of {file.filename} failed: {e}")
+            yield json.dumps({'event': 'error', 'error': str(e)}) + "\n"
+            return
+        finally:
+            # Stop the producer thread (also when the client disconnects) before the upload goes away
+            await windows.aclose()
+            upload.close()
+        yield json.dumps({
+            'event': 'done',
+            'text_length': text_length,
+            'window_count': window_count,
+            'entity_counts': entity_counts
+        }) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/api/document/scan-spreadsheet")
+async def scan_spreadsheet(file: UploadFile = File(...)):
+    """Detect PII cell by cell in a spreadsheet while its rows are read
+    
+    Each cell is analyzed on its own, with the cells of a column batched through
+    the model; numeric and date columns only get pattern-based detection. Each
+    block of rows' entities is streamed back as one NDJSON line, with the sheet,
+    row and column of every entity. Nothing is stored in a session. Lines:
+    
+        {"event": "cells", "sheet", "entities"}
+        {"event": "done", "entity_counts", "stats"}
+        {"event": "error", "error"}
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    if not file.filename.lower().endswith('.xlsx'):
+        raise HTTPException(status_code=400, detail="Spreadsheet scanning supports .xlsx files")
+    upload = await _spool_upload(file)
+    try:
+        scanner = SpreadsheetScanner(_upload_model(), Config.INFERENCE_BATCH_SIZE, SPREADSHEET_BLOCK_ROWS)
+    except HTTPException:
+        upload.close()
+        raise
+    
+    def scan():
+        with upload.open() as source:
+            yield from scanner.scan(source)
+    
+    async def generate():
+        entity_counts: Dict[str, int] = {}
+        # Reading and inference run in a thread, a few blocks ahead of the client
+        blocks = _iterate_in_thread(scan)
+        try:
+            async for sheet, entities in blocks:
+                for entity in entities:
+                    entity_counts[entity['entity_type']] = entity_counts.get(entity['entity_type'], 0) + 1
+                if entities:
+                    yield json.dumps({'event': 'cells', 'sheet': sheet, 'entities': entities}) + "\n"
+        except Exception as e:
+            logger.error(f"Spreadsheet scan of {file.filename} failed: {e}")
+            yield json.dumps({'event': 'error', 'error': str(e)}) + "\n"
+            return
+        finally:
+            # Stop the reader thread (also when the client disconnects) before the upload goes away
+            await blocks.aclose()
+            upload.close()
+        yield json.dumps({'event': 'done', 'entity_counts': entity_counts, 'stats': scanner.stats}) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Poll a background job's status, stage, progress and result"""
+    snapshot = job_manager.snapshot(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(snapshot)
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Stream a background job's progress as server-sent events until it finishes"""
+    if job_manager.snapshot(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def generate():
+        async for snapshot in job_manager.watch(job_id):
+            yield f"data: {json.dumps(snapshot)}\n\n"
+    
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
 @app.get("/api/document/{session_id}")
 async def get_documents(session_id: int):
     """Get all documents for a session"""
@@ -1259,15 +2034,7 @@ async def get_documents(session_id: int):
     doc_summaries = []
     
     for doc in session_data['documents']:
-        doc_summaries.append({
-            'id': doc['id'],
-            'filename': doc['filename'],
-            'uploaded_at': doc['uploaded_at'],
-            'text_length': doc['text_length'],
-            'word_count': doc['word_count'],
-            'entity_count': sum(doc['entity_counts'].values()) if doc['entity_counts'] else 0,
-            'entity_types': list(doc['entity_counts'].keys()) if doc['entity_counts'] else []
-        })
+        doc_summaries.append(doc.summary())
     
     return JSONResponse({
         'documents': doc_summaries,
@@ -1275,8 +2042,17 @@ async def get_documents(session_id: int):
     })
 
 @app.get("/api/document/{session_id}/{doc_id}")
-async def get_document_content(session_id: int, doc_id: str):
-    """Get specific document content with PII analysis"""
+async def get_document_content(session_id: int, doc_id: str, views: str = "masked,highlighted",
+                               offset: int = 0, limit: Optional[int] = None):
+    """Get specific document content with PII analysis
+    
+    Masked and highlighted renderings are not stored; only the views listed in
+    `views` (comma-separated: masked, highlighted) are rendered for this response.
+    
+    With `limit`, one page of the document is returned: the characters from
+    `offset`, extended so no entity is cut, with entity offsets relative to the
+    whole document and `next_offset` pointing at the following page (None at the end).
+    """
     if session_id not in document_sessions:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -1284,29 +2060,91 @@ async def get_document_content(session_id: int, doc_id: str):
     document = None
     
     for doc in session_data['documents']:
-        if doc['id'] == doc_id:
+        if doc.id == doc_id:
             document = doc
             break
     
-    if not document:
+    if document is None:
         raise HTTPException(status_code=404, detail="Document not found")
     
     # Set as active document
     document_sessions[session_id]['active_doc'] = doc_id
+    document_sessions.commit(session_id)
     
-    return JSONResponse({
-        'id': document['id'],
-        'filename': document['filename'],
-        'original_text': document['original_text'],
-        'masked_text': document.get('masked_text', document['original_text']),
-        'highlighted_text': document['highlighted_text'],
-        'entities': document['entities'],
-        'entity_counts': document['entity_counts'],
-        'file_info': document['file_info'],
-        'uploaded_at': document['uploaded_at'],
-        'word_count': document['word_count'],
-        'text_length': document['text_length']
-    })
+    if offset < 0 or (limit is not None and limit <= 0):
+        raise HTTPException(status_code=400, detail="Invalid offset or limit")
+    if limit is None:
+        start, end = 0, document.char_count
+    else:
+        start = min(offset, document.char_count)
+        end = document.page_end(start, min(limit, DOCUMENT_PAGE_SIZE))
+    
+    requested_views = {view.strip() for view in views.split(',')}
+    page_text = document.text_slice(start, end)
+    page_entities = document.entities_in(start, end, relative=True)
+    masked_text = None
+    highlighted_text = None
+    if 'masked' in requested_views:
+        # Mask with a TEMPORARY chatbot so viewing a document doesn't affect the session's entity counters
+        temp_chatbot = SimpleChatbot()
+        if not document.has_placeholders:
+            _number_placeholders(document)
+        # Number placeholders as if the document was masked from the start
+        temp_chatbot.entity_mappings.update(document.placeholders_in(start, end))
+        masked_text = temp_chatbot.mask_entities(page_text, page_entities)
+    if 'highlighted' in requested_views:
+        highlighted_text = EntityProcessor().highlight_entities_in_text(
+            page_text, [(e['text'], e['entity_type'], e['start'], e['end']) for e in page_entities]
+        )
+    
+    content = {
+        'id': document.id,
+        'filename': document.filename,
+        'original_text': page_text,
+        'masked_text': masked_text,
+        'highlighted_text': highlighted_text,
+        'entities': [{**e, 'start': e['start'] + start, 'end': e['end'] + start} for e in page_entities],
+        'entity_counts': document.entity_counts,
+        'file_info': document.file_info,
+        'uploaded_at': document.uploaded_at,
+        'word_count': document.word_count,
+        'text_length': document.text_length
+    }
+    if limit is not None:
+        content['offset'] = start
+        content['next_offset'] = end if end < document.char_count else None
+    return JSONResponse(content)
+
+@app.get("/api/document/{session_id}/{doc_id}/highlighted")
+async def stream_highlighted_document(session_id: int, doc_id: str):
+    """Stream the highlighted HTML of a whole document
+    
+    The document is rendered one page (DOCUMENT_PAGE_SIZE characters, never
+    cutting an entity) at a time and each page is sent as soon as it is
+    rendered, so neither the server nor the browser waits for the whole
+    rendering of a large document.
+    """
+    if session_id not in document_sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    document = next((doc for doc in document_sessions[session_id]['documents'] if doc.id == doc_id), None)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    entity_processor = EntityProcessor()
+    
+    def generate():
+        start = 0
+        while start < document.char_count:
+            end = document.page_end(start, DOCUMENT_PAGE_SIZE)
+            yield ''.join(entity_processor.iter_highlight_fragments(
+                document.text_slice(start, end),
+                [(e['text'], e['entity_type'], e['start'], e['end'])
+                 for e in document.entities_in(start, end, relative=True)]
+            ))
+            start = end
+    
+    return StreamingResponse(generate(), media_type="text/html; charset=utf-8")
 
 @app.delete("/api/document/{session_id}/{doc_id}")
 async def delete_document(session_id: int, doc_id: str):
@@ -1318,7 +2156,7 @@ async def delete_document(session_id: int, doc_id: str):
     document_index = None
     
     for i, doc in enumerate(session_data['documents']):
-        if doc['id'] == doc_id:
+        if doc.id == doc_id:
             document_index = i
             break
     
@@ -1327,14 +2165,19 @@ async def delete_document(session_id: int, doc_id: str):
     
     # Remove document
     deleted_doc = session_data['documents'].pop(document_index)
+    session_data['index'].remove_document(doc_id)
+    if session_id in chatbot_sessions:
+        chatbot_sessions[session_id].forget_document(doc_id)
+        chatbot_sessions.commit(session_id)
     
     # Update active document if needed
     if session_data['active_doc'] == doc_id:
-        session_data['active_doc'] = session_data['documents'][0]['id'] if session_data['documents'] else None
+        session_data['active_doc'] = session_data['documents'][0].id if session_data['documents'] else None
     
-    logger.info(f"Document deleted: {deleted_doc['filename']} from session {session_id}")
+    document_sessions.commit(session_id)
+    logger.info(f"Document deleted: {deleted_doc.filename} from session {session_id}")
     
-    return JSONResponse({'success': True, 'deleted_document': deleted_doc['filename']})
+    return JSONResponse({'success': True, 'deleted_document': deleted_doc.filename})
 
 @app.post("/api/document/{session_id}/set-active/{doc_id}")
 async def set_active_document(session_id: int, doc_id: str):
@@ -1345,11 +2188,12 @@ async def set_active_document(session_id: int, doc_id: str):
     session_data = document_sessions[session_id]
     
     # Verify document exists
-    doc_exists = any(doc['id'] == doc_id for doc in session_data['documents'])
+    doc_exists = any(doc.id == doc_id for doc in session_data['documents'])
     if not doc_exists:
         raise HTTPException(status_code=404, detail="Document not found")
     
     document_sessions[session_id]['active_doc'] = doc_id
+    document_sessions.commit(session_id)
     
     return JSONResponse({'success': True, 'active_doc': doc_id})
 
@@ -1392,6 +2236,8 @@ async def privacy_chat_api(request: PrivacyChatRequest):
         logger.info(f"Created new chatbot for session {session_id}")
     
     chatbot = chatbot_sessions[session_id]
+    if request.use_response_cache is not None:
+        chatbot.set_response_cache(request.use_response_cache)
     
     try:
         # Process message
@@ -1522,6 +2368,7 @@ async def privacy_chat_api(request: PrivacyChatRequest):
             "response_entities": response_entities
         }
         logger.info(f"Returning response data: {response_data}")
+        chatbot_sessions.commit(session_id)
         return PrivacyChatResponse(**response_data)
         
     except Exception as e:
@@ -1547,6 +2394,8 @@ async def privacy_chat_stream(request: PrivacyChatRequest):
         logger.info(f"Created new chatbot for session {session_id}")
     
     chatbot = chatbot_sessions[session_id]
+    if request.use_response_cache is not None:
+        chatbot.set_response_cache(request.use_response_cache)
     logger.info(f"Using chatbot for session {session_id} with {len(chatbot.entity_counters)} entity types tracked")
     
     async def generate():
@@ -1556,10 +2405,11 @@ async def privacy_chat_stream(request: PrivacyChatRequest):
                 active_doc_id = document_sessions[session_id]['active_doc']
                 # Find the active document
                 for doc in document_sessions[session_id]['documents']:
-                    if doc['id'] == active_doc_id:
+                    if doc.id == active_doc_id:
                         chatbot.set_document_context(doc)
-                        logger.info(f"Loaded document context: {doc['filename']}")
+                        logger.info(f"Loaded document context: {doc.filename}")
                         break
+                chatbot.set_document_index(document_sessions[session_id]['index'], document_sessions[session_id]['documents'])
             
             # Process message to get entities and masked version
             entities = chatbot.detect_pii(request.message)
@@ -1643,21 +2493,12 @@ async def privacy_chat_stream(request: PrivacyChatRequest):
             response_entities = []
             try:
                 # First, detect ALL entities in the unmasked response using PII detector
+                # (combined organizations are already split by detect_pii)
                 detected_ai_entities = chatbot.detect_pii(unmasked_response)
                 
-                # Process detected entities to handle comma-separated organizations
-                from src.models.entity_processor import EntityProcessor
-                processor = EntityProcessor()
-                
-                # Convert to tuple format for processor
-                entity_tuples = [(ent['text'], ent['entity_type'], ent['start'], ent['end']) 
-                                for ent in detected_ai_entities]
-                
-                # Split combined entities (e.g., comma-separated organizations)
-                split_entities = processor.split_combined_entities(unmasked_response, entity_tuples)
-                
-                # Convert back to dict format and add to response_entities
-                for entity_text, entity_type, start, end in split_entities:
+                # Convert to dict format and add to response_entities
+                for ent in detected_ai_entities:
+                    entity_text, entity_type, start, end = ent['text'], ent['entity_type'], ent['start'], ent['end']
                     clean_text = entity_text.strip()
                     # Remove markdown bold markers
                     clean_text = clean_text.strip('*').strip()
@@ -1749,6 +2590,9 @@ async def privacy_chat_stream(request: PrivacyChatRequest):
             }
             yield f"data: {json.dumps(completion_data)}\n\n"
             
+            # Re-measure the session now that history and document context changed
+            chatbot_sessions.commit(session_id)
+            
         except Exception as e:
             logger.error(f"Error in streaming: {e}")
             error_data = {"type": "error", "message": str(e)}
@@ -1778,6 +2622,7 @@ async def reset_session(request: dict):
     if session_id in document_sessions:
         logger.info(f"Clearing document session for session {session_id}")
         del document_sessions[session_id]
+        _release_document_files(session_id)
     
     # Verify the new chatbot is clean
     new_bot = chatbot_sessions[session_id]
@@ -1939,17 +2784,6 @@ async def voice_to_text(
             logger.warning(f"Invalid audio type: {audio_file.content_type}")
             # Try to proceed anyway if it's an audio file
         
-        # Read audio file
-        audio_data = await audio_file.read()
-        
-        # Check file size (max 25MB for Whisper API)
-        max_size = 25 * 1024 * 1024  # 25MB
-        if len(audio_data) > max_size:
-            return JSONResponse(
-                status_code=413,
-                content={"error": "Audio file too large. Maximum size is 25MB"}
-            )
-        
         # Initialize OpenAI client
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
@@ -1961,16 +2795,19 @@ async def voice_to_text(
         
         client = OpenAI(api_key=api_key)
         
-        # Create a temporary file for the audio
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_audio:
-            temp_audio.write(audio_data)
-            temp_audio_path = temp_audio.name
+        # Stream the audio to a temp file, stopping at the Whisper API limit
+        try:
+            audio_upload = await spool_upload(audio_file, MAX_AUDIO_SIZE, 0, UPLOAD_CHUNK_SIZE, suffix=".webm")
+        except UploadTooLargeError:
+            return JSONResponse(
+                status_code=413,
+                content={"error": f"Audio file too large. Maximum size is {MAX_AUDIO_SIZE // (1024 * 1024)}MB"}
+            )
         
         try:
             # Transcribe with Whisper
             logger.info(f"Sending audio to Whisper API for transcription")
-            with open(temp_audio_path, "rb") as audio_file_obj:
+            with audio_upload.open() as audio_file_obj:
                 transcript = client.audio.transcriptions.create(
                     model="whisper-1",
                     file=audio_file_obj,
@@ -2006,6 +2843,7 @@ async def voice_to_text(
             
             # Mask the entities
             masked_text = chatbot.mask_entities(transcribed_text, entities)
+            chatbot_sessions.commit(session_id)
             
             # Prepare response
             response = {
@@ -2021,10 +2859,8 @@ async def voice_to_text(
             
         finally:
             # Clean up temporary file
-            import os as os_module
-            if os_module.path.exists(temp_audio_path):
-                os_module.remove(temp_audio_path)
-                logger.info("Cleaned up temporary audio file")
+            audio_upload.close()
+            logger.info("Cleaned up temporary audio file")
                 
     except Exception as e:
         logger.error(f"Error in voice transcription: {str(e)}")
@@ -2060,10 +2896,12 @@ async def send_voice_message(
         filename = f"{file_id}.{file_extension}"
         file_path = os.path.join(voice_dir, filename)
         
-        # Save the audio file
-        with open(file_path, "wb") as f:
-            content = await audio_file.read()
-            f.write(content)
+        # Save the audio file, streamed in chunks up to the size limit
+        try:
+            audio_upload = await spool_upload(audio_file, MAX_AUDIO_SIZE, 0, UPLOAD_CHUNK_SIZE)
+        except UploadTooLargeError as e:
+            return JSONResponse(status_code=413, content={"error": str(e)})
+        audio_upload.move_to(file_path)
         
         # Create URL for the audio file
         audio_url = f"/static/voice_messages/{filename}"
@@ -2085,7 +2923,7 @@ async def send_voice_message(
         }
         
         # Add to conversation history
-        chatbot.conversation_history.append({
+        chatbot.append_history({
             "role": "user",
             "content": f"[Voice message: {duration}s]",
             "voice_data": voice_message
@@ -2125,6 +2963,7 @@ async def send_voice_message(
                 logger.error(f"Error processing voice for AI: {e}")
                 # Still return success, just without AI response
         
+        chatbot_sessions.commit(session_id)
         return JSONResponse(content=response_data)
         
     except Exception as e:
@@ -2,6 +2,7 @@ import torch
 from transformers import AutoTokenizer, AutoModelForTokenClassification
 from typing import List, Tuple
 from src.models.model_interface import ModelInterface
+from src.models.prediction import Prediction
 
 class CamelBertModel(ModelInterface):
     """Model class for handling the CamelBert-based NER model
@@ -126,4 +127,4 @@ class CamelBertModel(ModelInterface):
             else:
                 i += 1
 
-        return entities
\ No newline at end of file
+        return Prediction(entities)
\ No newline at end of file
@@ -0,0 +1,69 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+class CellOffsetMap:
+    """Character offsets of table cells in extracted document text
+
+    Cells are recorded row by row (row-major), so the offsets increase
+    monotonically and the cell containing a text position is found by
+    bisection. Rows are numbered from 1 for the first data row; the header row
+    is not mapped.
+    """
+
+    def __init__(self, columns: List[str], sheet: Optional[str] = None):
+        """Initialize an empty map
+
+        Args:
+            columns: Column names, in order
+            sheet: Optional sheet or table name reported with each cell
+        """
+        self.columns = list(columns)
+        self.sheet = sheet
+        self.offsets = array('i')
+
+    @property
+    def row_count(self) -> int:
+        return -(-len(self.offsets) // len(self.columns)) if self.columns else 0
+
+    def extend(self, offsets) -> None:
+        """Append cell offsets for further rows, row-major (an int32 array or buffer)"""
+        self.offsets.frombytes(bytes(offsets))
+
+    def offset(self, row: int, column: int) -> int:
+        """Character offset of a cell (row from 1, column from 0)"""
+        return self.offsets[(row - 1) * len(self.columns) + column]
+
+    def cell_at(self, position: int) -> Optional[Tuple[int, int]]:
+        """(row, column) of the cell starting at or before `position`, or None before the first cell"""
+        index = bisect_right(self.offsets, position) - 1
+        if index < 0:
+            return None
+        return index // len(self.columns) + 1, index % len(self.columns)
+
+    def describe(self, position: int) -> Optional[Dict[str, Any]]:
+        """Cell coordinates for a text position, as reported with entities"""
+        cell = self.cell_at(position)
+        if cell is None:
+            return None
+        row, column = cell
+        location = {'row': row, 'column': self.columns[column], 'column_index': column}
+        if self.sheet is not None:
+            location['sheet'] = self.sheet
+        return location
+
+    def truncate(self, length: int) -> None:
+        """Drop cells starting at or after `length` (the text was cut there)"""
+        del self.offsets[bisect_left(self.offsets, length):]
+
+    def memory_usage(self) -> int:
+        return self.offsets.buffer_info()[1] * self.offsets.itemsize
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'columns': self.columns, 'sheet': self.sheet, 'offsets': self.offsets.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CellOffsetMap':
+        cell_map = cls(data['columns'], data.get('sheet'))
+        cell_map.offsets = array('i', data['offsets'])
+        return cell_map
@@ -0,0 +1,321 @@
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from src.models.cell_map import CellOffsetMap
+from src.models.document_store import DocumentStore, DocumentWriter
+
+class CompactDocument:
+    """Uploaded document held as its text plus an array-backed entity span table
+
+    Only the original text is kept as a string. Entities are stored as parallel
+    int32 arrays of start/end offsets and type ids into a small type table; the
+    entity text is sliced from the document on demand, and only entities whose
+    detected text differs from their slice keep an explicit override. Masked and
+    highlighted renderings are not stored, callers render them when requested.
+    The placeholder each entity gets when the whole document is masked can be
+    recorded once per span (`set_placeholders`), so a page is masked
+    consistently without looking at the entities before it.
+
+    After `move_to_store`, the text and span table live in a memory-mapped
+    session file and are read back per request (or per page of text).
+    """
+
+    def __init__(self, doc_id: str, filename: str, text: str, entities: List[Dict],
+                 entity_counts: Dict[str, int], file_info: Dict[str, Any], uploaded_at: str,
+                 word_count: int, text_length: int, cell_map: Optional[CellOffsetMap] = None):
+        """Initialize the document
+
+        Args:
+            doc_id: Document identifier
+            filename: Uploaded file name
+            text: Extracted document text
+            entities: Entity dicts with 'text', 'entity_type', 'start' and 'end'
+            entity_counts: Entity count per type
+            file_info: File metadata from the document processor
+            uploaded_at: Upload timestamp (ISO format)
+            word_count: Number of words in the text
+            text_length: Number of characters in the text
+            cell_map: Table cell offsets, for documents extracted from tables
+        """
+        self.id = doc_id
+        self.filename = filename
+        self.entity_counts = entity_counts
+        self.file_info = file_info
+        self.uploaded_at = uploaded_at
+        self.word_count = word_count
+        self.text_length = text_length
+        self.char_count = len(text)
+        self.cell_map = cell_map
+
+        self._text: Optional[str] = text
+        self._storage: Optional[Tuple[DocumentStore, Hashable, int, int, int]] = None
+        self.entity_types: List[str] = []
+        self.text_overrides: Dict[int, str] = {}  # span index -> entity text when it differs from the slice
+        self._type_ids = array('i')
+        self._starts = array('i')
+        self._ends = array('i')
+        self.placeholders: List[str] = []  # distinct placeholders, indexed by the placeholder id column
+        self._placeholder_ids: Optional[array] = None  # span index -> placeholder id, -1 when not masked
+        self._placeholder_offset: Optional[int] = None  # byte offset of the column once stored
+        self._add_entities(text, 0, entities)
+        self._writer: Optional[DocumentWriter] = None
+        self._text_parts: Optional[List[str]] = None
+
+    def _add_entities(self, text: str, offset: int, entities: List[Dict]) -> None:
+        """Append spans for entities of `text`, which starts at `offset` in the document"""
+        type_index = {entity_type: index for index, entity_type in enumerate(self.entity_types)}
+        for entity in sorted(entities, key=lambda e: (e['start'], e['end'])):
+            entity_type = entity['entity_type']
+            if entity_type not in type_index:
+                type_index[entity_type] = len(self.entity_types)
+                self.entity_types.append(entity_type)
+            start, end = entity['start'], entity['end']
+            if entity['text'] != text[start - offset:end - offset]:
+                self.text_overrides[len(self._starts)] = entity['text']
+            self._type_ids.append(type_index[entity_type])
+            self._starts.append(start)
+            self._ends.append(end)
+
+    @classmethod
+    def begin(cls, doc_id: str, filename: str, file_info: Dict[str, Any], uploaded_at: str,
+              writer: Optional[DocumentWriter] = None) -> 'CompactDocument':
+        """Start a document that is built window by window with `append_window`
+
+        With a writer the text goes straight to the document store and only the
+        span table is kept in memory until `finish`.
+        """
+        document = cls(doc_id, filename, '', [], {}, file_info, uploaded_at, 0, 0)
+        document._writer = writer
+        document._text_parts = []
+        return document
+
+    def append_window(self, offset: int, text: str, entities: List[Dict]) -> None:
+        """Append a window of text starting at `offset`, with its entities (document offsets)
+
+        A gap between the previous window and `offset` is filled with newlines.
+        Entity counts are left to the caller (see `entity_counts`).
+        """
+        for piece in ('\n' * (offset - self.char_count), text):
+            if not piece:
+                continue
+            if self._writer is not None:
+                self._writer.append(piece)
+            else:
+                self._text_parts.append(piece)
+            self.char_count += len(piece)
+        self._add_entities(text, offset, entities)
+        self.word_count += len(text.split())
+
+    def finish(self) -> None:
+        """Complete a document started with `begin`"""
+        self.text_length = self.char_count
+        if self._writer is not None:
+            store, session_id = self._writer.store, self._writer.session_id
+            text_offset, _, spans_offset, span_count = self._writer.commit(self._starts, self._ends, self._type_ids)
+            self._storage = (store, session_id, text_offset, spans_offset, span_count)
+            self._text = None
+            self._type_ids = self._starts = self._ends = None
+        else:
+            self._text = ''.join(self._text_parts)
+        self._writer = None
+        self._text_parts = None
+
+    def move_to_store(self, store: DocumentStore, session_id: Hashable) -> None:
+        """Write the text and span table to `store` and release the in-memory copies"""
+        text_offset, _, spans_offset, span_count = store.write(
+            session_id, self._text, self._starts, self._ends, self._type_ids
+        )
+        self._storage = (store, session_id, text_offset, spans_offset, span_count)
+        self._text = None
+        self._type_ids = self._starts = self._ends = None
+        if self._placeholder_ids is not None:
+            self.set_placeholders(self._placeholder_ids, self.placeholders)
+
+    @property
+    def original_text(self) -> str:
+        """The full document text"""
+        return self.text_slice(0, self.char_count)
+
+    def text_slice(self, start: int, end: int) -> str:
+        """Characters [start, end) of the document, read without loading the rest"""
+        start, end = max(start, 0), min(end, self.char_count)
+        if self._storage is None:
+            return self._text[start:end]
+        store, session_id, text_offset, _, _ = self._storage
+        return store.read_text(session_id, text_offset, start, end)
+
+    def spans(self) -> Tuple[array, array, array]:
+        """The span table as (starts, ends, type ids), sorted by position"""
+        if self._storage is None:
+            return self._starts, self._ends, self._type_ids
+        store, session_id, _, spans_offset, span_count = self._storage
+        return store.read_spans(session_id, spans_offset, span_count)
+
+    @property
+    def entities(self) -> List[Dict]:
+        """Entity dicts in document order (built on each access)"""
+        return self.entities_in(0, self.char_count)
+
+    def entities_in(self, start: int, end: int, relative: bool = False) -> List[Dict]:
+        """Entity dicts fully inside [start, end)
+
+        Args:
+            start: Range start offset
+            end: Range end offset
+            relative: Shift offsets so they are relative to `start`
+
+        Returns:
+            List of entity dicts in document order
+        """
+        starts, ends, type_ids = self.spans()
+        segment = self.text_slice(start, end)
+        shift = start if relative else 0
+        entities = []
+        for index in range(len(starts)):
+            if starts[index] >= start and ends[index] <= end:
+                entities.append(self._with_cell({
+                    'text': self.text_overrides.get(index, segment[starts[index] - start:ends[index] - start]),
+                    'entity_type': self.entity_types[type_ids[index]],
+                    'start': starts[index] - shift,
+                    'end': ends[index] - shift
+                }, starts[index]))
+        return entities
+
+    def _with_cell(self, entity: Dict, position: int) -> Dict:
+        """Add the table cell containing `position` to an entity dict, when the document has a cell map"""
+        if self.cell_map is not None:
+            cell = self.cell_map.describe(position)
+            if cell is not None:
+                entity['cell'] = cell
+        return entity
+
+    def iter_entities(self, page_size: int) -> Iterator[Dict]:
+        """Entity dicts in document order, with their span 'index'
+
+        The text is read one page of at least `page_size` characters at a
+        time, so a stored document is never decoded as a whole.
+        """
+        starts, ends, type_ids = self.spans()
+        window_start = window_end = 0
+        window = ''
+        for index in range(len(starts)):
+            start, end = starts[index], ends[index]
+            if start < window_start or end > window_end:
+                window_start, window_end = start, max(end, start + page_size)
+                window = self.text_slice(window_start, window_end)
+            yield {
+                'index': index,
+                'text': self.text_overrides.get(index, window[start - window_start:end - window_start]),
+                'entity_type': self.entity_types[type_ids[index]],
+                'start': start,
+                'end': end
+            }
+
+    @property
+    def has_placeholders(self) -> bool:
+        return self._placeholder_ids is not None or self._placeholder_offset is not None
+
+    def set_placeholders(self, placeholder_ids: array, placeholders: List[str]) -> None:
+        """Record the placeholder of every span (an index into `placeholders`, -1 when not masked)"""
+        self.placeholders = list(placeholders)
+        if self._storage is None:
+            self._placeholder_ids = placeholder_ids
+            return
+        store, session_id, _, _, _ = self._storage
+        self._placeholder_offset = store.append_column(session_id, placeholder_ids)
+        self._placeholder_ids = None
+
+    def _placeholder_column(self) -> array:
+        if self._placeholder_offset is None:
+            return self._placeholder_ids
+        store, session_id, _, _, span_count = self._storage
+        return store.read_column(session_id, self._placeholder_offset, span_count)
+
+    def placeholders_in(self, start: int, end: int) -> Dict[str, str]:
+        """Entity text -> recorded placeholder for the masked entities fully inside [start, end)"""
+        starts, ends, _ = self.spans()
+        placeholder_ids = self._placeholder_column()
+        segment = self.text_slice(start, end)
+        placeholders = {}
+        for index in range(bisect_left(starts, start), len(starts)):
+            if starts[index] >= end:
+                break
+            if ends[index] <= end and placeholder_ids[index] >= 0:
+                text = self.text_overrides.get(index, segment[starts[index] - start:ends[index] - start])
+                placeholders[text] = self.placeholders[placeholder_ids[index]]
+        return placeholders
+
+    def page_end(self, start: int, limit: int) -> int:
+        """End offset of a page starting at `start`, moved forward so no entity is cut"""
+        end = min(start + limit, self.char_count)
+        starts, ends, _ = self.spans()
+        for index in range(len(starts)):
+            if starts[index] < end < ends[index]:
+                end = ends[index]
+        return end
+
+    def summary(self) -> Dict[str, Any]:
+        """Document metadata without text or entities"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'uploaded_at': self.uploaded_at,
+            'text_length': self.text_length,
+            'word_count': self.word_count,
+            'entity_count': sum(self.entity_counts.values()) if self.entity_counts else 0,
+            'entity_types': list(self.entity_counts.keys()) if self.entity_counts else []
+        }
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held in process memory by the document"""
+        size = sum(sys.getsizeof(value) for value in self.text_overrides.values())
+        size += sum(sys.getsizeof(value) for value in self.placeholders)
+        if self._placeholder_ids is not None:
+            size += self._placeholder_ids.buffer_info()[1] * self._placeholder_ids.itemsize
+        if self._storage is None:
+            size += sys.getsizeof(self._text)
+            size += sum(a.buffer_info()[1] * a.itemsize for a in (self._type_ids, self._starts, self._ends))
+        if self.cell_map is not None:
+            size += self.cell_map.memory_usage()
+        return size
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to plain data (offsets as lists) for a session backend"""
+        starts, ends, type_ids = self.spans()
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'text': self.original_text,
+            'entity_types': self.entity_types,
+            'type_ids': type_ids.tolist(),
+            'starts': starts.tolist(),
+            'ends': ends.tolist(),
+            'text_overrides': {str(index): value for index, value in self.text_overrides.items()},
+            'placeholders': self.placeholders,
+            'placeholder_ids': self._placeholder_column().tolist() if self.has_placeholders else None,
+            'entity_counts': self.entity_counts,
+            'file_info': self.file_info,
+            'uploaded_at': self.uploaded_at,
+            'word_count': self.word_count,
+            'text_length': self.text_length,
+            'cell_map': self.cell_map.to_dict() if self.cell_map is not None else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CompactDocument':
+        """Inverse of `to_dict`"""
+        document = cls(
+            data['id'], data['filename'], data['text'], [], data['entity_counts'], data['file_info'],
+            data['uploaded_at'], data['word_count'], data['text_length'],
+            CellOffsetMap.from_dict(data['cell_map']) if data.get('cell_map') else None
+        )
+        document.entity_types = list(data['entity_types'])
+        document._type_ids = array('i', data['type_ids'])
+        document._starts = array('i', data['starts'])
+        document._ends = array('i', data['ends'])
+        document.text_overrides = {int(index): value for index, value in data.get('text_overrides', {}).items()}
+        if data.get('placeholder_ids') is not None:
+            document.set_placeholders(array('i', data['placeholder_ids']), data['placeholders'])
+        return document
@@ -0,0 +1,173 @@
+import logging
+import math
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+class TokenCounter:
+    """Count tokens locally for a target chat model
+
+    Uses tiktoken when it is installed and the encoding can be loaded. Otherwise
+    falls back to a conservative character-based estimate (one token per three
+    characters), which over-counts rather than under-counts for Arabic and English.
+    """
+
+    FALLBACK_CHARS_PER_TOKEN = 3
+    MESSAGE_OVERHEAD_TOKENS = 4  # role/separator tokens added per chat message
+
+    def __init__(self, model: str):
+        """Initialize the counter
+
+        Args:
+            model: Target chat model name (used to pick the tokenizer encoding)
+        """
+        self.model = model
+        self._encoding = None
+        self._encoding_loaded = False
+
+    def _get_encoding(self):
+        """Load the tiktoken encoding once, returning None when unavailable"""
+        if not self._encoding_loaded:
+            self._encoding_loaded = True
+            if tiktoken is not None:
+                try:
+                    try:
+                        self._encoding = tiktoken.encoding_for_model(self.model)
+                    except KeyError:
+                        self._encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken encoding unavailable, using estimate: {e}")
+                    self._encoding = None
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        """Count tokens in a piece of text"""
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / self.FALLBACK_CHARS_PER_TOKEN)
+
+    def count_message(self, message: Dict) -> int:
+        """Count tokens for a chat message including per-message overhead"""
+        return self.count(message.get("content", "")) + self.MESSAGE_OVERHEAD_TOKENS
+
+    def truncate(self, text: str, max_tokens: int, marker: str = "...[truncated]") -> str:
+        """Deterministically cut text to at most `max_tokens` tokens, keeping the head
+
+        Args:
+            text: Text to truncate
+            max_tokens: Token limit for the returned text (marker included)
+            marker: Suffix appended when text was cut
+
+        Returns:
+            The original text if it fits, otherwise its head followed by the marker
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+
+        keep = max(max_tokens - self.count(marker), 0)
+        encoding = self._get_encoding()
+        if encoding is not None:
+            head = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+        else:
+            head = text[:keep * self.FALLBACK_CHARS_PER_TOKEN]
+        return head + marker
+
+class ContextBuilder:
+    """Pack a chat prompt into a fixed token budget
+
+    The system prompt and the current message are always included. Document
+    context is then added up to its own budget, and conversation history fills
+    whatever is left, newest message first. Older turns are dropped, and the
+    oldest turn that only partially fits is truncated, so the same inputs always
+    produce the same prompt.
+    """
+
+    MIN_COMPRESSED_TOKENS = 64  # Don't keep a truncated history turn smaller than this
+
+    def __init__(self, model: str, token_budget: int, document_token_budget: int):
+        """Initialize the builder
+
+        Args:
+            model: Target chat model name
+            token_budget: Maximum prompt tokens for the whole request
+            document_token_budget: Maximum tokens spent on document context
+        """
+        self.model = model
+        self.token_budget = token_budget
+        self.document_token_budget = document_token_budget
+        self.counter = TokenCounter(model)
+
+    def build(self, system_prompt: str, history: List[Dict], current_message: str,
+              document_context: Optional[str] = None) -> List[Dict]:
+        """Build the chat messages for a request
+
+        Args:
+            system_prompt: Persona/system prompt (always kept intact)
+            history: Stored conversation history, oldest first
+            current_message: The (masked) user message for this turn
+            document_context: Optional document context, sent as a second system message
+
+        Returns:
+            OpenAI-style list of messages that fits within the token budget
+        """
+        system_message = {"role": "system", "content": system_prompt}
+        remaining = self.token_budget - self.counter.count_message(system_message)
+
+        # The current message always goes in; very long pastes are cut to what is left
+        overhead = TokenCounter.MESSAGE_OVERHEAD_TOKENS
+        user_content = self.counter.truncate(current_message, remaining - overhead, "...[message truncated]")
+        user_message = {"role": "user", "content": user_content}
+        remaining -= self.counter.count_message(user_message)
+
+        document_message = None
+        if document_context:
+            doc_budget = min(self.document_token_budget, remaining) - overhead
+            doc_content = self.counter.truncate(document_context, doc_budget, "\n...[document context truncated]")
+            if doc_content:
+                document_message = {"role": "system", "content": doc_content}
+                remaining -= self.counter.count_message(document_message)
+
+        packed_history = self._pack_history(history, remaining)
+
+        messages = [system_message]
+        if document_message:
+            messages.append(document_message)
+        messages.extend(packed_history)
+        messages.append(user_message)
+        return messages
+
+    def _pack_history(self, history: List[Dict], budget: int) -> List[Dict]:
+        """Select history messages newest-first until the budget is spent"""
+        packed = []
+        for message in reversed(history):
+            if budget <= 0:
+                break
+            entry = {"role": message.get("role", "user"), "content": message.get("content", "")}
+            cost = self.counter.count_message(entry)
+            if cost <= budget:
+                packed.append(entry)
+                budget -= cost
+                continue
+
+            # Compress the turn that straddles the budget boundary, then stop
+            content_budget = budget - TokenCounter.MESSAGE_OVERHEAD_TOKENS
+            if content_budget >= self.MIN_COMPRESSED_TOKENS:
+                entry["content"] = self.counter.truncate(entry["content"], content_budget)
+                packed.append(entry)
+            break
+
+        packed.reverse()
+        # Don't open the window with an assistant reply whose question was dropped
+        while packed and packed[0]["role"] == "assistant":
+            packed.pop(0)
+        return packed
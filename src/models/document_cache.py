@@ -0,0 +1,123 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.models.session_backend import decode_value, encode_value
+
+logger = logging.getLogger(__name__)
+
+class DocumentResultCache:
+    """Persistent cache of document analysis results keyed by file content
+
+    An entry holds what extraction and inference produced for one file: the
+    extracted text and its entity span table (a CompactDocument payload without
+    per-upload fields such as id and filename). Entries are keyed by the file's
+    MD5 together with the extractor and model versions, so re-uploading the
+    same file in any session skips both steps, and entries written by another
+    extractor or model version are dropped when the cache opens.
+
+    Entries live in a local SQLite database shared by all workers on the host.
+    The total encoded size is bounded; the least recently used entries are
+    evicted first.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS document_results ("
+        " content_hash TEXT NOT NULL, extractor_version TEXT NOT NULL, model_version TEXT NOT NULL,"
+        " payload BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL,"
+        " PRIMARY KEY (content_hash, extractor_version, model_version))",
+        "CREATE INDEX IF NOT EXISTS document_results_last_used ON document_results (last_used)",
+    )
+
+    def __init__(self, db_path: str, max_bytes: int, extractor_version: str, model_version: str):
+        """Initialize the cache
+
+        Args:
+            db_path: Path of the SQLite database file
+            max_bytes: Maximum total size of the encoded entries
+            extractor_version: Identifies the text extraction logic
+            model_version: Identifies the model weights and post-processing
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.extractor_version = extractor_version
+        self.model_version = model_version
+        self.hits = 0
+        self.misses = 0
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            stale = conn.execute(
+                "DELETE FROM document_results WHERE extractor_version != ? OR model_version != ?",
+                (extractor_version, model_version)
+            ).rowcount
+        if stale:
+            logger.info(f"Dropped {stale} cached document results from previous extractor/model versions")
+        logger.info(f"Document result cache ready at {db_path} (extractor {extractor_version}, model {model_version})")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _key(self, content_hash: str):
+        return content_hash, self.extractor_version, self.model_version
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a file's content hash, or None"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT payload FROM document_results"
+            " WHERE content_hash = ? AND extractor_version = ? AND model_version = ?",
+            self._key(content_hash)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        conn.execute(
+            "UPDATE document_results SET last_used = ?"
+            " WHERE content_hash = ? AND extractor_version = ? AND model_version = ?",
+            (time.time(), *self._key(content_hash))
+        )
+        self.hits += 1
+        return decode_value(row[0])
+
+    def put(self, content_hash: str, payload: Dict[str, Any]) -> None:
+        """Store a result and evict least recently used entries past the size bound"""
+        value = encode_value(payload)
+        if len(value) > self.max_bytes:
+            return
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO document_results"
+                " (content_hash, extractor_version, model_version, payload, size, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (*self._key(content_hash), value, len(value), time.time())
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM document_results").fetchone()[0]
+            evicted = 0
+            while total > self.max_bytes:
+                row = conn.execute(
+                    "SELECT rowid, size FROM document_results ORDER BY last_used LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    break
+                conn.execute("DELETE FROM document_results WHERE rowid = ?", (row[0],))
+                total -= row[1]
+                evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} cached document results ({total} bytes cached)")
@@ -0,0 +1,216 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+class DocumentIndex:
+    """Per-session BM25 lexical index over document chunks
+
+    Documents are split into chunks whose boundaries never cut through a detected
+    entity. Index terms are taken from a masked rendering of each chunk, where every
+    entity span is replaced by its type, so raw PII never enters the index. The
+    index lives in process memory, needs no external service, and supports adding
+    and removing documents without rebuilding.
+    """
+
+    TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+    PLACEHOLDER_PATTERN = re.compile(
+        r'^(person|location|organization|email|phone|url|civilid|passport|creditcard|bankaccount|entity)\d+$'
+    )
+    ARABIC_NORMALIZATION = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ى': 'ي', 'ة': 'ه', 'ـ': None})
+    PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+
+    def __init__(self, chunk_size: int = 800, k1: float = 1.5, b: float = 0.75):
+        """Initialize an empty index
+
+        Args:
+            chunk_size: Target chunk length in characters
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.chunk_size = chunk_size
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.chunk_lengths: Dict[int, int] = {}
+        self.chunk_spans: Dict[int, Tuple[str, int, int]] = {}  # chunk id -> (doc_id, start, end)
+        self.doc_chunks: Dict[str, List[int]] = {}
+        self.total_length = 0
+        self._next_chunk_id = 0
+
+    def __len__(self) -> int:
+        return len(self.chunk_lengths)
+
+    def tokenize(self, text: str) -> List[str]:
+        """Split text into normalized index terms
+
+        Placeholder tokens (Person1, Location2, ...) are dropped because their
+        numbering is only meaningful inside one masking scope.
+        """
+        terms = []
+        for token in self.TOKEN_PATTERN.findall(text.lower().translate(self.ARABIC_NORMALIZATION)):
+            if len(token) < 2 or self.PLACEHOLDER_PATTERN.match(token):
+                continue
+            # Light Arabic stemming: drop the definite article and its conjunction forms
+            for prefix in ('وال', 'بال', 'فال', 'كال', 'لل', 'ال'):
+                if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+                    token = token[len(prefix):]
+                    break
+            terms.append(token)
+        return terms
+
+    def add_document(self, doc_id: str, text: str, entities: List[Dict]) -> int:
+        """Chunk and index a document, replacing any previous version
+
+        Args:
+            doc_id: Document identifier
+            text: Original document text (only its masked rendering is indexed)
+            entities: Entity dicts with 'entity_type', 'start' and 'end'
+
+        Returns:
+            Number of chunks indexed
+        """
+        if doc_id in self.doc_chunks:
+            self.remove_document(doc_id)
+        return self.extend_document(doc_id, text, entities)
+
+    def extend_document(self, doc_id: str, text: str, entities: List[Dict], offset: int = 0) -> int:
+        """Chunk and index a further part of a document that is being indexed piecewise
+
+        Args:
+            doc_id: Document identifier
+            text: Text of this part of the document
+            entities: Entity dicts of this part, with document offsets
+            offset: Offset of `text` in the document
+
+        Returns:
+            Number of chunks indexed
+        """
+        spans = sorted((e['start'] - offset, e['end'] - offset, e['entity_type']) for e in entities)
+        chunk_ids = self.doc_chunks.setdefault(doc_id, [])
+        indexed = 0
+        for start, end in self._chunk_boundaries(text, spans):
+            terms = self.tokenize(self._masked_terms_text(text, start, end, spans))
+            if not terms:
+                continue
+            chunk_id = self._next_chunk_id
+            self._next_chunk_id += 1
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+            self.chunk_lengths[chunk_id] = len(terms)
+            self.chunk_spans[chunk_id] = (doc_id, start + offset, end + offset)
+            self.total_length += len(terms)
+            chunk_ids.append(chunk_id)
+            indexed += 1
+        return indexed
+
+    def remove_document(self, doc_id: str) -> None:
+        """Remove a document's chunks from the index"""
+        for chunk_id in self.doc_chunks.pop(doc_id, []):
+            self.total_length -= self.chunk_lengths.pop(chunk_id, 0)
+            self.chunk_spans.pop(chunk_id, None)
+        # Drop postings that point at removed chunks
+        for term in list(self.postings):
+            chunk_tfs = self.postings[term]
+            for chunk_id in [c for c in chunk_tfs if c not in self.chunk_lengths]:
+                del chunk_tfs[chunk_id]
+            if not chunk_tfs:
+                del self.postings[term]
+
+    def search(self, query: str, top_k: int = 4, doc_ids: Optional[List[str]] = None) -> List[Dict]:
+        """Rank chunks against a (masked) query with BM25
+
+        Args:
+            query: Query text
+            top_k: Number of chunks to return
+            doc_ids: Optional restriction to these documents
+
+        Returns:
+            List of dicts with 'doc_id', 'start', 'end' and 'score', best first
+        """
+        n_chunks = len(self.chunk_lengths)
+        if not n_chunks:
+            return []
+
+        avg_length = self.total_length / n_chunks
+        allowed = set(doc_ids) if doc_ids is not None else None
+        scores: Dict[int, float] = {}
+        for term in set(self.tokenize(query)):
+            chunk_tfs = self.postings.get(term)
+            if not chunk_tfs:
+                continue
+            idf = math.log(1 + (n_chunks - len(chunk_tfs) + 0.5) / (len(chunk_tfs) + 0.5))
+            for chunk_id, tf in chunk_tfs.items():
+                if allowed is not None and self.chunk_spans[chunk_id][0] not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.chunk_lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        results = []
+        for chunk_id, score in ranked:
+            doc_id, start, end = self.chunk_spans[chunk_id]
+            results.append({'doc_id': doc_id, 'start': start, 'end': end, 'score': score})
+        return results
+
+    def _chunk_boundaries(self, text: str, spans: List[Tuple[int, int, str]]) -> List[Tuple[int, int]]:
+        """Split text into paragraph-packed chunks that never cut an entity"""
+        # Paragraph-sized pieces first, hard-splitting paragraphs longer than a chunk
+        pieces = []
+        position = 0
+        for match in self.PARAGRAPH_SPLIT.finditer(text):
+            pieces.append((position, match.end()))
+            position = match.end()
+        pieces.append((position, len(text)))
+
+        boundaries = []
+        chunk_start = None
+        chunk_end = None
+        for piece_start, piece_end in pieces:
+            while piece_end - piece_start > self.chunk_size:
+                split_at = text.rfind(' ', piece_start, piece_start + self.chunk_size)
+                if split_at <= piece_start:
+                    split_at = piece_start + self.chunk_size
+                if chunk_start is not None:
+                    boundaries.append((chunk_start, chunk_end))
+                    chunk_start = None
+                boundaries.append((piece_start, split_at))
+                piece_start = split_at
+            if chunk_start is None:
+                chunk_start, chunk_end = piece_start, piece_end
+            elif piece_end - chunk_start <= self.chunk_size:
+                chunk_end = piece_end
+            else:
+                boundaries.append((chunk_start, chunk_end))
+                chunk_start, chunk_end = piece_start, piece_end
+        if chunk_start is not None and chunk_end > chunk_start:
+            boundaries.append((chunk_start, chunk_end))
+
+        # Move each cut forward past any entity it would split
+        adjusted = []
+        previous_end = 0
+        for index, (start, end) in enumerate(boundaries):
+            start = max(start, previous_end)
+            if index < len(boundaries) - 1:
+                for span_start, span_end, _ in spans:
+                    if span_start < end < span_end:
+                        end = span_end
+            else:
+                end = len(text)
+            if end > start:
+                adjusted.append((start, end))
+                previous_end = end
+        return adjusted
+
+    def _masked_terms_text(self, text: str, start: int, end: int, spans: List[Tuple[int, int, str]]) -> str:
+        """Render a chunk with every entity replaced by its type label"""
+        parts = []
+        cursor = start
+        for span_start, span_end, entity_type in spans:
+            if span_end <= cursor or span_start >= end:
+                continue
+            parts.append(text[cursor:max(span_start, cursor)])
+            parts.append(f" {entity_type} ")
+            cursor = span_end
+        parts.append(text[cursor:end])
+        return ''.join(parts)
@@ -5,22 +5,142 @@ Handles text extraction from various document formats with PII detection integra
 
 import os
 import io
+import asyncio
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 import hashlib
 from datetime import datetime
 import re
+import codecs
+import zipfile
+import xml.etree.ElementTree as ET
 
 
 import PyPDF2
-from docx import Document
+import numpy as np
 import pandas as pd
+import chardet
 import openpyxl
 from openpyxl import load_workbook
 
+from src.models.cell_map import CellOffsetMap
+from src.models.extraction_pool import ExtractionPool, WorkerCrashed
+from src.models.extractor_registry import ExtractorBackend, ExtractorRegistry
+from src.models.text_normalizer import TextNormalizer
+from src.models.upload_spool import SpooledUpload
+
 logger = logging.getLogger(__name__)
 
+# WordprocessingML element and attribute names read by the DOCX extractor
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_W_P, _W_T, _W_TAB, _W_BR, _W_CR = _W + 'p', _W + 't', _W + 'tab', _W + 'br', _W + 'cr'
+_W_TBL, _W_TR, _W_TC, _W_TCPR = _W + 'tbl', _W + 'tr', _W + 'tc', _W + 'tcPr'
+_W_VMERGE, _W_HMERGE, _W_VAL = _W + 'vMerge', _W + 'hMerge', _W + 'val'
+
+# Raw upload bytes, or an upload spooled by the ingestion layer (picklable either way)
+DocumentSource = Union[bytes, SpooledUpload]
+
+def _open_source(file_content: DocumentSource) -> BinaryIO:
+    """Binary file object over a document source"""
+    if isinstance(file_content, SpooledUpload):
+        return file_content.open()
+    return io.BytesIO(file_content)
+
+def _read_source(file_content: DocumentSource) -> bytes:
+    """A document source's content as bytes"""
+    if isinstance(file_content, SpooledUpload):
+        return file_content.read()
+    return file_content
+
+_worker_processor = None
+
+def _get_worker_processor() -> 'DocumentProcessor':
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    return _worker_processor
+
+def _extract_in_worker(file_content: DocumentSource, filename: str, backend: Optional[str] = None) -> Dict[str, Any]:
+    """Extraction entry point inside a pool process (one processor per process)"""
+    return _get_worker_processor().extract_document(file_content, filename, backend)
+
+def _finish_in_worker(filename: str, file_info: Dict[str, Any], extracted_text: str) -> Dict[str, Any]:
+    """Clean text assembled from page shards and build the result dict inside a pool process"""
+    return _get_worker_processor()._build_result(filename, file_info, extracted_text)
+
+def _count_pdf_pages(file_content: DocumentSource) -> int:
+    """Number of pages in a PDF"""
+    try:
+        with _open_source(file_content) as source:
+            return len(PyPDF2.PdfReader(source).pages)
+    except Exception as e:
+        logger.error(f"PDF extraction error: {e}")
+        raise ValueError("Failed to extract text from PDF file")
+
+def _iter_pdf_pages(file_content: DocumentSource, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """Yield pages [start, stop) of a PDF (to the last page if `stop` is None) as "[Page N]" text parts
+    
+    Each call opens the PDF on its own, so page ranges can be extracted in
+    separate processes. A page that fails yields an error marker instead of
+    failing the range.
+    """
+    with _open_source(file_content) as source:
+        try:
+            pdf_reader = PyPDF2.PdfReader(source)
+            pages = pdf_reader.pages
+            stop = len(pages) if stop is None else min(stop, len(pages))
+        except Exception as e:
+            logger.error(f"PDF extraction error: {e}")
+            raise ValueError("Failed to extract text from PDF file")
+        
+        for page_num in range(start, stop):
+            try:
+                page_text = pages[page_num].extract_text()
+                if page_text.strip():
+                    yield f"[Page {page_num + 1}]\n{page_text}\n"
+            except Exception as e:
+                logger.warning(f"Error extracting page {page_num + 1}: {e}")
+                yield f"[Page {page_num + 1} - Extraction Error]\n"
+
+def _extract_pdf_pages(file_content: DocumentSource, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """List form of `_iter_pdf_pages`, returned from pool processes"""
+    return list(_iter_pdf_pages(file_content, start, stop))
+
+def _open_pymupdf(file_content: DocumentSource):
+    """PyMuPDF document over a source (optional dependency, imported on use)"""
+    import fitz
+    
+    try:
+        if isinstance(file_content, SpooledUpload) and not file_content.in_memory:
+            return fitz.open(file_content.path, filetype='pdf')
+        return fitz.open(stream=_read_source(file_content), filetype='pdf')
+    except Exception as e:
+        logger.error(f"PDF extraction error: {e}")
+        raise ValueError("Failed to extract text from PDF file")
+
+def _count_pymupdf_pages(file_content: DocumentSource) -> int:
+    """Number of pages in a PDF, read with PyMuPDF"""
+    with _open_pymupdf(file_content) as document:
+        return document.page_count
+
+def _iter_pymupdf_pages(file_content: DocumentSource, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """PyMuPDF counterpart of `_iter_pdf_pages`, in the same "[Page N]" format"""
+    with _open_pymupdf(file_content) as document:
+        stop = document.page_count if stop is None else min(stop, document.page_count)
+        for page_num in range(start, stop):
+            try:
+                page_text = document.load_page(page_num).get_text()
+                if page_text.strip():
+                    yield f"[Page {page_num + 1}]\n{page_text}\n"
+            except Exception as e:
+                logger.warning(f"Error extracting page {page_num + 1}: {e}")
+                yield f"[Page {page_num + 1} - Extraction Error]\n"
+
+def _extract_pymupdf_pages(file_content: DocumentSource, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """List form of `_iter_pymupdf_pages`, returned from pool processes"""
+    return list(_iter_pymupdf_pages(file_content, start, stop))
+
 class DocumentProcessor:
     """
     Document processing class that extracts text from various formats
@@ -38,22 +158,102 @@ class DocumentProcessor:
         '.csv': 'text/csv'
     }
     
+    EXTRACTOR_VERSION = 5  # bump when extraction output changes (invalidates cached results)
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
     MAX_TEXT_LENGTH = 100000  # 100k characters
+    SEGMENT_ROWS = 200  # spreadsheet/CSV rows per streamed segment
+    SEGMENT_CHARS = 4000  # approximate characters per streamed plain text segment
+    CSV_CHUNK_ROWS = 50000  # CSV rows parsed per chunk
+    CSV_SEPARATOR = ' | '
+    ENCODING_SAMPLE_BYTES = 64 * 1024  # bytes read for encoding detection
     
-    def __init__(self):
-        """Initialize the document processor"""
+    def __init__(self, extraction_workers: int = 0, extraction_timeout: float = 60,
+                 pdf_pages_per_shard: int = 0, benchmarks_path: str = ''):
+        """Initialize the document processor
+        
+        Args:
+            extraction_workers: Size of the process pool parsing documents; 0 extracts
+                in a thread of this process instead
+            extraction_timeout: Seconds a pooled extraction may run before it is
+                abandoned and the worker processes running it are replaced
+            pdf_pages_per_shard: With a pool, PDFs (and other documents with a
+                page-parallel backend) longer than this many pages are split into
+                page ranges extracted in parallel; 0 disables sharding
+            benchmarks_path: Optional extractor benchmark results (JSON) used to
+                rank backends by measured throughput
+        """
         self.temp_dir = Path("temp_uploads")
+        self.text_normalizer = TextNormalizer()
         self.temp_dir.mkdir(exist_ok=True)
+        self.extraction_workers = extraction_workers
+        self.extraction_timeout = extraction_timeout
+        self.pdf_pages_per_shard = pdf_pages_per_shard
+        self._pool: Optional[ExtractionPool] = None
+        self.registry = self._build_registry()
+        if benchmarks_path:
+            self.registry.load_benchmarks(benchmarks_path)
+    
+    def _build_registry(self) -> ExtractorRegistry:
+        """Register the built-in extractor backends"""
+        registry = ExtractorRegistry()
+        registry.register(ExtractorBackend(
+            'pymupdf', ['.pdf'], lambda source: ('\n'.join(_iter_pymupdf_pages(source)), None),
+            iter_segments=_iter_pymupdf_pages, count_pages=_count_pymupdf_pages,
+            extract_pages=_extract_pymupdf_pages, requires=['fitz'], rank=10
+        ))
+        registry.register(ExtractorBackend(
+            'pypdf2', ['.pdf'], lambda source: (self._extract_from_pdf(source), None),
+            iter_segments=_iter_pdf_pages, count_pages=_count_pdf_pages,
+            extract_pages=_extract_pdf_pages, requires=['PyPDF2'], rank=50
+        ))
+        registry.register(ExtractorBackend(
+            'docx-xml', ['.docx', '.doc'], lambda source: (self._extract_from_docx(source), None),
+            iter_segments=self._iter_docx_segments, rank=50
+        ))
+        registry.register(ExtractorBackend(
+            'text', ['.txt', '.md'], lambda source: (self._extract_from_text(source), None),
+            iter_segments=self._iter_text_segments, rank=50
+        ))
+        registry.register(ExtractorBackend(
+            'openpyxl', ['.xlsx', '.xls'], lambda source: (self._extract_from_excel(source), None),
+            iter_segments=self._iter_excel_segments, requires=['openpyxl'], rank=50
+        ))
+        registry.register(ExtractorBackend(
+            'pandas', ['.csv'], self._extract_from_csv, iter_segments=self._iter_csv_segments,
+            offsets=True, requires=['pandas', 'chardet'], rank=50
+        ))
+        return registry
+    
+    def extractor_fingerprint(self) -> str:
+        """Identifies the extraction output: extractor version, text limit and the backend chosen per format"""
+        chosen = []
+        for extension in self.registry.formats():
+            backends = self.registry.backends(extension)
+            chosen.append(f"{extension}={backends[0].name if backends else '-'}")
+        return f"{self.EXTRACTOR_VERSION}:{self.MAX_TEXT_LENGTH}:{','.join(chosen)}"
+    
+    def _get_pool(self) -> ExtractionPool:
+        if self._pool is None:
+            self._pool = ExtractionPool(self.extraction_workers)
+        return self._pool
+    
+    def close(self) -> None:
+        """Shut down the extraction pool"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
         
     def is_supported_format(self, filename: str) -> bool:
         """Check if file format is supported"""
         file_ext = Path(filename).suffix.lower()
         return file_ext in self.SUPPORTED_FORMATS
     
-    def get_file_info(self, file_content: bytes, filename: str) -> Dict[str, Any]:
+    def get_file_info(self, file_content: DocumentSource, filename: str) -> Dict[str, Any]:
         """Extract file metadata"""
-        file_hash = hashlib.md5(file_content).hexdigest()
+        if isinstance(file_content, SpooledUpload):
+            file_hash = file_content.md5  # hashed while the upload streamed in
+        else:
+            file_hash = hashlib.md5(file_content).hexdigest()
         file_size = len(file_content)
         file_ext = Path(filename).suffix.lower()
         
@@ -66,129 +266,264 @@ class DocumentProcessor:
             'uploaded_at': datetime.now().isoformat()
         }
     
-    async def process_document(self, file_content: bytes, filename: str) -> Dict[str, Any]:
+    async def process_document(self, file_content: DocumentSource, filename: str) -> Dict[str, Any]:
         """
         Main document processing function
         
+        Extraction runs off the event loop: in a pool process when extraction
+        workers are configured (parsers hold the GIL, so a thread would still slow
+        every request), otherwise in a worker thread.
+        
         Args:
-            file_content: Raw file bytes
+            file_content: Raw file bytes or a spooled upload
             filename: Original filename
             
         Returns:
             Dictionary containing extracted text and metadata
         """
+        if self.extraction_workers <= 0:
+            return await asyncio.to_thread(self.extract_document, file_content, filename)
+        
         try:
-            # Validate file
-            if len(file_content) > self.MAX_FILE_SIZE:
-                raise ValueError(f"File too large. Maximum size: {self.MAX_FILE_SIZE / (1024*1024):.1f}MB")
+            return await asyncio.wait_for(self._extract_pooled(file_content, filename), timeout=self.extraction_timeout)
+        except asyncio.TimeoutError:
+            # Cancelling the extraction terminated the workers running it; other documents are unaffected
+            logger.error(f"Extraction of {filename} timed out after {self.extraction_timeout}s")
+            error = f"Document extraction timed out after {self.extraction_timeout:g} seconds"
+        except WorkerCrashed as e:
+            logger.error(f"Extraction worker crashed while processing {filename}: {e}")
+            error = "Document extraction failed"
+        return {
+            'success': False,
+            'error': error,
+            'file_info': self.get_file_info(file_content, filename) if file_content else None
+        }
+    
+    async def _extract_pooled(self, file_content: DocumentSource, filename: str) -> Dict[str, Any]:
+        """Extract in the process pool, sharding long documents by page range"""
+        pool = self._get_pool()
+        try:
+            self._validate(file_content, filename)
+            backend = self.registry.select(Path(filename).suffix.lower())
+        except ValueError as e:
+            return self._failure(file_content, filename, e)
+        if self.pdf_pages_per_shard <= 0 or not backend.page_parallel:
+            return await pool.run(_extract_in_worker, file_content, filename, backend.name)
+        
+        try:
+            page_count = await pool.run(backend.count_pages, file_content)
+            if page_count <= self.pdf_pages_per_shard:
+                return await pool.run(_extract_in_worker, file_content, filename, backend.name)
             
-            if not self.is_supported_format(filename):
-                raise ValueError(f"Unsupported file format. Supported: {', '.join(self.SUPPORTED_FORMATS.keys())}")
+            shard_size = self.pdf_pages_per_shard
+            shards = [
+                pool.run(backend.extract_pages, file_content, start, start + shard_size)
+                for start in range(0, page_count, shard_size)
+            ]
+            text_parts = [part for shard in await asyncio.gather(*shards) for part in shard]
+            logger.info(f"Extracted {page_count} pages from {filename} with {backend.name} in {len(shards)} shards")
             
-            # Get file info
             file_info = self.get_file_info(file_content, filename)
-            
+            return await pool.run(_finish_in_worker, filename, file_info, '\n'.join(text_parts))
+        except ValueError as e:
+            return self._failure(file_content, filename, e)
+    
+    def _validate(self, file_content: DocumentSource, filename: str, check_size: bool = True) -> None:
+        """Raise ValueError for files that are too large (unless `check_size` is false) or of an unsupported format"""
+        if check_size and len(file_content) > self.MAX_FILE_SIZE:
+            raise ValueError(f"File too large. Maximum size: {self.MAX_FILE_SIZE / (1024*1024):.1f}MB")
+        
+        if not self.is_supported_format(filename):
+            raise ValueError(f"Unsupported file format. Supported: {', '.join(self.SUPPORTED_FORMATS.keys())}")
+    
+    def _build_result(self, filename: str, file_info: Dict[str, Any], extracted_text: str,
+                      cell_map: Optional[CellOffsetMap] = None) -> Dict[str, Any]:
+        """Clean extracted text and wrap it in the success result dict
+        
+        Text extracted with a cell offset map is already normalized and is not
+        cleaned again (cleaning would shift the offsets); the map is returned
+        as `cell_map`.
+        """
+        if cell_map is None:
+            cleaned_text = self._clean_extracted_text(extracted_text)
+        else:
+            cleaned_text = extracted_text
+        
+        if len(cleaned_text) > self.MAX_TEXT_LENGTH:
+            cleaned_text = cleaned_text[:self.MAX_TEXT_LENGTH] + "\n\n[Text truncated due to length limit]"
+            if cell_map is not None:
+                cell_map.truncate(self.MAX_TEXT_LENGTH)
+        
 
-            file_ext = Path(filename).suffix.lower()
-            
-            if file_ext == '.pdf':
-                extracted_text = self._extract_from_pdf(file_content)
-            elif file_ext in ['.docx', '.doc']:
-                extracted_text = self._extract_from_docx(file_content)
-            elif file_ext in ['.txt', '.md']:
-                extracted_text = self._extract_from_text(file_content)
-            elif file_ext in ['.xlsx', '.xls']:
-                extracted_text = self._extract_from_excel(file_content)
-            elif file_ext == '.csv':
-                extracted_text = self._extract_from_csv(file_content)
-            else:
-                raise ValueError(f"No processor available for {file_ext}")
+        result = {
+            'success': True,
+            'text': cleaned_text,
+            'file_info': file_info,
+            'text_length': len(cleaned_text),
+            'word_count': len(cleaned_text.split()),
+            'processing_time': datetime.now().isoformat()
+        }
+        if cell_map is not None:
+            result['cell_map'] = cell_map
+        
+        logger.info(f"Successfully processed {filename}: {len(cleaned_text)} characters extracted")
+        return result
+    
+    def _failure(self, file_content: DocumentSource, filename: str, error: Exception) -> Dict[str, Any]:
+        logger.error(f"Error processing document {filename}: {str(error)}")
+        return {
+            'success': False,
+            'error': str(error),
+            'file_info': self.get_file_info(file_content, filename) if file_content else None
+        }
+    
+    def extract_document(self, file_content: DocumentSource, filename: str,
+                         backend: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Synchronous text extraction behind `process_document`
+        
+        Args:
+            file_content: Raw file bytes or a spooled upload
+            filename: Original filename
+            backend: Extractor backend name; the fastest available one for the
+                format when omitted
             
-            # Clean and validate extracted text
-            cleaned_text = self._clean_extracted_text(extracted_text)
+        Returns:
+            Dictionary containing extracted text and metadata
+        """
+        try:
+            # Validate file
+            self._validate(file_content, filename)
             
-            if len(cleaned_text) > self.MAX_TEXT_LENGTH:
-                cleaned_text = cleaned_text[:self.MAX_TEXT_LENGTH] + "\n\n[Text truncated due to length limit]"
+            # Get file info
+            file_info = self.get_file_info(file_content, filename)
             
 
-            result = {
-                'success': True,
-                'text': cleaned_text,
-                'file_info': file_info,
-                'text_length': len(cleaned_text),
-                'word_count': len(cleaned_text.split()),
-                'processing_time': datetime.now().isoformat()
-            }
+            file_ext = Path(filename).suffix.lower()
+            extractor = self.registry.get(file_ext, backend) if backend else self.registry.select(file_ext)
+            extracted_text, cell_map = extractor.extract(file_content)
             
-            logger.info(f"Successfully processed {filename}: {len(cleaned_text)} characters extracted")
-            return result
+            # Clean and validate extracted text
+            return self._build_result(filename, file_info, extracted_text, cell_map)
             
         except Exception as e:
-            logger.error(f"Error processing document {filename}: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'file_info': self.get_file_info(file_content, filename) if file_content else None
-            }
-    
-    def _extract_from_pdf(self, file_content: bytes) -> str:
+            return self._failure(file_content, filename, e)
+    
+    def _extract_from_pdf(self, file_content: DocumentSource) -> str:
         """Extract text from PDF files"""
-        try:
-            pdf_file = io.BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            text_parts = []
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text.strip():
-                        text_parts.append(f"[Page {page_num + 1}]\n{page_text}\n")
-                except Exception as e:
-                    logger.warning(f"Error extracting page {page_num + 1}: {e}")
-                    text_parts.append(f"[Page {page_num + 1} - Extraction Error]\n")
-            
-            return '\n'.join(text_parts)
-            
-        except Exception as e:
-            logger.error(f"PDF extraction error: {e}")
-            raise ValueError("Failed to extract text from PDF file")
+        return '\n'.join(_extract_pdf_pages(file_content))
     
-    def _extract_from_docx(self, file_content: bytes) -> str:
+    def _extract_from_docx(self, file_content: DocumentSource) -> str:
         """Extract text from DOCX files"""
+        return '\n'.join(self._iter_docx_segments(file_content))
+    
+    def _docx_body_part(self, archive: zipfile.ZipFile) -> str:
+        """Name of the main document part, from the package relationships"""
         try:
-            docx_file = io.BytesIO(file_content)
-            document = Document(docx_file)
-            
-            text_parts = []
-            
-            # Extract paragraphs
-            for paragraph in document.paragraphs:
-                if paragraph.text.strip():
-                    text_parts.append(paragraph.text)
-            
-            # Extract tables
-            for table in document.tables:
-                table_text = []
-                for row in table.rows:
-                    row_text = []
-                    for cell in row.cells:
-                        if cell.text.strip():
-                            row_text.append(cell.text.strip())
-                    if row_text:
-                        table_text.append(' | '.join(row_text))
-                
-                if table_text:
-                    text_parts.append('\n[Table]\n' + '\n'.join(table_text) + '\n[End Table]\n')
-            
-            return '\n'.join(text_parts)
+            with archive.open('_rels/.rels') as rels:
+                for relationship in ET.parse(rels).getroot():
+                    if relationship.get('Type', '').endswith('/officeDocument'):
+                        return relationship.get('Target', '').lstrip('/')
+        except KeyError:
+            pass
+        return 'word/document.xml'
+    
+    def _docx_text(self, element: ET.Element) -> str:
+        """Run text of a paragraph or cell, with tabs and line breaks"""
+        parts = []
+        for node in element.iter():
+            if node.tag == _W_T and node.text:
+                parts.append(node.text)
+            elif node.tag == _W_TAB:
+                parts.append('\t')
+            elif node.tag in (_W_BR, _W_CR):
+                parts.append('\n')
+            elif node.tag == _W_P and parts and parts[-1] != '\n':
+                parts.append('\n')
+        return ''.join(parts).strip()
+    
+    def _docx_row_text(self, row: ET.Element) -> str:
+        """A table row's cell texts joined with ' | ', without merged-cell continuations"""
+        cells = []
+        for cell in row.findall(_W_TC):
+            properties = cell.find(_W_TCPR)
+            if properties is not None:
+                # Continuation of a vertically (or legacy horizontally) merged cell holds no text of its own
+                merge = properties.find(_W_VMERGE)
+                if merge is None:
+                    merge = properties.find(_W_HMERGE)
+                if merge is not None and merge.get(_W_VAL, 'continue') == 'continue':
+                    continue
+            text = ' '.join(self._docx_text(cell).split())
+            if text:
+                cells.append(text)
+        return ' | '.join(cells)
+    
+    def _iter_docx_segments(self, file_content: DocumentSource) -> Iterator[str]:
+        """Yield a DOCX document's body paragraphs and tables in document order
+        
+        word/document.xml is parsed incrementally and each paragraph or table
+        row is dropped from the tree once read, so memory stays flat however
+        long the document is. Tables are yielded as a "[Table]" marker, blocks
+        of SEGMENT_ROWS rows and an "[End Table]" marker. A merged cell is read
+        once, not once per grid cell it spans.
+        """
+        try:
+            with _open_source(file_content) as source, zipfile.ZipFile(source) as archive:
+                with archive.open(self._docx_body_part(archive)) as part:
+                    stack: List[ET.Element] = []
+                    paragraph_depth = 0
+                    table_depth = 0
+                    rows: List[str] = []
+                    for event, element in ET.iterparse(part, events=('start', 'end')):
+                        if event == 'start':
+                            stack.append(element)
+                            if element.tag == _W_P:
+                                paragraph_depth += 1
+                            elif element.tag == _W_TBL:
+                                table_depth += 1
+                                if table_depth == 1:
+                                    yield '[Table]'
+                            continue
+                        
+                        stack.pop()
+                        done = False
+                        if element.tag == _W_P:
+                            paragraph_depth -= 1
+                            if paragraph_depth == 0 and table_depth == 0:
+                                text = self._docx_text(element)
+                                if text:
+                                    yield text
+                                done = True
+                        elif element.tag == _W_TR and table_depth == 1:
+                            text = self._docx_row_text(element)
+                            if text:
+                                rows.append(text)
+                            if len(rows) >= self.SEGMENT_ROWS:
+                                yield '\n'.join(rows)
+                                rows = []
+                            done = True
+                        elif element.tag == _W_TBL:
+                            table_depth -= 1
+                            if table_depth == 0:
+                                if rows:
+                                    yield '\n'.join(rows)
+                                    rows = []
+                                yield '[End Table]'
+                                done = True
+                        if done:
+                            element.clear()
+                            if stack:
+                                stack[-1].remove(element)
             
-        except Exception as e:
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
             logger.error(f"DOCX extraction error: {e}")
             raise ValueError("Failed to extract text from DOCX file")
     
-    def _extract_from_text(self, file_content: bytes) -> str:
+    def _extract_from_text(self, file_content: DocumentSource) -> str:
         """Extract text from plain text files"""
         try:
+            file_content = _read_source(file_content)
             # Try different encodings
             for encoding in ['utf-8', 'utf-16', 'latin-1', 'cp1252']:
                 try:
@@ -202,90 +537,212 @@ class DocumentProcessor:
             logger.error(f"Text extraction error: {e}")
             raise ValueError("Failed to extract text from file")
     
-    def _extract_from_excel(self, file_content: bytes) -> str:
+    def _extract_from_excel(self, file_content: DocumentSource) -> str:
         """Extract text from Excel files"""
         try:
-            excel_file = io.BytesIO(file_content)
-            workbook = load_workbook(excel_file, read_only=True, data_only=True)
-            
-            text_parts = []
-            
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text_parts.append(f"\n[Sheet: {sheet_name}]\n")
-                
-                # Extract data from cells
-                sheet_data = []
-                for row in sheet.iter_rows(values_only=True):
-                    if any(cell for cell in row if cell is not None):
-                        row_text = []
-                        for cell in row:
-                            if cell is not None:
-                                row_text.append(str(cell))
-                        if row_text:
-                            sheet_data.append(' | '.join(row_text))
-                
-                if sheet_data:
-                    text_parts.extend(sheet_data)
-                text_parts.append(f"[End Sheet: {sheet_name}]\n")
-            
-            return '\n'.join(text_parts)
+            return '\n'.join(self._iter_excel_segments(file_content))
             
         except Exception as e:
             logger.error(f"Excel extraction error: {e}")
             raise ValueError("Failed to extract text from Excel file")
     
-    def _extract_from_csv(self, file_content: bytes) -> str:
-        """Extract text from CSV files"""
+    def _iter_excel_segments(self, file_content: DocumentSource) -> Iterator[str]:
+        """Yield each sheet's markers and its rows in blocks of SEGMENT_ROWS"""
+        with _open_source(file_content) as source:
+            try:
+                workbook = load_workbook(source, read_only=True, data_only=True)
+            except Exception as e:
+                logger.error(f"Excel extraction error: {e}")
+                raise ValueError("Failed to extract text from Excel file")
+            # The source stays open while the read-only workbook is read lazily
+            yield from self._iter_workbook_segments(workbook)
+    
+    def _iter_workbook_segments(self, workbook) -> Iterator[str]:
+        for sheet_name in workbook.sheetnames:
+            sheet = workbook[sheet_name]
+            yield f"\n[Sheet: {sheet_name}]\n"
+            
+            # Extract data from cells
+            sheet_data = []
+            for row in sheet.iter_rows(values_only=True):
+                if any(cell for cell in row if cell is not None):
+                    row_text = []
+                    for cell in row:
+                        if cell is not None:
+                            row_text.append(str(cell))
+                    if row_text:
+                        sheet_data.append(' | '.join(row_text))
+                if len(sheet_data) >= self.SEGMENT_ROWS:
+                    yield '\n'.join(sheet_data)
+                    sheet_data = []
+            
+            if sheet_data:
+                yield '\n'.join(sheet_data)
+            yield f"[End Sheet: {sheet_name}]\n"
+    
+    def _detect_encoding(self, sample: bytes) -> str:
+        """Pick the encoding of a text file from a sample of its first bytes
+        
+        The chardet guess is tried first, then UTF-8, cp1252 and latin-1; the
+        first one that decodes the sample wins (latin-1 always does).
+        """
+        guess = chardet.detect(sample).get('encoding') if sample else None
+        for encoding in [guess, 'utf-8', 'cp1252', 'latin-1']:
+            if not encoding:
+                continue
+            if encoding.lower() == 'ascii':
+                encoding = 'utf-8'
+            try:
+                # Incremental decoding tolerates a multi-byte character cut off at the end of the sample
+                codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+                return encoding
+            except (UnicodeDecodeError, LookupError):
+                continue
+        return 'latin-1'
+    
+    def _normalize_cells(self, values: pd.Series) -> pd.Series:
+        """Collapse whitespace and drop control characters in a column of cell strings"""
+        values = values.str.replace(r'\s+', ' ', regex=True).str.strip()
+        unprintable = ~values.map(str.isprintable).astype(bool)
+        if unprintable.any():
+            values = values.copy()
+            values[unprintable] = values[unprintable].map(
+                lambda value: ''.join(char for char in value if char.isprintable())
+            )
+        return values
+    
+    def _csv_chunks(self, file_content: DocumentSource, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Yield a CSV file as DataFrames of `chunk_rows` normalized string cells
+        
+        The encoding is detected once from the start of the file; the file is
+        then parsed in chunks without decoding it as a whole. Missing cells are
+        empty strings.
+        """
+        with _open_source(file_content) as source:
+            encoding = self._detect_encoding(source.read(self.ENCODING_SAMPLE_BYTES))
+            source.seek(0)
+            try:
+                reader = pd.read_csv(source, encoding=encoding, encoding_errors='replace', dtype=str,
+                                     keep_default_na=False, chunksize=chunk_rows)
+                for chunk in reader:
+                    for column in chunk.columns:
+                        chunk[column] = self._normalize_cells(chunk[column].fillna(''))
+                    yield chunk
+            except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+                logger.error(f"CSV extraction error: {e}")
+                raise ValueError("Failed to extract text from CSV file")
+    
+    def _csv_header(self, columns: pd.Index) -> List[str]:
+        """Header line and underline of the CSV text format"""
+        headers = self.CSV_SEPARATOR.join(self._normalize_cells(pd.Series(columns.astype(str))))
+        return [headers, '-' * len(headers)]
+    
+    def _join_rows(self, chunk: pd.DataFrame) -> pd.Series:
+        """Each row's cells joined with CSV_SEPARATOR, column by column"""
+        columns = [chunk.iloc[:, index] for index in range(chunk.shape[1])]
+        if not columns:
+            return pd.Series([''] * len(chunk), index=chunk.index)
+        return columns[0].str.cat(columns[1:], sep=self.CSV_SEPARATOR) if len(columns) > 1 else columns[0]
+    
+    def _cell_offsets(self, chunk: pd.DataFrame, start: int) -> Tuple[np.ndarray, int]:
+        """Row-major int32 offsets of a chunk's cells in the text, for rows starting at `start`
+        
+        Returns the offsets and the position just past the chunk's last row
+        and its newline.
+        """
+        separator = len(self.CSV_SEPARATOR)
+        lengths = np.column_stack([chunk.iloc[:, index].str.len().to_numpy(dtype=np.int64)
+                                   for index in range(chunk.shape[1])])
+        within_row = np.zeros_like(lengths)
+        within_row[:, 1:] = np.cumsum(lengths[:, :-1] + separator, axis=1)
+        row_lengths = lengths.sum(axis=1) + separator * (lengths.shape[1] - 1) + 1
+        row_starts = start + np.concatenate(([0], np.cumsum(row_lengths[:-1])))
+        return (row_starts[:, None] + within_row).astype(np.int32), start + int(row_lengths.sum())
+    
+    def _extract_from_csv(self, file_content: DocumentSource) -> Tuple[str, CellOffsetMap]:
+        """Extract text from CSV files, with the offset of every data cell in it
+        
+        Cells are whitespace-normalized as they are read, so the returned text
+        needs no further cleaning and the offsets stay valid.
+        """
         try:
-            # Try different encodings
-            for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                try:
-                    csv_text = file_content.decode(encoding)
-
-                    df = pd.read_csv(io.StringIO(csv_text))
-                    
-                    # Convert to formatted text
-                    text_parts = ["[CSV Data]\n"]
-                    
-                    # Add column headers
-                    headers = ' | '.join(df.columns.astype(str))
-                    text_parts.append(headers)
-                    text_parts.append('-' * len(headers))
-                    
-                    # Add data rows
-                    for _, row in df.iterrows():
-                        row_text = ' | '.join(row.astype(str))
-                        text_parts.append(row_text)
-                    
-                    text_parts.append("\n[End CSV Data]")
-                    return '\n'.join(text_parts)
-                    
-                except (UnicodeDecodeError, pd.errors.ParserError):
-                    continue
+            text_parts = ["[CSV Data]\n"]
+            cell_map = None
+            position = 0
+            for chunk in self._csv_chunks(file_content, self.CSV_CHUNK_ROWS):
+                if cell_map is None:
+                    cell_map = CellOffsetMap([str(column) for column in chunk.columns])
+                    text_parts.extend(self._csv_header(chunk.columns))
+                    position = sum(len(part) + 1 for part in text_parts)
+                if len(chunk) and chunk.shape[1]:
+                    offsets, position = self._cell_offsets(chunk, position)
+                    cell_map.extend(offsets)
+                    text_parts.append('\n'.join(self._join_rows(chunk).tolist()))
+            if cell_map is None:
+                raise ValueError("Could not parse CSV file")
             
-            raise ValueError("Could not parse CSV file")
+            text_parts.append("\n[End CSV Data]")
+            return '\n'.join(text_parts), cell_map
             
         except Exception as e:
             logger.error(f"CSV extraction error: {e}")
             raise ValueError("Failed to extract text from CSV file")
     
-    def _clean_extracted_text(self, text: str) -> str:
-        """Clean and normalize extracted text"""
-        if not text:
-            return ""
-        
-
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Multiple empty lines
-        text = re.sub(r'[ \t]+', ' ', text)  # Multiple spaces/tabs
+    def _iter_csv_segments(self, file_content: DocumentSource) -> Iterator[str]:
+        """Yield CSV data as header and blocks of SEGMENT_ROWS rows, parsed in chunks"""
+        yield "[CSV Data]\n"
+        for index, chunk in enumerate(self._csv_chunks(file_content, self.SEGMENT_ROWS)):
+            rows = self._join_rows(chunk).tolist() if chunk.shape[1] else []
+            if index == 0:
+                rows = self._csv_header(chunk.columns) + rows
+            if rows:
+                yield '\n'.join(rows)
+        yield "\n[End CSV Data]"
+    
+    def _iter_text_segments(self, file_content: DocumentSource) -> Iterator[str]:
+        """Yield a plain text file as blocks of whole lines of about SEGMENT_CHARS"""
+        lines = []
+        size = 0
+        for line in self._extract_from_text(file_content).split('\n'):
+            lines.append(line)
+            size += len(line) + 1
+            if size >= self.SEGMENT_CHARS:
+                yield '\n'.join(lines)
+                lines, size = [], 0
+        if lines:
+            yield '\n'.join(lines)
+    
+    def iter_segments(self, file_content: DocumentSource, filename: str) -> Iterator[str]:
+        """
+        Yield a document's text as cleaned segments while it is being parsed
         
-        # Remove control characters except newlines and tabs
-        text = ''.join(char for char in text if char.isprintable() or char in '\n\t')
+        Segments are PDF pages, DOCX paragraphs and tables, blocks of spreadsheet
+        or CSV rows, or blocks of lines of a text file. Joined with newlines they
+        form the streamed document text; unlike `process_document` the text is not
+        truncated to MAX_TEXT_LENGTH, and MAX_FILE_SIZE does not apply (memory use
+        does not grow with the file; callers bound the upload size themselves).
         
-        # Normalize line endings
-        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        Args:
+            file_content: Raw file bytes or a spooled upload
+            filename: Original filename
+            
+        Raises:
+            ValueError: If the file is invalid or cannot be parsed
+        """
+        self._validate(file_content, filename, check_size=False)
+        file_ext = Path(filename).suffix.lower()
         
-        return text.strip()
+        segments = self.registry.select(file_ext, streaming=True).iter_segments(file_content)
+        for segment in segments:
+            cleaned = self._clean_extracted_text(segment)
+            if cleaned:
+                yield cleaned
+    
+    def _clean_extracted_text(self, text: str) -> str:
+        """Clean and normalize extracted text (whitespace, line endings, control characters)"""
+        if not text:
+            return ""
+        return self.text_normalizer.clean(text)
     
     def get_supported_formats(self) -> Dict[str, str]:
         """Return supported file formats"""
@@ -0,0 +1,189 @@
+import logging
+import mmap
+import os
+import shutil
+import threading
+import uuid
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DocumentStore:
+    """Per-session document files, memory-mapped for ranged reads
+
+    Each session gets one append-only file. A document record is its text encoded
+    as UTF-32-LE (four bytes per character, so a character offset maps directly to
+    a byte offset) followed by its int32 span table (starts, ends, type ids); further
+    per-span columns computed later are appended with `append_column`. Reads
+    go through a read-only memory map, so document text only becomes resident
+    while a page of it is being served and the OS can drop it again afterwards.
+
+    Files are private to one worker process and removed with their session or
+    when the store is closed.
+    """
+
+    CHAR_WIDTH = 4  # bytes per character in UTF-32-LE
+    INT_WIDTH = array('i').itemsize
+
+    def __init__(self, root_dir: str):
+        """Initialize the store
+
+        Args:
+            root_dir: Directory for session files (created if missing)
+        """
+        self.root_dir = Path(root_dir) / f"worker-{os.getpid()}"
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._maps: Dict[Hashable, mmap.mmap] = {}
+        self._lock = threading.Lock()
+        logger.info(f"Document store ready at {self.root_dir}")
+
+    def _path(self, session_id: Hashable) -> Path:
+        return self.root_dir / f"session-{session_id}.bin"
+
+    def write(self, session_id: Hashable, text: str, starts: array, ends: array,
+              type_ids: array) -> Tuple[int, int, int, int]:
+        """Append a document record to the session file
+
+        Returns:
+            (text byte offset, text length in characters, span table byte offset, span count)
+        """
+        return self._append_record(
+            session_id, lambda f: f.write(text.encode('utf-32-le')), len(text), starts, ends, type_ids
+        )
+
+    def open_writer(self, session_id: Hashable) -> 'DocumentWriter':
+        """Start a document record whose text is appended piece by piece"""
+        return DocumentWriter(self, session_id)
+
+    def _append_record(self, session_id: Hashable, write_text: Callable[[BinaryIO], None], char_count: int,
+                       starts: array, ends: array, type_ids: array) -> Tuple[int, int, int, int]:
+        with self._lock:
+            path = self._path(session_id)
+            with open(path, 'ab') as f:
+                text_offset = f.tell()
+                write_text(f)
+                spans_offset = f.tell()
+                for values in (starts, ends, type_ids):
+                    values.tofile(f)
+            # The file grew; the next read maps it again
+            stale = self._maps.pop(session_id, None)
+            if stale is not None:
+                stale.close()
+            return text_offset, char_count, spans_offset, len(starts)
+
+    def append_column(self, session_id: Hashable, values: array) -> int:
+        """Append an int32 column to the session file
+
+        Returns:
+            Byte offset of the column, for `read_column`
+        """
+        with self._lock:
+            with open(self._path(session_id), 'ab') as f:
+                offset = f.tell()
+                values.tofile(f)
+            stale = self._maps.pop(session_id, None)
+            if stale is not None:
+                stale.close()
+            return offset
+
+    def read_column(self, session_id: Hashable, offset: int, count: int) -> array:
+        """Read `count` int32 values written at byte `offset`"""
+        with self._lock:
+            return self._read_ints(self._map(session_id), offset, count)
+
+    def _read_ints(self, mapped: mmap.mmap, offset: int, count: int) -> array:
+        values = array('i')
+        values.frombytes(mapped[offset:offset + count * self.INT_WIDTH])
+        return values
+
+    def _map(self, session_id: Hashable) -> mmap.mmap:
+        mapped = self._maps.get(session_id)
+        if mapped is None:
+            with open(self._path(session_id), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[session_id] = mapped
+        return mapped
+
+    def read_text(self, session_id: Hashable, text_offset: int, start: int, end: int) -> str:
+        """Read characters [start, end) of a document whose text begins at `text_offset`"""
+        if end <= start:
+            return ""
+        with self._lock:
+            mapped = self._map(session_id)
+            begin = text_offset + start * self.CHAR_WIDTH
+            return mapped[begin:text_offset + end * self.CHAR_WIDTH].decode('utf-32-le')
+
+    def read_spans(self, session_id: Hashable, spans_offset: int, count: int) -> Tuple[array, array, array]:
+        """Read a document's span table as (starts, ends, type ids)"""
+        with self._lock:
+            mapped = self._map(session_id)
+            columns = [self._read_ints(mapped, spans_offset + column * count * self.INT_WIDTH, count)
+                       for column in range(3)]
+        return columns[0], columns[1], columns[2]
+
+    def drop_session(self, session_id: Hashable) -> None:
+        """Delete a session's file"""
+        with self._lock:
+            mapped = self._maps.pop(session_id, None)
+            if mapped is not None:
+                mapped.close()
+            try:
+                self._path(session_id).unlink()
+            except FileNotFoundError:
+                pass
+
+    def close(self) -> None:
+        """Close all maps and remove this worker's files"""
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            shutil.rmtree(self.root_dir, ignore_errors=True)
+
+class DocumentWriter:
+    """A document record being written incrementally
+
+    Text pieces go to a private pending file as they arrive, so a long document
+    is never held in memory as one string. `commit` copies the text into the
+    session file followed by the span table, which is only known at the end.
+    """
+
+    COPY_BUFFER = 1024 * 1024
+
+    def __init__(self, store: DocumentStore, session_id: Hashable):
+        self.store = store
+        self.session_id = session_id
+        self.char_count = 0
+        self._path = store.root_dir / f"pending-{uuid.uuid4().hex}.bin"
+        self._file = open(self._path, 'w+b')
+
+    def append(self, text: str) -> None:
+        """Append text to the record"""
+        self._file.write(text.encode('utf-32-le'))
+        self.char_count += len(text)
+
+    def commit(self, starts: array, ends: array, type_ids: array) -> Tuple[int, int, int, int]:
+        """Write the record to the session file and remove the pending file
+
+        Returns:
+            Same tuple as `DocumentStore.write`
+        """
+        try:
+            self._file.flush()
+            self._file.seek(0)
+            return self.store._append_record(
+                self.session_id, lambda f: shutil.copyfileobj(self._file, f, self.COPY_BUFFER),
+                self.char_count, starts, ends, type_ids
+            )
+        finally:
+            self.discard()
+
+    def discard(self) -> None:
+        """Drop the pending record"""
+        self._file.close()
+        try:
+            self._path.unlink()
+        except FileNotFoundError:
+            pass
@@ -1,6 +1,7 @@
-from typing import List, Tuple, Dict
+from typing import Any, Dict, Iterator, List, Tuple
 import re
 from src.models.entity_config import EntityConfig
+from src.models.prediction import Prediction
 
 class EntityProcessor:
     """Process and format entities for display
@@ -9,73 +10,131 @@ class EntityProcessor:
     Responsibility Principle by focusing only on entity processing logic.
     """
     
+    # Separators between organizations inside one ORG entity
+    ORG_SEPARATORS = re.compile(r'[،,]\s*|\.?\n+|\.\s+')
+    # Connecting words that are not organizations themselves
+    CONNECTORS = frozenset(['و', 'أو', 'and', 'or', ''])
+
+    def _org_parts(self, entity_text: str) -> List[Tuple[int, int]]:
+        """(start, end) of each organization in a combined ORG entity, relative to the entity
+        
+        Parts are the stretches between separator matches, with surrounding
+        whitespace, trailing periods and a leading "و" (and) removed.
+        """
+        # Periods at the end are not separators
+        cleaned_text = entity_text.rstrip('.')
+        bounds = []
+        position = 0
+        for match in self.ORG_SEPARATORS.finditer(cleaned_text):
+            bounds.append((position, match.start()))
+            position = match.end()
+        bounds.append((position, len(cleaned_text)))
+
+        parts = []
+        for part_start, part_end in bounds:
+            raw = cleaned_text[part_start:part_end]
+            part = raw.strip().rstrip('.')
+            part_start += len(raw) - len(raw.lstrip())
+            # Skip connecting words like "و" (and) or "أو" (or)
+            if part in self.CONNECTORS or len(part) <= 2:
+                continue
+            # Remove leading "و" if present (keeping 'ال' of "وال")
+            if part.startswith('وال'):
+                part = part[1:]
+                part_start += 1
+            elif part.startswith('و'):
+                rest = part[1:]
+                part = rest.strip()
+                part_start += 1 + len(rest) - len(rest.lstrip())
+            if part:
+                parts.append((part_start, part_start + len(part)))
+        return parts
+
     def split_combined_entities(self, text: str, entities: List[Tuple[str, str, int, int]]) -> List[Tuple[str, str, int, int]]:
         """Split entities that contain multiple organizations separated by commas
         
+        Part offsets come from the separator matches within the entity, so
+        repeated names get their own positions. When `entities` is a model
+        `Prediction`, the result is remembered on it and later calls for the
+        same text return it without splitting again.
+        
         Args:
-            text: Original text for position finding
+            text: Original text the entity offsets refer to
             entities: List of entity tuples (text, type, start, end)
             
         Returns:
             List of properly split entity tuples
         """
+        if isinstance(entities, Prediction):
+            split_entities = entities.split_for(text)
+            if split_entities is not None:
+                return split_entities
+
         split_entities = []
-        
         for entity_text, entity_type, start, end in entities:
             # Check if this is an ORG entity that might contain multiple organizations
             if entity_type == 'ORG' and ('،' in entity_text or ',' in entity_text or '\n' in entity_text or '.' in entity_text):
-                # First remove periods at the end
-                cleaned_text = entity_text.rstrip('.')
-                
-                # Split by Arabic comma, regular comma, period, or newline
-                # Also handle cases where period is followed by newline
-                parts = re.split(r'[،,]\s*|\.?\n+|\.\s+', cleaned_text)
-                
-                # Filter out connecting words and clean up
-                cleaned_parts = []
-                for part in parts:
-                    part = part.strip().rstrip('.')  # Remove trailing periods
-                    # Skip connecting words like "و" (and) or "أو" (or)
-                    if part and not part in ['و', 'أو', 'and', 'or', ''] and len(part) > 2:
-                        # Remove leading "و" or "وال" if present
-                        if part.startswith('وال'):
-                            part = 'ال' + part[3:]  # Keep 'ال' but remove 'و'
-                        elif part.startswith('و'):
-                            part = part[1:].strip()
-                        if part:
-                            cleaned_parts.append(part)
-                
-
-                if len(cleaned_parts) > 1:
-                    for part in cleaned_parts:
-
-                        part_start = text.find(part, start)
-                        if part_start >= 0 and part_start < end:
-                            part_end = part_start + len(part)
-                            split_entities.append((part, entity_type, part_start, part_end))
-                else:
-                    # Single organization or couldn't split properly, keep as is
-                    split_entities.append((entity_text, entity_type, start, end))
-            else:
-                # Not an ORG or doesn't contain separators, keep as is
-                split_entities.append((entity_text, entity_type, start, end))
-        
+                parts = self._org_parts(entity_text)
+                if len(parts) > 1:
+                    for part_start, part_end in parts:
+                        split_entities.append((entity_text[part_start:part_end], entity_type,
+                                               start + part_start, start + part_end))
+                    continue
+            # Not a combined ORG (or couldn't split properly), keep as is
+            split_entities.append((entity_text, entity_type, start, end))
+
+        if isinstance(entities, Prediction):
+            entities.remember_split(text, split_entities)
         return split_entities
 
-    def highlight_entities_in_text(self, text: str, entities: List[Tuple[str, str, int, int]]) -> str:
-        """Highlight entities in text with HTML spans
+    def entity_columns(self, entities: List[Tuple[str, str, int, int]]) -> Dict[str, Any]:
+        """Entities as parallel arrays, for clients that render highlights themselves
+        
+        Entity texts are left out (they are slices of the request text). Each
+        type appears once in `types`, with its highlight colors, and entities
+        refer to it by index.
         
         Args:
-            text: Original input text
             entities: List of entity tuples (text, type, start, end)
             
         Returns:
-            HTML string with highlighted entities
+            Dictionary with starts, ends, type_ids and types
         """
-        # First, split any combined entities
-        entities = self.split_combined_entities(text, entities)
-        
-        # Group adjacent entities of the same type
+        type_ids: Dict[str, int] = {}
+        starts, ends, ids = [], [], []
+        for _, entity_type, start, end in entities:
+            type_id = type_ids.setdefault(entity_type, len(type_ids))
+            starts.append(start)
+            ends.append(end)
+            ids.append(type_id)
+        return {
+            'starts': starts,
+            'ends': ends,
+            'type_ids': ids,
+            'types': [
+                {
+                    'name': entity_type,
+                    'color': EntityConfig.get_entity_info(entity_type)['color'],
+                    'text_color': EntityConfig.get_text_color(entity_type)
+                } for entity_type in type_ids
+            ]
+        }
+
+    # Opening highlight tag per entity type (unknown types are added on first use)
+    _open_tags: Dict[str, str] = {}
+
+    @classmethod
+    def _open_tag(cls, entity_type: str) -> str:
+        tag = cls._open_tags.get(entity_type)
+        if tag is None:
+            color = EntityConfig.get_entity_info(entity_type)['color']
+            text_color = EntityConfig.get_text_color(entity_type)
+            tag = f'<span class="entity-highlight" style="background-color: {color}; color: {text_color};">'
+            cls._open_tags[entity_type] = tag
+        return tag
+
+    def _group_entities(self, entities: List[Tuple[str, str, int, int]]) -> List[List[Tuple[str, str, int, int]]]:
+        """Sort entities by start and group nearby IDs of the same type"""
         grouped_entities = []
         current_group = []
 
@@ -102,39 +161,79 @@ class EntityProcessor:
         # Add the last group if it exists
         if current_group:
             grouped_entities.append(current_group)
+        return grouped_entities
 
-        # Process the groups in reverse to avoid position shifts
-        result = text
-        for group in reversed(grouped_entities):
-            if len(group) == 1:
-                # Single entity
-                entity, entity_type, start, end = group[0]
-                color = EntityConfig.get_entity_info(entity_type)['color']
-                text_color = EntityConfig.get_text_color(entity_type)
-
-                # Clean up entity text
-                if entity_type in ['PASSPORT-ID', 'CIVIL-ID']:
-                    display_entity = entity.replace('##', '')
-                else:
-                    display_entity = entity
+    def _highlight_group(self, text: str, group: List[Tuple[str, str, int, int]]) -> Tuple[int, int, str]:
+        """(start, end, highlighted HTML) of one entity group"""
+        if len(group) == 1:
+            # Single entity
+            entity, entity_type, start, end = group[0]
 
-                highlighted = f'<span class="entity-highlight" style="background-color: {color}; color: {text_color};">{display_entity}</span>'
-                result = result[:start] + highlighted + result[end:]
+            # Clean up entity text
+            if entity_type in ['PASSPORT-ID', 'CIVIL-ID']:
+                display_entity = entity.replace('##', '')
             else:
-                # Group of entities (for IDs)
-                entity_type = group[0][1]  # All entities in group have same type
-                start = group[0][2]  # First entity start
-                end = group[-1][3]  # Last entity end
+                display_entity = entity
+        else:
+            # Group of entities (for IDs): the full text joined without spaces
+            entity_type = group[0][1]  # All entities in group have same type
+            start = group[0][2]  # First entity start
+            end = group[-1][3]  # Last entity end
+            display_entity = text[start:end].replace(' ', '')
+        return start, end, f'{self._open_tag(entity_type)}{display_entity}</span>'
 
-                # Extract the full text and join without spaces
-                full_text = text[start:end].replace(' ', '')
+    def iter_highlight_fragments(self, text: str, entities: List[Tuple[str, str, int, int]]) -> Iterator[str]:
+        """Yield the highlighted HTML of a text as plain text and entity span fragments, in order
+        
+        Joined, the fragments equal `highlight_entities_in_text`; streaming
+        responses send them as they are produced. Inputs with overlapping spans
+        fall back to splicing them from the end, which is what the output has
+        always been for them, and yield it as one fragment.
+        
+        Args:
+            text: Original input text
+            entities: List of entity tuples (text, type, start, end)
+        """
+        # First, split any combined entities
+        entities = self.split_combined_entities(text, entities)
+        highlights = [self._highlight_group(text, group) for group in self._group_entities(entities)]
 
-                color = EntityConfig.get_entity_info(entity_type)['color']
-                text_color = EntityConfig.get_text_color(entity_type)
+        position = 0
+        for start, end, _ in highlights:
+            if start < position or end < start:
+                yield self._splice_highlights(text, highlights)
+                return
+            position = end
 
-                highlighted = f'<span class="entity-highlight" style="background-color: {color}; color: {text_color};">{full_text}</span>'
-                result = result[:start] + highlighted + result[end:]
+        position = 0
+        for start, end, highlighted in highlights:
+            if start > position:
+                yield text[position:start]
+            yield highlighted
+            position = end
+        if position < len(text):
+            yield text[position:]
 
+    def highlight_entities_in_text(self, text: str, entities: List[Tuple[str, str, int, int]]) -> str:
+        """Highlight entities in text with HTML spans
+        
+        Spans are written in one forward pass into a list of fragments (see
+        `iter_highlight_fragments`) and joined at the end.
+        
+        Args:
+            text: Original input text
+            entities: List of entity tuples (text, type, start, end)
+            
+        Returns:
+            HTML string with highlighted entities
+        """
+        return ''.join(self.iter_highlight_fragments(text, entities))
+
+    def _splice_highlights(self, text: str, highlights: List[Tuple[int, int, str]]) -> str:
+        """Insert highlights from the last to the first, for overlapping spans"""
+        result = text
+        for start, end, highlighted in reversed(highlights):
+            result = result[:start] + highlighted + result[end:]
         return result
 
     def get_entity_stats(self, entities: List[Tuple[str, str, int, int]]) -> Dict[str, int]:
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import multiprocessing
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _worker_main(connection) -> None:
+    """Run the jobs received on `connection`, one at a time, until the pool sends None"""
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        function, args = job
+        try:
+            outcome = (True, function(*args))
+        except Exception as e:
+            outcome = (False, e)
+        try:
+            connection.send(outcome)
+        except Exception as e:
+            # Result or exception could not be pickled
+            connection.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+class WorkerCrashed(RuntimeError):
+    """A worker process exited while running a job"""
+
+class _Worker:
+    """One pool process and the pipe its jobs go through"""
+
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def call(self, function: Callable, args: Tuple) -> Tuple[bool, Any]:
+        """Send a job and wait for its outcome (blocking; run in a thread)"""
+        self.connection.send((function, args))
+        return self.connection.recv()
+
+    def stop(self, timeout: float = 5) -> None:
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self.connection.close()
+
+class ExtractionPool:
+    """Process pool whose jobs can be abandoned one at a time
+
+    Each worker process runs one job at a time, received over its own pipe,
+    so the pool knows which process runs which job. A job whose coroutine is
+    cancelled (e.g. by a timeout) terminates only the worker running it, and
+    a worker that dies mid-job fails only that job with WorkerCrashed; jobs on
+    the other workers carry on. Workers are started on demand, up to `workers`,
+    and replaced the same way. Functions and arguments must be picklable.
+    """
+
+    def __init__(self, workers: int):
+        """Initialize the pool (no process is started yet)
+
+        Args:
+            workers: Maximum number of worker processes
+        """
+        self.size = max(workers, 1)
+        # spawn: forking a process that holds model threads is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self._workers: List[_Worker] = []
+        self._idle: List[_Worker] = []
+        self._available: Optional[asyncio.Condition] = None  # created in the event loop
+
+    async def _acquire(self) -> _Worker:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        async with self._available:
+            while not self._idle and len(self._workers) >= self.size:
+                await self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            worker = _Worker(self._context)
+            self._workers.append(worker)
+            logger.info(f"Started document extraction worker {worker.process.pid} "
+                        f"({len(self._workers)}/{self.size})")
+            return worker
+
+    async def _release(self, worker: _Worker, discard: bool = False) -> None:
+        if discard:
+            worker.kill()
+            if worker in self._workers:
+                self._workers.remove(worker)
+        else:
+            self._idle.append(worker)
+        async with self._available:
+            self._available.notify()
+
+    async def run(self, function: Callable, *args: Any) -> Any:
+        """Run `function(*args)` in a worker process and return its result
+
+        Raises:
+            WorkerCrashed: If the worker exited before returning
+            Exception: Whatever the function raised
+        """
+        worker = await self._acquire()
+        try:
+            succeeded, value = await asyncio.to_thread(worker.call, function, args)
+        except asyncio.CancelledError:
+            logger.warning(f"Terminating extraction worker {worker.process.pid} running an abandoned job")
+            await asyncio.shield(self._release(worker, discard=True))
+            raise
+        except (EOFError, OSError) as e:
+            await self._release(worker, discard=True)
+            raise WorkerCrashed(f"Extraction worker exited with code {worker.process.exitcode}") from e
+        await self._release(worker)
+        if not succeeded:
+            raise value
+        return value
+
+    def close(self) -> None:
+        """Stop all worker processes"""
+        workers, self._workers, self._idle = self._workers, [], []
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,99 @@
+"""
+Extractor Benchmark
+Measures text extraction throughput of every available backend on a local corpus
+
+    python -m src.models.extractor_benchmark CORPUS_DIR [--repeat N] [--output results.json]
+
+Each file in the corpus (searched recursively) is extracted by every
+available backend registered for its format. Throughput is reported per
+format and backend in MB/s and, for backends that can count pages, pages/s.
+The JSON output can be passed to the app as EXTRACTOR_BENCHMARKS so that the
+fastest backend of each format is preferred at runtime.
+"""
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.models.document_processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+def run_benchmark(corpus: Path, repeat: int = 1) -> List[Dict[str, Any]]:
+    """Extract every corpus file with every available backend of its format
+
+    Args:
+        corpus: Directory searched recursively for supported files
+        repeat: Extractions per file and backend; the fastest run counts
+
+    Returns:
+        One result per (format, backend) with files, bytes, pages, seconds,
+        errors, mb_per_sec and pages_per_sec
+    """
+    processor = DocumentProcessor()
+    results: Dict[tuple, Dict[str, Any]] = {}
+    for path in sorted(corpus.rglob('*')):
+        extension = path.suffix.lower()
+        if not path.is_file() or not processor.is_supported_format(path.name):
+            continue
+        content = path.read_bytes()
+        for backend in processor.registry.backends(extension):
+            result = results.setdefault((extension, backend.name), {
+                'format': extension, 'backend': backend.name, 'capabilities': backend.capabilities(),
+                'files': 0, 'bytes': 0, 'pages': 0, 'seconds': 0.0, 'errors': 0
+            })
+            try:
+                best = None
+                for _ in range(max(repeat, 1)):
+                    start = time.perf_counter()
+                    backend.extract(content)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                pages = backend.count_pages(content) if backend.page_parallel else 0
+            except Exception as e:
+                logger.warning(f"{backend.name} failed on {path}: {e}")
+                result['errors'] += 1
+                continue
+            result['files'] += 1
+            result['bytes'] += len(content)
+            result['pages'] += pages
+            result['seconds'] += best
+
+    for result in results.values():
+        seconds = result['seconds']
+        result['mb_per_sec'] = round(result['bytes'] / (1024 * 1024) / seconds, 3) if seconds else None
+        result['pages_per_sec'] = round(result['pages'] / seconds, 2) if seconds and result['pages'] else None
+    return sorted(results.values(), key=lambda result: (result['format'], -(result['mb_per_sec'] or 0)))
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """Results as a plain text table"""
+    header = f"{'format':<8}{'backend':<12}{'files':>7}{'MB':>10}{'pages':>8}{'errors':>8}{'MB/s':>10}{'pages/s':>10}"
+    lines = [header, '-' * len(header)]
+    for result in results:
+        lines.append(
+            f"{result['format']:<8}{result['backend']:<12}{result['files']:>7}"
+            f"{result['bytes'] / (1024 * 1024):>10.2f}{result['pages'] or '-':>8}{result['errors']:>8}"
+            f"{result['mb_per_sec'] if result['mb_per_sec'] is not None else '-':>10}"
+            f"{result['pages_per_sec'] if result['pages_per_sec'] is not None else '-':>10}"
+        )
+    return '\n'.join(lines)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark document extractor backends on a local corpus")
+    parser.add_argument('corpus', type=Path, help="Directory of sample documents")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per file and backend (fastest counts)")
+    parser.add_argument('--output', type=Path, help="Write results as JSON (usable as EXTRACTOR_BENCHMARKS)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_benchmark(args.corpus, args.repeat)
+    print(format_results(results))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding='utf-8')
+        print(f"\nWrote {args.output}")
+
+if __name__ == "__main__":
+    main()
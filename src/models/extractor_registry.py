@@ -0,0 +1,130 @@
+import importlib.util
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ExtractorBackend:
+    """One way of extracting text from a set of file formats
+
+    A backend always provides `extract(file_content) -> (text, cell_map)`.
+    Its capabilities follow from what else it provides:
+
+    - streaming: `iter_segments(file_content)` yields text while the file is parsed
+    - page_parallel: `count_pages(file_content)` and
+      `extract_pages(file_content, start, stop)` extract page ranges
+      independently, so ranges can run in separate processes (both must be
+      picklable module-level functions)
+    - offsets: `extract` returns a CellOffsetMap with the text instead of None
+    """
+
+    def __init__(self, name: str, formats: Iterable[str], extract: Callable,
+                 iter_segments: Optional[Callable[[Any], Iterator[str]]] = None,
+                 count_pages: Optional[Callable] = None, extract_pages: Optional[Callable] = None,
+                 offsets: bool = False, requires: Iterable[str] = (), rank: int = 100):
+        """Initialize the backend
+
+        Args:
+            name: Backend name, unique per format
+            formats: File extensions handled, with the dot
+            extract: Whole-file extraction
+            iter_segments: Optional streaming extraction
+            count_pages: Optional page count, for page-parallel extraction
+            extract_pages: Optional page range extraction, returning text parts
+            offsets: Whether `extract` returns cell offsets
+            requires: Modules that must be importable for the backend to be available
+            rank: Default preference among backends of a format, lower first;
+                measured throughput takes precedence once benchmarks are loaded
+        """
+        self.name = name
+        self.formats = tuple(formats)
+        self.extract = extract
+        self.iter_segments = iter_segments
+        self.count_pages = count_pages
+        self.extract_pages = extract_pages
+        self.offsets = offsets
+        self.requires = tuple(requires)
+        self.rank = rank
+        self._available: Optional[bool] = None
+
+    @property
+    def streaming(self) -> bool:
+        return self.iter_segments is not None
+
+    @property
+    def page_parallel(self) -> bool:
+        return self.count_pages is not None and self.extract_pages is not None
+
+    def capabilities(self) -> List[str]:
+        return [name for name, supported in (
+            ('streaming', self.streaming), ('page_parallel', self.page_parallel), ('offsets', self.offsets)
+        ) if supported]
+
+    def available(self) -> bool:
+        """Whether the backend's required modules are installed (checked once, without importing them)"""
+        if self._available is None:
+            self._available = all(importlib.util.find_spec(module) is not None for module in self.requires)
+        return self._available
+
+class ExtractorRegistry:
+    """Extractor backends per file format, with runtime selection of the fastest one
+
+    Backends of a format are ordered by measured throughput (MB/s from
+    `load_benchmarks`) when known, then by their declared rank. `select`
+    returns the first available backend with the requested capabilities.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry"""
+        self._backends: Dict[str, List[ExtractorBackend]] = {}
+        self.throughput: Dict[Tuple[str, str], float] = {}  # (extension, backend name) -> MB/s
+
+    def register(self, backend: ExtractorBackend) -> None:
+        for extension in backend.formats:
+            backends = self._backends.setdefault(extension, [])
+            backends[:] = [existing for existing in backends if existing.name != backend.name]
+            backends.append(backend)
+
+    def formats(self) -> List[str]:
+        return sorted(self._backends)
+
+    def backends(self, extension: str, available_only: bool = True) -> List[ExtractorBackend]:
+        """Backends for a format, fastest first"""
+        backends = [
+            backend for backend in self._backends.get(extension, [])
+            if backend.available() or not available_only
+        ]
+        return sorted(backends, key=lambda backend: (
+            -self.throughput.get((extension, backend.name), 0.0), backend.rank
+        ))
+
+    def get(self, extension: str, name: str) -> ExtractorBackend:
+        for backend in self._backends.get(extension, []):
+            if backend.name == name:
+                return backend
+        raise ValueError(f"No extractor backend {name} for {extension}")
+
+    def select(self, extension: str, streaming: bool = False, page_parallel: bool = False) -> ExtractorBackend:
+        """Fastest available backend for a format with the requested capabilities
+
+        Raises:
+            ValueError: If no such backend is registered and installed
+        """
+        for backend in self.backends(extension):
+            if (backend.streaming or not streaming) and (backend.page_parallel or not page_parallel):
+                return backend
+        raise ValueError(f"No processor available for {extension}")
+
+    def load_benchmarks(self, path: str) -> None:
+        """Rank backends by the throughput recorded by the extractor benchmark (JSON output)"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                results = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load extractor benchmarks from {path}: {e}")
+            return
+        for result in results:
+            if result.get('mb_per_sec'):
+                self.throughput[(result['format'], result['backend'])] = float(result['mb_per_sec'])
+        logger.info(f"Loaded extractor benchmarks for {len(self.throughput)} backends from {path}")
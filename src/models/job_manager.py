@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from src.models.session_backend import SessionBackend
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+    pass
+
+class Job:
+    """A unit of background work with stage/progress reporting"""
+
+    TERMINAL_STATUSES = ('completed', 'failed')
+
+    def __init__(self, kind: str, session_id: Hashable, stages: List[str],
+                 handler: Callable[['Job'], Awaitable[Any]],
+                 cleanup: Optional[Callable[[], None]] = None):
+        """Initialize a queued job
+
+        Args:
+            kind: Job kind, e.g. "document_upload"
+            session_id: Session the job belongs to
+            stages: Ordered stage names reported while the job runs
+            handler: Coroutine function doing the work; its return value becomes the result
+            cleanup: Optional function releasing the job's resources, called once when
+                the job finishes, whether or not its handler ran
+        """
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.session_id = session_id
+        self.stages = stages
+        self.handler = handler
+        self.cleanup = cleanup
+        self.status = 'queued'
+        self.stage: Optional[str] = None
+        self.progress = 0.0
+        self.message = ''
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Job state as returned by the polling and event endpoints"""
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'session_id': self.session_id,
+            'status': self.status,
+            'stage': self.stage,
+            'stages': self.stages,
+            'progress': round(self.progress, 3),
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    def _notify(self) -> None:
+        self.updated_at = time.time()
+        # Wake current watchers, then re-arm for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+class JobManager:
+    """Bounded pool of asyncio workers processing queued jobs
+
+    Jobs wait in a bounded queue; at most `max_workers` run at once. Handlers
+    report per-stage progress through `update`, which watchers receive as
+    snapshots. Finished jobs are kept for `retention_seconds` so clients can
+    still poll their result.
+
+    Jobs run in the worker process that accepted them. With a shared session
+    backend, every change is also written there as a snapshot, so any worker
+    can answer a poll or stream a job's events (by polling the backend every
+    `poll_seconds`). Without one, jobs are only visible to their own worker.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retention_seconds: int,
+                 backend: Optional[SessionBackend] = None, poll_seconds: float = 0.5):
+        """Initialize the manager
+
+        Args:
+            max_workers: Number of concurrently running jobs
+            max_queue: Maximum number of jobs waiting to run
+            retention_seconds: How long finished jobs stay queryable
+            backend: Optional session backend shared by all workers for job snapshots
+            poll_seconds: Interval at which jobs of other workers are re-read while watched
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retention_seconds = retention_seconds
+        self.backend = backend if backend is not None and backend.shared else None
+        self.poll_seconds = poll_seconds
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the worker tasks (call from inside the running event loop)"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker(n)) for n in range(self.max_workers)]
+        logger.info(f"Job manager started with {self.max_workers} workers (queue size {self.max_queue})")
+
+    async def stop(self) -> None:
+        """Cancel the workers and fail the jobs still queued"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        drained = 0
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.status = 'failed'
+            job.error = 'Server shut down before the job ran'
+            self._record(job)
+            self._cleanup(job)
+            drained += 1
+        if drained:
+            logger.info(f"Failed {drained} queued jobs at shutdown")
+
+    def submit(self, kind: str, session_id: Hashable, stages: List[str],
+               handler: Callable[[Job], Awaitable[Any]],
+               cleanup: Optional[Callable[[], None]] = None) -> Job:
+        """Queue a job
+
+        Raises:
+            JobQueueFullError: If the queue is at capacity (`cleanup` is not called)
+        """
+        self._purge_finished()
+        job = Job(kind, session_id, stages, handler, cleanup)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError(f"Job queue is full ({self.max_queue} jobs waiting)")
+        self.jobs[job.id] = job
+        self._publish(job)
+        logger.info(f"Queued {kind} job {job.id} for session {session_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job of this worker by id, or None if unknown or expired"""
+        return self.jobs.get(job_id)
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job run by any worker, or None if unknown or expired"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.backend is None:
+            return None
+        loaded = self.backend.load(self._backend_key(job_id))
+        return loaded[1]['fields'].get('state') if loaded else None
+
+    def update(self, job: Job, stage: Optional[str] = None, progress: Optional[float] = None,
+               message: Optional[str] = None) -> None:
+        """Report progress from inside a job handler"""
+        if stage is not None:
+            job.stage = stage
+        if progress is not None:
+            job.progress = min(max(progress, 0.0), 1.0)
+        if message is not None:
+            job.message = message
+        self._record(job)
+
+    async def watch(self, job_id: str, heartbeat_seconds: float = 15.0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield job snapshots on every change until the job finishes
+
+        A snapshot is also yielded every `heartbeat_seconds` without changes so
+        idle connections stay open through proxies. Jobs of other workers are
+        followed through the backend; watching ends if their record expires.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            async for snapshot in self._watch_remote(job_id, heartbeat_seconds):
+                yield snapshot
+            return
+        while True:
+            changed = job._changed
+            yield job.to_dict()
+            if job.finished:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _watch_remote(self, job_id: str, heartbeat_seconds: float) -> AsyncIterator[Dict[str, Any]]:
+        last = None
+        last_sent = 0.0
+        while True:
+            snapshot = self.snapshot(job_id)
+            if snapshot is None:
+                return
+            now = time.monotonic()
+            if snapshot != last or now - last_sent >= heartbeat_seconds:
+                yield snapshot
+                last, last_sent = snapshot, now
+            if snapshot['status'] in Job.TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(self.poll_seconds)
+
+    def _backend_key(self, job_id: str) -> str:
+        return f"jobs:{job_id}"
+
+    def _publish(self, job: Job) -> None:
+        """Write the job's snapshot to the shared backend"""
+        if self.backend is None:
+            return
+        try:
+            self.backend.write(self._backend_key(job.id), {'fields': {'state': job.to_dict()}})
+        except Exception as e:
+            logger.warning(f"Could not publish {job.kind} job {job.id}: {e}")
+
+    def _record(self, job: Job) -> None:
+        job._notify()
+        self._publish(job)
+
+    def _cleanup(self, job: Job) -> None:
+        if job.cleanup is None:
+            return
+        try:
+            job.cleanup()
+        except Exception as e:
+            logger.warning(f"Cleanup of {job.kind} job {job.id} failed: {e}")
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                job.status = 'running'
+                self._record(job)
+                job.result = await job.handler(job)
+                job.status = 'completed'
+                job.progress = 1.0
+            except asyncio.CancelledError:
+                job.status = 'failed'
+                job.error = 'Job cancelled'
+                self._record(job)
+                raise
+            except Exception as e:
+                logger.error(f"{job.kind} job {job.id} failed: {e}")
+                job.status = 'failed'
+                job.error = getattr(e, 'detail', None) or str(e)
+            finally:
+                self._queue.task_done()
+                self._cleanup(job)
+            self._record(job)
+            logger.info(f"{job.kind} job {job.id} {job.status} in {job.updated_at - job.created_at:.2f}s (worker {number})")
+
+    def _purge_finished(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.updated_at < cutoff]:
+            del self.jobs[job_id]
+            if self.backend is not None:
+                self.backend.delete(self._backend_key(job_id))
+        if self.backend is not None:
+            # Records left behind by workers that stopped before purging them
+            self.backend.expire(self._backend_key(''), self.retention_seconds)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 class ModelInterface(ABC):
     """Interface for PII extraction models
@@ -29,6 +29,43 @@ class ModelInterface(ABC):
         """
         pass
     
+    def predict_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[Tuple[str, str, int, int]]]:
+        """Extract entities from several texts
+        
+        Models that can batch inference across texts override this; the default
+        predicts each text in turn.
+        
+        Args:
+            texts: Input texts to analyze
+            batch_size: Optional number of sequences per forward pass
+            
+        Returns:
+            One entity list per input text, in input order
+        """
+        return [self.predict(text) for text in texts]
+    
+    def detect_patterns(self, text: str) -> List[Tuple[str, str, int, int]]:
+        """Extract entities with rule-based detection only, without running the model
+        
+        Used for values such as numeric spreadsheet cells, where the model adds
+        nothing over pattern matching. The default finds nothing.
+        
+        Args:
+            text: Input text to analyze
+            
+        Returns:
+            List of tuples containing (entity_text, entity_type, start_position, end_position)
+        """
+        return []
+    
+    def version_fingerprint(self) -> str:
+        """Identifier that changes whenever the model's predictions may change
+        
+        Used to invalidate cached analysis results. Models with versioned weights
+        override this.
+        """
+        return type(self).__name__
+    
     @abstractmethod
     def is_loaded(self) -> bool:
         """Check if the model is loaded and ready to use
@@ -5,9 +5,11 @@ import re
 from transformers import AutoTokenizer, AutoModelForTokenClassification
 from typing import List, Tuple, Dict, Optional
 from src.models.model_interface import ModelInterface
+from src.models.prediction import Prediction
 from src.models.model_config import ModelConfig
 from src.config import Config
 from src.models.label_mapping import LabelProcessor
+from src.models.text_normalizer import ARABIC_DIGITS, NormalizedText, TextNormalizer
 import warnings
 from transformers import logging as transformers_logging
 transformers_logging.set_verbosity_error()
@@ -33,6 +35,7 @@ class PIIShieldModel(ModelInterface):
         self.id2label = None
         self.model_version = model_version
         self.model_info = ModelConfig.get_model_info(model_version)
+        self.normalizer = TextNormalizer(fold_arabic=True)
     
     def _detect_obfuscated_pii(self, text: str, existing_entities: list) -> list:
         """Detect obfuscated PII with spaces, dots, emojis, or symbols"""
@@ -107,11 +110,7 @@ class PIIShieldModel(ModelInterface):
         for match in re.finditer(arabic_numeral_pattern, text):
             match_text = match.group()
             # Convert Arabic numerals to Western
-            clean_phone = match_text
-            for i, ar in enumerate('٠١٢٣٤٥٦٧٨٩'):
-                clean_phone = clean_phone.replace(ar, str(i))
-
-            clean_phone = re.sub(r'[^\d]', '', clean_phone)
+            clean_phone = re.sub(r'[^\d]', '', self._convert_arabic_numerals(match_text))
             
             if len(clean_phone) >= 7 and self._is_valid_omani_phone(clean_phone):
                 start = match.start()
@@ -216,14 +215,7 @@ class PIIShieldModel(ModelInterface):
     
     def _convert_arabic_numerals(self, text: str) -> str:
         """Convert Arabic numerals to Western digits"""
-        result = text
-        arabic_to_western = {
-            '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
-            '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9'
-        }
-        for arabic, western in arabic_to_western.items():
-            result = result.replace(arabic, western)
-        return result
+        return text.translate(ARABIC_DIGITS)
     
     def _is_likely_false_positive(self, entity_text: str, entity_type: str) -> bool:
         """Check if an entity is likely a false positive
@@ -412,6 +404,36 @@ class PIIShieldModel(ModelInterface):
             logger.exception(f"Error loading model: {str(e)}")
             return False
 
+    def detect_patterns(self, text: str) -> List[Tuple[str, str, int, int]]:
+        """Extract entities with the regex fallbacks and validators alone (no model inference)"""
+        normalized = self.normalizer.normalize(text)
+        return self._to_original(text, normalized, self._entities_from_labels(normalized.text, [], []))
+
+    def _to_original(self, text: str, normalized: NormalizedText,
+                     entities: List[Tuple[str, str, int, int]]) -> List[Tuple[str, str, int, int]]:
+        """Map entities found in normalized text back to spans of the original text"""
+        if normalized.origins is None and normalized.text == text:
+            return entities
+        mapped = []
+        for entity_text, entity_type, start, end in entities:
+            original_start, original_end = normalized.to_original(start, end)
+            original = text[original_start:original_end]
+            # Keep the detected text unless normalization changed this span
+            if normalized.text[start:end] != original:
+                entity_text = original
+            mapped.append((entity_text, entity_type, original_start, original_end))
+        return mapped
+
+    def version_fingerprint(self) -> str:
+        """Checkpoint identity plus the settings that shape predictions"""
+        checkpoint_path = self.model_info.get("checkpoint", "")
+        try:
+            stat = os.stat(checkpoint_path)
+            checkpoint = f"{checkpoint_path}:{stat.st_size}:{int(stat.st_mtime)}"
+        except OSError:
+            checkpoint = checkpoint_path
+        return f"{self.model_version}:{Config.MODEL_NAME}:{checkpoint}:{Config.CONFIDENCE_THRESHOLD}:normalized"
+
     def is_loaded(self) -> bool:
         """Check if the model is loaded and ready
         
@@ -420,24 +442,24 @@ class PIIShieldModel(ModelInterface):
         """
         return self.model is not None and self.tokenizer is not None and self.id2label is not None
 
-    def _predict_with_chunking(self, text: str, max_tokens: int) -> List[Tuple[str, str, int, int]]:
-        """Process long text by splitting into chunks and merging results
+    def _split_into_chunks(self, text: str, max_tokens: int) -> List[Tuple[str, int]]:
+        """Split long text into sentence-aligned chunks that fit the model
         
         Args:
-            text: Input text to analyze
+            text: Input text to split
             max_tokens: Maximum tokens per chunk
             
         Returns:
-            List of tuples containing (entity_text, entity_type, start_position, end_position)
+            List of (chunk_text, character offset in text)
         """
-        all_entities = []
+        chunks = []
         
         # Split text into sentences to avoid cutting entities in half
         sentences = text.split('. ')
         current_chunk = ""
         chunk_start_pos = 0
         
-        for i, sentence in enumerate(sentences):
+        for sentence in sentences:
             # Add sentence to current chunk
             test_chunk = current_chunk + ('. ' if current_chunk else '') + sentence
             
@@ -445,9 +467,7 @@ class PIIShieldModel(ModelInterface):
             test_tokens = self.tokenizer.tokenize(test_chunk)
             
             if len(test_tokens) > max_tokens and current_chunk:
-                # Process current chunk
-                chunk_entities = self._predict_chunk(current_chunk, chunk_start_pos)
-                all_entities.extend(chunk_entities)
+                chunks.append((current_chunk, chunk_start_pos))
                 
                 # Update position for next chunk
                 chunk_start_pos += len(current_chunk) + (2 if current_chunk else 0)  # +2 for '. '
@@ -458,35 +478,29 @@ class PIIShieldModel(ModelInterface):
                 # Add sentence to current chunk
                 current_chunk = test_chunk
         
-        # Process final chunk
+        # Keep final chunk
         if current_chunk:
-            chunk_entities = self._predict_chunk(current_chunk, chunk_start_pos)
-            all_entities.extend(chunk_entities)
+            chunks.append((current_chunk, chunk_start_pos))
         
-        return all_entities
+        return chunks
 
-    def _predict_chunk(self, chunk_text: str, offset: int) -> List[Tuple[str, str, int, int]]:
-        """Process a single chunk of text
+    def _forward(self, batch_input_ids: List[List[int]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Run the model on a padded batch of token id sequences
         
         Args:
-            chunk_text: Text chunk to process
-            offset: Character offset of this chunk in the original text
+            batch_input_ids: Token ids per sequence, including [CLS] and [SEP]
             
         Returns:
-            List of entities with adjusted positions
+            (predicted label ids, confidence scores), each of shape [batch, max_length]
         """
-        # Tokenize chunk
-        tokens = self.tokenizer.tokenize(chunk_text)
-        input_ids = self.tokenizer.convert_tokens_to_ids(['[CLS]'] + tokens + ['[SEP]'])
-        attention_mask = [1] * len(input_ids)
-
-        # Convert to tensors
-        input_ids_tensor = torch.tensor([input_ids])
-        attention_mask_tensor = torch.tensor([attention_mask])
+        max_length = max(len(ids) for ids in batch_input_ids)
+        pad_id = self.tokenizer.pad_token_id or 0
+        input_ids = [ids + [pad_id] * (max_length - len(ids)) for ids in batch_input_ids]
+        attention_mask = [[1] * len(ids) + [0] * (max_length - len(ids)) for ids in batch_input_ids]
 
         # Get predictions with confidence scoring
         with torch.no_grad():
-            outputs = self.model(input_ids=input_ids_tensor, attention_mask=attention_mask_tensor)
+            outputs = self.model(input_ids=torch.tensor(input_ids), attention_mask=torch.tensor(attention_mask))
             logits = outputs.logits
             
             # Apply softmax to get probabilities
@@ -495,12 +509,21 @@ class PIIShieldModel(ModelInterface):
             # Get predictions and their confidence scores
             predictions = torch.argmax(logits, dim=2)
             confidence_scores = torch.max(probabilities, dim=2).values
+        
+        return predictions, confidence_scores
 
-        # Get labels with confidence filtering (excluding [CLS] and [SEP])
+    def _labels_for_row(self, predictions: torch.Tensor, confidence_scores: torch.Tensor, length: int) -> List[str]:
+        """Labels for one sequence with confidence filtering (excluding [CLS] and [SEP])
+        
+        Args:
+            predictions: Predicted label ids for the sequence
+            confidence_scores: Confidence of each prediction
+            length: Sequence length including [CLS] and [SEP] (padding excluded)
+        """
         pred_labels = []
-        for i, pred in enumerate(predictions[0][1:-1]):  # Skip [CLS] and [SEP]
-            confidence = confidence_scores[0][i+1].item()  # +1 to account for [CLS]
-            predicted_label = self.id2label[pred.item()]
+        for i, pred in enumerate(predictions[1:length - 1].tolist()):  # Skip [CLS] and [SEP]
+            confidence = confidence_scores[i + 1].item()  # +1 to account for [CLS]
+            predicted_label = self.id2label[pred]
             
             # Apply confidence threshold - only accept non-'O' labels with high confidence
             if predicted_label != 'O' and confidence < Config.CONFIDENCE_THRESHOLD:
@@ -508,7 +531,21 @@ class PIIShieldModel(ModelInterface):
                 pred_labels.append('O')
             else:
                 pred_labels.append(predicted_label)
+        return pred_labels
 
+    def _decode_chunk(self, chunk_text: str, tokens: List[str], pred_labels: List[str],
+                      offset: int) -> List[Tuple[str, str, int, int]]:
+        """Turn the labels of one long-text chunk into entities
+        
+        Args:
+            chunk_text: Text chunk that was processed
+            tokens: The chunk's tokens (without [CLS] and [SEP])
+            pred_labels: Label per token
+            offset: Character offset of this chunk in the original text
+            
+        Returns:
+            List of entities with adjusted positions
+        """
         # Create token spans for this chunk
         token_spans = []
         token_offset = 0
@@ -593,387 +630,430 @@ class PIIShieldModel(ModelInterface):
         
         return adjusted_entities
 
-    def predict(self, text: str) -> List[Tuple[str, str, int, int]]:
-        """Extract entities from text with their positions
+    def _entities_from_labels(self, text: str, token_spans: List[Tuple[int, int]],
+                              pred_labels: List[str]) -> List[Tuple[str, str, int, int]]:
+        """Turn token labels of a short text into validated entities
+        
+        Merges BIO spans, applies the type validators, adds the regex fallbacks and
+        obfuscated PII detection, and removes overlaps.
         
         Args:
-            text: Input text to analyze
+            text: Input text
+            token_spans: Character span per token (without [CLS] and [SEP])
+            pred_labels: Label per token
             
         Returns:
             List of tuples containing (entity_text, entity_type, start_position, end_position)
         """
-        if not self.is_loaded() or not text.strip():
-            return []
+        # Process entities with improved subtoken merging
+        entities = []
+        current_entity_spans = []
+        current_label = None
 
-        try:
-            # Check if text exceeds token limit and use chunking if necessary
-            tokens = self.tokenizer.tokenize(text)
-            max_tokens = 450  # Leave some buffer for [CLS] and [SEP] tokens
-            
-            if len(tokens) > max_tokens:
-                # Use chunking for long texts
-                return self._predict_with_chunking(text, max_tokens)
-            
-            # Process normally for shorter texts
-            # Tokenize text with proper truncation and padding
-            encoding = self.tokenizer(
-                text,
-                padding=True,
-                truncation=True,
-                max_length=512,  # BERT's maximum sequence length
-                return_tensors="pt",
-                return_offsets_mapping=True
-            )
+        # Extract entities based on BIO tagging scheme with offset mapping
+        for i, (span, label) in enumerate(zip(token_spans, pred_labels)):
+            start_pos, end_pos = span
             
-            input_ids_tensor = encoding['input_ids']
-            attention_mask_tensor = encoding['attention_mask']
-            offset_mapping = encoding['offset_mapping'][0]  # Get the offset mapping for position tracking
+            if label == 'O':  # Outside any entity
+                if current_entity_spans:
+                    # End of entity - merge spans
+                    entity_start = current_entity_spans[0][0]
+                    entity_end = current_entity_spans[-1][1]
+                    entity_text = text[entity_start:entity_end].strip()
+                    
+                    if entity_text and current_label:  # Only add non-empty entities
+                        entities.append((entity_text, current_label, entity_start, entity_end))
+                        
+                    # Reset entity tracking
+                    current_entity_spans = []
+                    current_label = None
+                    
+            elif label.startswith('B-'):  # Beginning of entity
+                if current_entity_spans:
+                    # End previous entity if exists
+                    entity_start = current_entity_spans[0][0]
+                    entity_end = current_entity_spans[-1][1]
+                    entity_text = text[entity_start:entity_end].strip()
+                    
+                    if entity_text and current_label:
+                        entities.append((entity_text, current_label, entity_start, entity_end))
 
-            # Get predictions with confidence scoring
-            with torch.no_grad():
-                outputs = self.model(input_ids=input_ids_tensor, attention_mask=attention_mask_tensor)
-                logits = outputs.logits
-                
-                # Apply softmax to get probabilities
-                probabilities = torch.softmax(logits, dim=2)
+                # Start new entity
+                current_entity_spans = [span]
+                current_label = label[2:]  # Remove 'B-' prefix
                 
-                # Get predictions and their confidence scores
-                predictions = torch.argmax(logits, dim=2)
-                confidence_scores = torch.max(probabilities, dim=2).values
-
-            # Get labels with confidence filtering (excluding [CLS] and [SEP])
-            pred_labels = []
-            for i, pred in enumerate(predictions[0][1:-1]):  # Skip [CLS] and [SEP]
-                confidence = confidence_scores[0][i+1].item()  # +1 to account for [CLS]
-                predicted_label = self.id2label[pred.item()]
+            elif label.startswith('I-'):  # Inside entity
+                # For I- tags, check if we should continue or start new
+                entity_type = label[2:]
                 
-                # Apply confidence threshold - only accept non-'O' labels with high confidence
-                if predicted_label != 'O' and confidence < Config.CONFIDENCE_THRESHOLD:
-                    # If confidence is too low, treat as 'O' (Outside)
-                    pred_labels.append('O')
+                if current_label == entity_type and current_entity_spans:
+                    # Continue current entity
+                    current_entity_spans.append(span)
                 else:
-                    pred_labels.append(predicted_label)
-            
-            # Use offset mapping for accurate token positions (excluding [CLS] and [SEP])
-            token_spans = [(start.item(), end.item()) for start, end in offset_mapping[1:-1]]
-
-            # Process entities with improved subtoken merging
-            entities = []
-            current_entity_spans = []
-            current_label = None
-
-            # Extract entities based on BIO tagging scheme with offset mapping
-            for i, (span, label) in enumerate(zip(token_spans, pred_labels)):
-                start_pos, end_pos = span
-                
-                if label == 'O':  # Outside any entity
-                    if current_entity_spans:
-                        # End of entity - merge spans
+                    # Different entity type or no current entity
+                    if current_entity_spans and current_label:
+                        # Save previous entity
                         entity_start = current_entity_spans[0][0]
                         entity_end = current_entity_spans[-1][1]
                         entity_text = text[entity_start:entity_end].strip()
                         
-                        if entity_text and current_label:  # Only add non-empty entities
+                        if entity_text:
                             entities.append((entity_text, current_label, entity_start, entity_end))
-                            
-                        # Reset entity tracking
-                        current_entity_spans = []
-                        current_label = None
-                        
-                elif label.startswith('B-'):  # Beginning of entity
-                    if current_entity_spans:
-                        # End previous entity if exists
-                        entity_start = current_entity_spans[0][0]
-                        entity_end = current_entity_spans[-1][1]
-                        entity_text = text[entity_start:entity_end].strip()
-                        
-                        if entity_text and current_label:
-                            entities.append((entity_text, current_label, entity_start, entity_end))
-
-                    # Start new entity
-                    current_entity_spans = [span]
-                    current_label = label[2:]  # Remove 'B-' prefix
                     
-                elif label.startswith('I-'):  # Inside entity
-                    # For I- tags, check if we should continue or start new
-                    entity_type = label[2:]
-                    
-                    if current_label == entity_type and current_entity_spans:
-                        # Continue current entity
-                        current_entity_spans.append(span)
-                    else:
-                        # Different entity type or no current entity
-                        if current_entity_spans and current_label:
-                            # Save previous entity
-                            entity_start = current_entity_spans[0][0]
-                            entity_end = current_entity_spans[-1][1]
-                            entity_text = text[entity_start:entity_end].strip()
-                            
-                            if entity_text:
-                                entities.append((entity_text, current_label, entity_start, entity_end))
-                        
-                        # Start new entity with I- tag
-                        current_entity_spans = [span]
-                        current_label = entity_type
-
-            # Process any remaining entity
-            if current_entity_spans and current_label:
-                entity_start = current_entity_spans[0][0]
-                entity_end = current_entity_spans[-1][1]
-                entity_text = text[entity_start:entity_end].strip()
+                    # Start new entity with I- tag
+                    current_entity_spans = [span]
+                    current_label = entity_type
+
+        # Process any remaining entity
+        if current_entity_spans and current_label:
+            entity_start = current_entity_spans[0][0]
+            entity_end = current_entity_spans[-1][1]
+            entity_text = text[entity_start:entity_end].strip()
+            
+            if entity_text:
+                entities.append((entity_text, current_label, entity_start, entity_end))
+
+        # Post-process to merge adjacent entities of same type (for handling subtokens)
+        # Also merge entities that are credit cards, phone numbers, or IDs split by separators
+        merged_entities = []
+        i = 0
+        while i < len(entities):
+            entity_text, entity_type, start, end = entities[i]
+            
+            # Special handling for numeric entity types that might be split
+            numeric_types = ['CREDIT-CARD', 'PHONE', 'CIVIL-ID', 'PASSPORT-ID']
+            
+            # Look ahead to merge adjacent entities
+            j = i + 1
+            while j < len(entities):
+                next_text, next_type, next_start, next_end = entities[j]
                 
-                if entity_text:
-                    entities.append((entity_text, current_label, entity_start, entity_end))
-
-            # Post-process to merge adjacent entities of same type (for handling subtokens)
-            # Also merge entities that are credit cards, phone numbers, or IDs split by separators
-            merged_entities = []
-            i = 0
-            while i < len(entities):
-                entity_text, entity_type, start, end = entities[i]
+                # Check if we should merge
+                should_merge = False
                 
-                # Special handling for numeric entity types that might be split
-                numeric_types = ['CREDIT-CARD', 'PHONE', 'CIVIL-ID', 'PASSPORT-ID']
+                # Case 1: Same type and adjacent or very close
+                if next_type == entity_type and next_start - end <= 2:
+                    should_merge = True
                 
-                # Look ahead to merge adjacent entities
-                j = i + 1
-                while j < len(entities):
-                    next_text, next_type, next_start, next_end = entities[j]
-                    
-                    # Check if we should merge
-                    should_merge = False
-                    
-                    # Case 1: Same type and adjacent or very close
-                    if next_type == entity_type and next_start - end <= 2:
+                # Case 2: Numeric types that might be part of same number
+                elif entity_type in numeric_types and next_type in numeric_types:
+                    # Check if there's only a separator between them (-, space, etc.)
+                    gap_text = text[end:next_start]
+                    if len(gap_text) <= 2 and all(c in '- ' for c in gap_text):
+                        # Merge and use the most specific type
                         should_merge = True
-                    
-                    # Case 2: Numeric types that might be part of same number
-                    elif entity_type in numeric_types and next_type in numeric_types:
-                        # Check if there's only a separator between them (-, space, etc.)
-                        gap_text = text[end:next_start]
-                        if len(gap_text) <= 2 and all(c in '- ' for c in gap_text):
-                            # Merge and use the most specific type
-                            should_merge = True
-                            # Prioritize CREDIT-CARD and PASSPORT-ID over PHONE and CIVIL-ID
-                            priority = {'CREDIT-CARD': 4, 'PASSPORT-ID': 3, 'CIVIL-ID': 2, 'PHONE': 1}
-                            if priority.get(next_type, 0) > priority.get(entity_type, 0):
-                                entity_type = next_type
-                    
-                    if should_merge:
-                        # Merge entities by extending the end position
-                        # Get the actual text span from original text
-                        full_text = text[start:next_end]
-                        # Remove any ## artifacts
-                        full_text = full_text.replace('##', '')
-                        entity_text = full_text
-                        end = next_end
-                        j += 1
-                    else:
-                        break
+                        # Prioritize CREDIT-CARD and PASSPORT-ID over PHONE and CIVIL-ID
+                        priority = {'CREDIT-CARD': 4, 'PASSPORT-ID': 3, 'CIVIL-ID': 2, 'PHONE': 1}
+                        if priority.get(next_type, 0) > priority.get(entity_type, 0):
+                            entity_type = next_type
                 
-                # Clean up the entity text
-                entity_text = entity_text.replace('##', '').strip()
-                
-                # Additional validation to prevent false positives
-                if self._is_likely_false_positive(entity_text, entity_type):
+                if should_merge:
+                    # Merge entities by extending the end position
+                    # Get the actual text span from original text
+                    full_text = text[start:next_end]
+                    # Remove any ## artifacts
+                    full_text = full_text.replace('##', '')
+                    entity_text = full_text
+                    end = next_end
+                    j += 1
+                else:
+                    break
+            
+            # Clean up the entity text
+            entity_text = entity_text.replace('##', '').strip()
+            
+            # Additional validation to prevent false positives
+            if self._is_likely_false_positive(entity_text, entity_type):
+                i = j
+                continue
+            
+            # Validate Credit Cards
+            if entity_type == 'CREDIT-CARD' or entity_type == 'CREDITCARD':
+                if not self._is_valid_credit_card(entity_text):
+                    # Skip invalid credit cards
                     i = j
                     continue
-                
-                # Validate Credit Cards
-                if entity_type == 'CREDIT-CARD' or entity_type == 'CREDITCARD':
-                    if not self._is_valid_credit_card(entity_text):
-                        # Skip invalid credit cards
-                        i = j
-                        continue
-                
-                # Validate Civil IDs
-                if entity_type == 'CIVIL-ID' or entity_type == 'CIVILID':
-                    if not self._is_valid_civil_id(entity_text):
-                        # Skip invalid civil IDs
-                        i = j
-                        continue
-                
-                # Validate Passport IDs
-                if entity_type == 'PASSPORT-ID' or entity_type == 'PASSPORT':
-                    if not self._is_valid_passport(entity_text):
-                        # Skip invalid passport numbers
-                        i = j
-                        continue
-                
-                # Validate Omani phone numbers
-                if entity_type == 'PHONE':
-                    if not self._is_valid_omani_phone(entity_text):
-                        # Skip non-Omani phone numbers
-                        i = j
-                        continue
-                
-                # Validate emails
-                if entity_type == 'EMAIL':
-                    if not self._is_valid_email(entity_text):
-                        # Skip invalid emails
-                        i = j
-                        continue
-                
-                # Validate URLs
-                if entity_type == 'URL':
-                    if not self._is_valid_url(entity_text):
-                        # Skip invalid URLs
-                        i = j
-                        continue
-                
-                # Validate PERSON entities - only filter extreme cases
-                if entity_type == 'PERSON' or entity_type == 'PER':
-                    clean_text = entity_text.strip()
-                    # Only skip single character detections
-                    if len(clean_text) <= 1:
-                        i = j
-                        continue
-                
-                # Validate ORGANIZATION entities - filter short false positives
-                if entity_type == 'ORGANIZATION' or entity_type == 'ORG':
-                    clean_text = entity_text.strip()
-                    # Skip organizations shorter than 3 characters to avoid false positives like "um"
-                    if len(clean_text) <= 2:
-                        i = j
-                        continue
-                
-                # Validate LOCATION entities - filter short false positives
-                if entity_type == 'LOCATION' or entity_type == 'LOC':
-                    clean_text = entity_text.strip()
-                    # Skip locations shorter than 3 characters to avoid false positives like "ال" (the article)
-                    # Common Arabic articles and prepositions should not be detected as locations
-                    if len(clean_text) <= 2 or clean_text in ['ال', 'في', 'من', 'إلى', 'على', 'عن', 'مع']:
-                        i = j
-                        continue
-                
-                # General validation - commented out to allow all entities through
-                # if entity_type not in ['PHONE', 'EMAIL', 'URL', 'CREDIT-CARD', 'CIVIL-ID', 'PASSPORT-ID']:
-                #     clean_text = entity_text.strip()
-                #     if len(clean_text) <= 1:
-                #         i = j
-                #         continue
-                
-                if entity_text:  # Only add non-empty entities
-                    merged_entities.append((entity_text, entity_type, start, end))
-                i = j
+            
+            # Validate Civil IDs
+            if entity_type == 'CIVIL-ID' or entity_type == 'CIVILID':
+                if not self._is_valid_civil_id(entity_text):
+                    # Skip invalid civil IDs
+                    i = j
+                    continue
+            
+            # Validate Passport IDs
+            if entity_type == 'PASSPORT-ID' or entity_type == 'PASSPORT':
+                if not self._is_valid_passport(entity_text):
+                    # Skip invalid passport numbers
+                    i = j
+                    continue
+            
+            # Validate Omani phone numbers
+            if entity_type == 'PHONE':
+                if not self._is_valid_omani_phone(entity_text):
+                    # Skip non-Omani phone numbers
+                    i = j
+                    continue
+            
+            # Validate emails
+            if entity_type == 'EMAIL':
+                if not self._is_valid_email(entity_text):
+                    # Skip invalid emails
+                    i = j
+                    continue
+            
+            # Validate URLs
+            if entity_type == 'URL':
+                if not self._is_valid_url(entity_text):
+                    # Skip invalid URLs
+                    i = j
+                    continue
+            
+            # Validate PERSON entities - only filter extreme cases
+            if entity_type == 'PERSON' or entity_type == 'PER':
+                clean_text = entity_text.strip()
+                # Only skip single character detections
+                if len(clean_text) <= 1:
+                    i = j
+                    continue
+            
+            # Validate ORGANIZATION entities - filter short false positives
+            if entity_type == 'ORGANIZATION' or entity_type == 'ORG':
+                clean_text = entity_text.strip()
+                # Skip organizations shorter than 3 characters to avoid false positives like "um"
+                if len(clean_text) <= 2:
+                    i = j
+                    continue
+            
+            # Validate LOCATION entities - filter short false positives
+            if entity_type == 'LOCATION' or entity_type == 'LOC':
+                clean_text = entity_text.strip()
+                # Skip locations shorter than 3 characters to avoid false positives like "ال" (the article)
+                # Common Arabic articles and prepositions should not be detected as locations
+                if len(clean_text) <= 2 or clean_text in ['ال', 'في', 'من', 'إلى', 'على', 'عن', 'مع']:
+                    i = j
+                    continue
+            
+            # General validation - commented out to allow all entities through
+            # if entity_type not in ['PHONE', 'EMAIL', 'URL', 'CREDIT-CARD', 'CIVIL-ID', 'PASSPORT-ID']:
+            #     clean_text = entity_text.strip()
+            #     if len(clean_text) <= 1:
+            #         i = j
+            #         continue
+            
+            if entity_text:  # Only add non-empty entities
+                merged_entities.append((entity_text, entity_type, start, end))
+            i = j
 
-            # Fallback: Add regex-based detection for emails and URLs if model missed them
-            text_lower = text.lower()
+        # Fallback: Add regex-based detection for emails and URLs if model missed them
+        text_lower = text.lower()
+        
+        # Detect emails with regex if not already found
+        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+        for match in re.finditer(email_pattern, text):
+            email_text = match.group()
+            email_start = match.start()
+            email_end = match.end()
             
-            # Detect emails with regex if not already found
-            email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-            for match in re.finditer(email_pattern, text):
-                email_text = match.group()
-                email_start = match.start()
-                email_end = match.end()
-                
-                # Check if this email is already detected
-                already_detected = any(
-                    start <= email_start < end or start < email_end <= end 
-                    for _, _, start, end in merged_entities
-                )
-                
-                if not already_detected and self._is_valid_email(email_text):
-                    merged_entities.append((email_text, 'EMAIL', email_start, email_end))
-            
-            # Detect URLs with regex if not already found
-            url_pattern = r'\b(?:https?://)?(?:www\.)?[a-zA-Z0-9-]+(?:\.[a-zA-Z]{2,})+(?:/[^\s]*)?\b'
-            for match in re.finditer(url_pattern, text):
-                url_text = match.group()
-                url_start = match.start()
-                url_end = match.end()
-                
-                # Check if this URL is already detected or is an email
+            # Check if this email is already detected
+            already_detected = any(
+                start <= email_start < end or start < email_end <= end 
+                for _, _, start, end in merged_entities
+            )
+            
+            if not already_detected and self._is_valid_email(email_text):
+                merged_entities.append((email_text, 'EMAIL', email_start, email_end))
+        
+        # Detect URLs with regex if not already found
+        url_pattern = r'\b(?:https?://)?(?:www\.)?[a-zA-Z0-9-]+(?:\.[a-zA-Z]{2,})+(?:/[^\s]*)?\b'
+        for match in re.finditer(url_pattern, text):
+            url_text = match.group()
+            url_start = match.start()
+            url_end = match.end()
+            
+            # Check if this URL is already detected or is an email
+            already_detected = any(
+                start <= url_start < end or start < url_end <= end 
+                for _, _, start, end in merged_entities
+            )
+            
+            if not already_detected and '@' not in url_text and self._is_valid_url(url_text):
+                merged_entities.append((url_text, 'URL', url_start, url_end))
+        
+        # Fallback detection for IDs that model might miss
+        # IMPORTANT: Check these BEFORE obfuscated detection to avoid phone conflicts
+        # Detect Civil IDs - broader pattern to catch more cases (including Arabic numerals)
+        civil_id_patterns = [
+            r'\b(?:civil\s*(?:id)?|id\s*(?:number)?|حساب)[:\s]+([\d\u0660-\u0669]{9,12})\b',
+            r'\b(?:civil|id|حساب)[:\s]*([\d\u0660-\u0669]{9,12})\b',
+            r'\b([\d\u0660-\u0669]{9,12})\b'  # Any 9-12 digit number that passes validation
+        ]
+        for pattern in civil_id_patterns:
+            for match in re.finditer(pattern, text, re.IGNORECASE):
+                id_text = match.group(1)
+                if self._is_valid_civil_id(id_text):
+                    start = match.start(1) if match.lastindex else match.start()
+                    end = match.end(1) if match.lastindex else match.end()
+                    already_detected = any(
+                        s <= start < e or s < end <= e 
+                        for _, _, s, e in merged_entities
+                    )
+                    if not already_detected:
+                        merged_entities.append((id_text, 'CIVIL-ID', start, end))
+                        break  # Found one, no need to check other patterns
+        
+        # Detect Credit Cards (including Arabic numerals)
+        credit_card_pattern = r'\b([45٤٥][\d\u0660-\u0669]{3}[\s\-]?[\d\u0660-\u0669]{4}[\s\-]?[\d\u0660-\u0669]{4}[\s\-]?[\d\u0660-\u0669]{4})\b'
+        for match in re.finditer(credit_card_pattern, text):
+            card_text = match.group(1)
+            if self._is_valid_credit_card(card_text):
+                start = match.start()
+                end = match.end()
                 already_detected = any(
-                    start <= url_start < end or start < url_end <= end 
-                    for _, _, start, end in merged_entities
+                    s <= start < e or s < end <= e 
+                    for _, _, s, e in merged_entities
                 )
-                
-                if not already_detected and '@' not in url_text and self._is_valid_url(url_text):
-                    merged_entities.append((url_text, 'URL', url_start, url_end))
-            
-            # Fallback detection for IDs that model might miss
-            # IMPORTANT: Check these BEFORE obfuscated detection to avoid phone conflicts
-            # Detect Civil IDs - broader pattern to catch more cases (including Arabic numerals)
-            civil_id_patterns = [
-                r'\b(?:civil\s*(?:id)?|id\s*(?:number)?|حساب)[:\s]+([\d\u0660-\u0669]{9,12})\b',
-                r'\b(?:civil|id|حساب)[:\s]*([\d\u0660-\u0669]{9,12})\b',
-                r'\b([\d\u0660-\u0669]{9,12})\b'  # Any 9-12 digit number that passes validation
-            ]
-            for pattern in civil_id_patterns:
-                for match in re.finditer(pattern, text, re.IGNORECASE):
-                    id_text = match.group(1)
-                    if self._is_valid_civil_id(id_text):
-                        start = match.start(1) if match.lastindex else match.start()
-                        end = match.end(1) if match.lastindex else match.end()
-                        already_detected = any(
-                            s <= start < e or s < end <= e 
-                            for _, _, s, e in merged_entities
-                        )
-                        if not already_detected:
-                            merged_entities.append((id_text, 'CIVIL-ID', start, end))
-                            break  # Found one, no need to check other patterns
-            
-            # Detect Credit Cards (including Arabic numerals)
-            credit_card_pattern = r'\b([45٤٥][\d\u0660-\u0669]{3}[\s\-]?[\d\u0660-\u0669]{4}[\s\-]?[\d\u0660-\u0669]{4}[\s\-]?[\d\u0660-\u0669]{4})\b'
-            for match in re.finditer(credit_card_pattern, text):
-                card_text = match.group(1)
-                if self._is_valid_credit_card(card_text):
-                    start = match.start()
-                    end = match.end()
+                if not already_detected:
+                    merged_entities.append((card_text, 'CREDIT-CARD', start, end))
+        
+        # Detect Passport numbers - look for context or pattern
+        passport_patterns = [
+            (r'\b(?:passport|pass|id)[:\s]+([A-Z]{1,2}\d{7,9})\b', True),  # With "passport" context
+            (r'\b([A-Z]{1,2}\d{7,9})\b', False)  # Just the pattern
+        ]
+        for pattern, case_insensitive in passport_patterns:
+            flags = re.IGNORECASE if case_insensitive else 0
+            for match in re.finditer(pattern, text, flags):
+                passport_text = match.group(1) if match.lastindex else match.group()
+                if self._is_valid_passport(passport_text):
+                    start = match.start(1) if match.lastindex else match.start()
+                    end = match.end(1) if match.lastindex else match.end()
                     already_detected = any(
                         s <= start < e or s < end <= e 
                         for _, _, s, e in merged_entities
                     )
                     if not already_detected:
-                        merged_entities.append((card_text, 'CREDIT-CARD', start, end))
-            
-            # Detect Passport numbers - look for context or pattern
-            passport_patterns = [
-                (r'\b(?:passport|pass|id)[:\s]+([A-Z]{1,2}\d{7,9})\b', True),  # With "passport" context
-                (r'\b([A-Z]{1,2}\d{7,9})\b', False)  # Just the pattern
-            ]
-            for pattern, case_insensitive in passport_patterns:
-                flags = re.IGNORECASE if case_insensitive else 0
-                for match in re.finditer(pattern, text, flags):
-                    passport_text = match.group(1) if match.lastindex else match.group()
-                    if self._is_valid_passport(passport_text):
-                        start = match.start(1) if match.lastindex else match.start()
-                        end = match.end(1) if match.lastindex else match.end()
-                        already_detected = any(
-                            s <= start < e or s < end <= e 
-                            for _, _, s, e in merged_entities
-                        )
-                        if not already_detected:
-                            merged_entities.append((passport_text, 'PASSPORT-ID', start, end))
-                            break  # Found one, stop checking patterns
-            
-
-            merged_entities.extend(self._detect_obfuscated_pii(text, merged_entities))
-            
-            # Remove duplicate/overlapping entities
-            final_entities = []
-            seen_positions = set()
-            
-            # Sort by start position
-            merged_entities.sort(key=lambda x: x[2])
-            
-            for entity in merged_entities:
-                text, entity_type, start, end = entity
-                # Check if this position overlaps with any already added entity
-                overlap = False
-                for seen_start, seen_end in seen_positions:
-                    if (start >= seen_start and start < seen_end) or (end > seen_start and end <= seen_end):
-                        overlap = True
-                        break
-                
-                if not overlap:
-                    final_entities.append(entity)
-                    seen_positions.add((start, end))
+                        merged_entities.append((passport_text, 'PASSPORT-ID', start, end))
+                        break  # Found one, stop checking patterns
+        
+
+        merged_entities.extend(self._detect_obfuscated_pii(text, merged_entities))
+        
+        # Remove duplicate/overlapping entities
+        final_entities = []
+        seen_positions = set()
+        
+        # Sort by start position
+        merged_entities.sort(key=lambda x: x[2])
+        
+        for entity in merged_entities:
+            text, entity_type, start, end = entity
+            # Check if this position overlaps with any already added entity
+            overlap = False
+            for seen_start, seen_end in seen_positions:
+                if (start >= seen_start and start < seen_end) or (end > seen_start and end <= seen_end):
+                    overlap = True
+                    break
             
-            return final_entities
+            if not overlap:
+                final_entities.append(entity)
+                seen_positions.add((start, end))
+        
+        return final_entities
+
+    def predict(self, text: str) -> List[Tuple[str, str, int, int]]:
+        """Extract entities from text with their positions
+        
+        Args:
+            text: Input text to analyze
             
-        except Exception as e:
-            logger.exception(f"Error during prediction: {str(e)}")
-            return []
-            
\ No newline at end of file
+        Returns:
+            List of tuples containing (entity_text, entity_type, start_position, end_position)
+        """
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[Tuple[str, str, int, int]]]:
+        """Extract entities from several texts, batching model inference across them
+        
+        Texts are normalized first (whitespace, control characters, Arabic digits,
+        alef variants and tatweel), and detection runs once on the normalized text;
+        entity offsets are mapped back to the original text. Short texts are encoded
+        together; long texts are split into chunks and the chunks of all texts are
+        batched. Decoding and validation are the same as for a single `predict` call.
+        
+        Args:
+            texts: Input texts to analyze
+            batch_size: Sequences per forward pass (defaults to Config.INFERENCE_BATCH_SIZE)
+            
+        Returns:
+            One entity list per input text, in input order
+        """
+        results: List[List[Tuple[str, str, int, int]]] = [[] for _ in texts]
+        if not self.is_loaded():
+            return results
+        batch_size = batch_size or Config.INFERENCE_BATCH_SIZE
+        original_texts = texts
+        normalized = [self.normalizer.normalize(text) for text in texts]
+        texts = [normalized_text.text for normalized_text in normalized]
+        max_tokens = 450  # Leave some buffer for [CLS] and [SEP] tokens
+
+        short_texts = []  # (text index, text)
+        chunk_jobs = []  # (text index, chunk text, offset, tokens)
+        for index, text in enumerate(texts):
+            if not text.strip():
+                continue
+            try:
+                # Check if text exceeds token limit and use chunking if necessary
+                if len(self.tokenizer.tokenize(text)) > max_tokens:
+                    for chunk_text, offset in self._split_into_chunks(text, max_tokens):
+                        chunk_jobs.append((index, chunk_text, offset, self.tokenizer.tokenize(chunk_text)))
+                else:
+                    short_texts.append((index, text))
+            except Exception as e:
+                logger.exception(f"Error during prediction: {str(e)}")
+
+        # Short texts: encode with offset mapping for accurate token positions
+        for batch_start in range(0, len(short_texts), batch_size):
+            batch = short_texts[batch_start:batch_start + batch_size]
+            try:
+                encodings = [
+                    self.tokenizer(text, truncation=True, max_length=512, return_offsets_mapping=True)
+                    for _, text in batch
+                ]
+                predictions, confidence_scores = self._forward([encoding['input_ids'] for encoding in encodings])
+            except Exception as e:
+                logger.exception(f"Error during prediction: {str(e)}")
+                continue
+            for row, ((index, text), encoding) in enumerate(zip(batch, encodings)):
+                try:
+                    length = len(encoding['input_ids'])
+                    pred_labels = self._labels_for_row(predictions[row], confidence_scores[row], length)
+                    # Offset mapping excluding [CLS] and [SEP]
+                    token_spans = [tuple(span) for span in encoding['offset_mapping'][1:length - 1]]
+                    results[index] = self._entities_from_labels(text, token_spans, pred_labels)
+                except Exception as e:
+                    logger.exception(f"Error during prediction: {str(e)}")
+
+        # Long texts: batch the chunks of all texts together
+        failed = set()
+        for batch_start in range(0, len(chunk_jobs), batch_size):
+            batch = chunk_jobs[batch_start:batch_start + batch_size]
+            try:
+                batch_ids = [
+                    self.tokenizer.convert_tokens_to_ids(['[CLS]'] + tokens + ['[SEP]'])
+                    for _, _, _, tokens in batch
+                ]
+                predictions, confidence_scores = self._forward(batch_ids)
+                for row, (index, chunk_text, offset, tokens) in enumerate(batch):
+                    pred_labels = self._labels_for_row(predictions[row], confidence_scores[row], len(batch_ids[row]))
+                    results[index].extend(self._decode_chunk(chunk_text, tokens, pred_labels, offset))
+            except Exception as e:
+                logger.exception(f"Error during prediction: {str(e)}")
+                failed.update(index for index, _, _, _ in batch)
+        for index in failed:
+            results[index] = []
+
+        return [
+            Prediction(self._to_original(text, normalized_text, entities))
+            for text, normalized_text, entities in zip(original_texts, normalized, results)
+        ]
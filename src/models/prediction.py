@@ -0,0 +1,27 @@
+from typing import Iterable, List, Optional, Tuple
+
+class Prediction(list):
+    """Entity tuples (text, type, start, end) predicted for one text
+
+    Behaves as the plain list models have always returned. It also keeps the
+    result of `EntityProcessor.split_combined_entities` for the text it was
+    predicted on, so splitting runs once per prediction however many
+    consumers (counting, highlighting, masking) ask for it.
+    """
+
+    __slots__ = ('_split_text', '_split')
+
+    def __init__(self, entities: Iterable[Tuple[str, str, int, int]] = ()):
+        super().__init__(entities)
+        self._split_text: Optional[str] = None
+        self._split: Optional[List[Tuple[str, str, int, int]]] = None
+
+    def split_for(self, text: str) -> Optional[List[Tuple[str, str, int, int]]]:
+        """Memoized split entities, if they were computed for `text`"""
+        if self._split is not None and (self._split_text is text or self._split_text == text):
+            return self._split
+        return None
+
+    def remember_split(self, text: str, entities: List[Tuple[str, str, int, int]]) -> None:
+        self._split_text = text
+        self._split = entities
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """TTL and size bounded cache for LLM responses
+
+    Entries are keyed on a hash of the masked prompt window, so only text that
+    has already passed through `mask_entities` ever reaches the cache. Placeholders
+    such as Person1 make many masked prompts identical across sessions, and each
+    session unmasks a cached response with its own mappings.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 3600, enabled: bool = True):
+        """Initialize the cache
+
+        Args:
+            max_entries: Maximum number of cached responses (least recently used are evicted)
+            ttl_seconds: Lifetime of an entry in seconds
+            enabled: Set to False to turn the cache into a no-op
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(messages: List[Dict], prompt_variant: str, model: str, temperature: float) -> str:
+        """Build a cache key for a masked prompt window
+
+        Args:
+            messages: Masked chat messages (system prompt, context, history, current message)
+            prompt_variant: Name of the system prompt variant ("chat", "document", ...)
+            model: Target LLM model name
+            temperature: Sampling temperature, bucketed to one decimal place
+
+        Returns:
+            Hex digest identifying the request
+        """
+        window = [{"role": msg.get("role"), "content": msg.get("content", "")} for msg in messages]
+        payload = json.dumps(
+            {
+                "variant": prompt_variant,
+                "model": model,
+                "temperature": round(temperature, 1),
+                "messages": window
+            },
+            ensure_ascii=False,
+            separators=(',', ':')
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response, or None on a miss or expired entry"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, response = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def set(self, key: str, response: str) -> None:
+        """Store a response, evicting the least recently used entries when full"""
+        if not self.enabled or not response:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """Drop expired entries
+
+        Returns:
+            Number of entries removed
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (stored_at, _) in self._entries.items() if now - stored_at > self.ttl_seconds]
+            for key in expired:
+                del self._entries[key]
+        if expired:
+            logger.info(f"Purged {len(expired)} expired response cache entries")
+        return len(expired)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache statistics"""
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
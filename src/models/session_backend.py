@@ -0,0 +1,356 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def encode_value(value: Any) -> bytes:
+    """Serialize a session value compactly
+
+    Values are stored as compact UTF-8 JSON; payloads over 512 bytes are zlib
+    compressed. The first byte records which encoding was used.
+    """
+    raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(raw) > 512:
+        return b'z' + zlib.compress(raw, 6)
+    return b'j' + raw
+
+def decode_value(data: bytes) -> Any:
+    """Inverse of `encode_value`"""
+    data = bytes(data)
+    if data[:1] == b'z':
+        return json.loads(zlib.decompress(data[1:]).decode('utf-8'))
+    return json.loads(data[1:].decode('utf-8'))
+
+def empty_changes() -> Dict[str, Any]:
+    """Return an empty change set
+
+    A change set describes one turn's writes:
+    - fields: field name -> new value (upserted)
+    - removed: field names to delete
+    - appends: list name -> items appended to that list
+    - trims: list name -> number of most recent items to keep
+    """
+    return {'fields': {}, 'removed': [], 'appends': {}, 'trims': {}}
+
+def has_changes(changes: Dict[str, Any]) -> bool:
+    """Check whether a change set writes anything"""
+    return any(changes.get(part) for part in ('fields', 'removed', 'appends', 'trims'))
+
+class SessionBackend(ABC):
+    """Interface for session state storage
+
+    A session is a set of named fields (whole JSON values) plus named append-only
+    lists. Writes carry only what changed in a turn, and every write bumps the
+    session version so other workers can tell their cached copy is stale.
+    """
+
+    # Whether other processes may write the same sessions (cached copies must be revalidated)
+    shared = False
+
+    @abstractmethod
+    def load(self, session_id: Hashable) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Load a session
+
+        Returns:
+            (version, {'fields': {...}, 'lists': {...}}) or None if the session does not exist
+        """
+        pass
+
+    @abstractmethod
+    def version(self, session_id: Hashable) -> Optional[int]:
+        """Return the current session version, or None if the session does not exist"""
+        pass
+
+    @abstractmethod
+    def write(self, session_id: Hashable, changes: Dict[str, Any], replace: bool = False) -> int:
+        """Apply a change set, creating the session if needed
+
+        Args:
+            session_id: Session identifier
+            changes: Change set (see `empty_changes`)
+            replace: Drop all existing state before applying the changes
+
+        Returns:
+            The new session version
+        """
+        pass
+
+    @abstractmethod
+    def touch(self, session_id: Hashable) -> None:
+        """Mark a session as active without changing its state or version"""
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: Hashable) -> None:
+        """Delete a session and all its state"""
+        pass
+
+    @abstractmethod
+    def expire(self, prefix: str, idle_seconds: int) -> List[str]:
+        """Delete sessions whose id starts with `prefix` not written or touched for `idle_seconds`
+
+        Several stores share one backend under their own key prefix; each one
+        expires only its own sessions.
+
+        Returns:
+            Ids of the deleted sessions
+        """
+        pass
+
+class InMemorySessionBackend(SessionBackend):
+    """Process-local backend holding encoded session state in a dict
+
+    Exercises the same serialization path as the shared backends, for single
+    worker deployments and tests.
+    """
+
+    shared = False
+
+    def __init__(self):
+        """Initialize the backend"""
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: Hashable) -> Optional[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            session = self._sessions.get(str(session_id))
+            if session is None:
+                return None
+            state = {
+                'fields': {name: decode_value(value) for name, value in session['fields'].items()},
+                'lists': {name: [decode_value(item) for item in items] for name, items in session['lists'].items()}
+            }
+            return session['version'], state
+
+    def version(self, session_id: Hashable) -> Optional[int]:
+        session = self._sessions.get(str(session_id))
+        return session['version'] if session else None
+
+    def write(self, session_id: Hashable, changes: Dict[str, Any], replace: bool = False) -> int:
+        key = str(session_id)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or replace:
+                session = {'version': session['version'] if session else 0, 'fields': {}, 'lists': {}, 'updated_at': 0.0}
+                self._sessions[key] = session
+
+            for name, value in changes.get('fields', {}).items():
+                session['fields'][name] = encode_value(value)
+            for name in changes.get('removed', []):
+                session['fields'].pop(name, None)
+            for name, items in changes.get('appends', {}).items():
+                session['lists'].setdefault(name, []).extend(encode_value(item) for item in items)
+            for name, keep in changes.get('trims', {}).items():
+                items = session['lists'].get(name)
+                if items is not None and len(items) > keep:
+                    session['lists'][name] = items[-keep:] if keep else []
+
+            session['version'] += 1
+            session['updated_at'] = time.time()
+            return session['version']
+
+    def touch(self, session_id: Hashable) -> None:
+        session = self._sessions.get(str(session_id))
+        if session is not None:
+            session['updated_at'] = time.time()
+
+    def delete(self, session_id: Hashable) -> None:
+        with self._lock:
+            self._sessions.pop(str(session_id), None)
+
+    def expire(self, prefix: str, idle_seconds: int) -> List[str]:
+        cutoff = time.time() - idle_seconds
+        with self._lock:
+            expired = [key for key, session in self._sessions.items()
+                       if key.startswith(prefix) and session['updated_at'] < cutoff]
+            for key in expired:
+                del self._sessions[key]
+        return expired
+
+class SQLiteSessionBackend(SessionBackend):
+    """Shared backend on a local SQLite database in WAL mode
+
+    WAL lets every uvicorn worker on the host read concurrently while one writes,
+    so any worker can serve any session. Fields and list items are separate rows,
+    so a chat turn only rewrites the fields it changed and appends its messages.
+    """
+
+    shared = True
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        " session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS session_fields ("
+        " session_id TEXT NOT NULL, name TEXT NOT NULL, value BLOB NOT NULL,"
+        " PRIMARY KEY (session_id, name))",
+        "CREATE TABLE IF NOT EXISTS session_lists ("
+        " session_id TEXT NOT NULL, name TEXT NOT NULL, seq INTEGER NOT NULL, value BLOB NOT NULL,"
+        " PRIMARY KEY (session_id, name, seq))",
+    )
+
+    def __init__(self, db_path: str):
+        """Initialize the backend
+
+        Args:
+            db_path: Path of the SQLite database file shared by all workers
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        logger.info(f"SQLite session backend ready at {db_path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: Hashable) -> Optional[Tuple[int, Dict[str, Any]]]:
+        key = str(session_id)
+        conn = self._connection()
+        row = conn.execute("SELECT version FROM sessions WHERE session_id = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        fields = {
+            name: decode_value(value)
+            for name, value in conn.execute("SELECT name, value FROM session_fields WHERE session_id = ?", (key,))
+        }
+        lists: Dict[str, List[Any]] = {}
+        for name, value in conn.execute(
+            "SELECT name, value FROM session_lists WHERE session_id = ? ORDER BY name, seq", (key,)
+        ):
+            lists.setdefault(name, []).append(decode_value(value))
+        return row[0], {'fields': fields, 'lists': lists}
+
+    def version(self, session_id: Hashable) -> Optional[int]:
+        row = self._connection().execute(
+            "SELECT version FROM sessions WHERE session_id = ?", (str(session_id),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def write(self, session_id: Hashable, changes: Dict[str, Any], replace: bool = False) -> int:
+        key = str(session_id)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                conn.execute("DELETE FROM session_fields WHERE session_id = ?", (key,))
+                conn.execute("DELETE FROM session_lists WHERE session_id = ?", (key,))
+
+            conn.executemany(
+                "INSERT INTO session_fields (session_id, name, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id, name) DO UPDATE SET value = excluded.value",
+                [(key, name, encode_value(value)) for name, value in changes.get('fields', {}).items()]
+            )
+            conn.executemany(
+                "DELETE FROM session_fields WHERE session_id = ? AND name = ?",
+                [(key, name) for name in changes.get('removed', [])]
+            )
+            for name, items in changes.get('appends', {}).items():
+                row = conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM session_lists WHERE session_id = ? AND name = ?", (key, name)
+                ).fetchone()
+                conn.executemany(
+                    "INSERT INTO session_lists (session_id, name, seq, value) VALUES (?, ?, ?, ?)",
+                    [(key, name, row[0] + offset + 1, encode_value(item)) for offset, item in enumerate(items)]
+                )
+            for name, keep in changes.get('trims', {}).items():
+                conn.execute(
+                    "DELETE FROM session_lists WHERE session_id = ? AND name = ? AND seq <= "
+                    "(SELECT COALESCE(MAX(seq), 0) FROM session_lists WHERE session_id = ? AND name = ?) - ?",
+                    (key, name, key, name, keep)
+                )
+
+            conn.execute(
+                "INSERT INTO sessions (session_id, version, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                (key, time.time())
+            )
+            version = conn.execute("SELECT version FROM sessions WHERE session_id = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+            return version
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def touch(self, session_id: Hashable) -> None:
+        self._connection().execute(
+            "UPDATE sessions SET updated_at = ? WHERE session_id = ?", (time.time(), str(session_id))
+        )
+
+    def delete(self, session_id: Hashable) -> None:
+        key = str(session_id)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ('session_fields', 'session_lists', 'sessions'):
+                conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (key,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def expire(self, prefix: str, idle_seconds: int) -> List[str]:
+        cutoff = time.time() - idle_seconds
+        # Store names contain '_', a LIKE wildcard
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        expired = [row[0] for row in self._connection().execute(
+            "SELECT session_id FROM sessions WHERE session_id LIKE ? ESCAPE '\\' AND updated_at < ?",
+            (pattern, cutoff)
+        )]
+        for key in expired:
+            self.delete(key)
+        return expired
+
+def create_session_backend(kind: str, db_path: str) -> Optional[SessionBackend]:
+    """Create the configured session backend
+
+    Args:
+        kind: "process" (live objects only, no backend), "memory" or "sqlite"
+        db_path: Database path for the SQLite backend
+
+    Returns:
+        Backend instance, or None for plain in-process sessions
+    """
+    kind = kind.lower()
+    if kind == "process":
+        return None
+    if kind == "memory":
+        return InMemorySessionBackend()
+    if kind == "sqlite":
+        return SQLiteSessionBackend(db_path)
+    raise ValueError(f"Unknown session backend: {kind}")
+
+class SessionCodec:
+    """Translate between live session objects and backend state
+
+    Subclasses implement the conversion for one kind of session value.
+    """
+
+    def export_state(self, value: Any) -> Dict[str, Any]:
+        """Return a change set holding the full state of `value`"""
+        raise NotImplementedError
+
+    def collect_changes(self, value: Any) -> Dict[str, Any]:
+        """Return the changes made to `value` since it was last exported or collected"""
+        raise NotImplementedError
+
+    def restore(self, state: Dict[str, Any]) -> Any:
+        """Build a live session value from loaded state"""
+        raise NotImplementedError
@@ -0,0 +1,321 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+from src.models.session_backend import SessionBackend, SessionCodec, has_changes
+
+logger = logging.getLogger(__name__)
+
+def approximate_size(value: Any) -> int:
+    """Approximate the memory held by plain session data
+
+    Strings count their encoded payload, containers are walked recursively and
+    anything else is charged its shallow `sys.getsizeof`. This is an accounting
+    estimate for eviction decisions, not an exact heap measurement.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approximate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+class SessionStore:
+    """Bounded session map with idle timeout, LRU eviction and memory accounting
+
+    Behaves like the dict it replaces (`in`, `[]`, `del`, `get`), but:
+    - sessions idle for longer than `ttl_seconds` expire
+    - at most `max_sessions` sessions are kept, evicting the least recently used
+    - the estimated memory of all sessions is kept under `max_bytes`
+
+    Expiry is applied lazily on access and periodically by `run_sweeper`.
+
+    With a `backend`, the store becomes a cache of live objects in front of the
+    backend: values are written through on `__setitem__`, each turn's changes are
+    written by `commit`, and a cached value is reloaded when the backend version
+    shows another worker changed it. Capacity eviction then only drops the local
+    copy; sessions end when the backend expires them.
+
+    `on_evict` runs when a session ends. `on_release` runs whenever this worker
+    drops its live copy for any reason (session ended, idle, capacity, deleted by
+    another worker), for resources that belong to the copy rather than the session.
+    """
+
+    BACKEND_TOUCH_INTERVAL = 60  # seconds between activity updates sent to the backend
+
+    def __init__(self, name: str, max_sessions: int, ttl_seconds: int,
+                 max_bytes: Optional[int] = None,
+                 size_of: Callable[[Any], int] = approximate_size,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+                 on_release: Optional[Callable[[Hashable, Any], None]] = None,
+                 backend: Optional[SessionBackend] = None,
+                 codec: Optional[SessionCodec] = None):
+        """Initialize the store
+
+        Args:
+            name: Store name used in log messages
+            max_sessions: Maximum number of live sessions
+            ttl_seconds: Idle time after which a session expires
+            max_bytes: Optional memory budget for all sessions together
+            size_of: Function estimating the memory of one session value
+            on_evict: Optional callback invoked with (session_id, value) when a session is evicted or
+                expires; value is None for a backend session this worker had not cached
+            on_release: Optional callback invoked with (session_id, value) whenever the live copy is dropped
+            backend: Optional session backend holding the authoritative state
+            codec: Converter between live values and backend state (required with a backend)
+        """
+        if backend is not None and codec is None:
+            raise ValueError("A session codec is required when using a session backend")
+        self.name = name
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.on_evict = on_evict
+        self.on_release = on_release
+        self.backend = backend
+        self.codec = codec
+        self._sessions: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._last_access: Dict[Hashable, float] = {}
+        self._sizes: Dict[Hashable, int] = {}
+        self._versions: Dict[Hashable, int] = {}  # backend version of each cached value
+        self._backend_touched: Dict[Hashable, float] = {}
+        self._ids: Dict[str, Hashable] = {}  # str(session_id) -> session_id, to match backend keys
+        self._lock = threading.RLock()
+
+    def __contains__(self, session_id: Hashable) -> bool:
+        with self._lock:
+            if session_id in self._sessions and self._is_expired(session_id, time.monotonic()):
+                if self.backend is None:
+                    self._evict(session_id, "expired")
+                    return False
+                # Another worker may still be using it; the backend decides when it ends
+                self._drop_cached(session_id, "idle")
+            if self.backend is not None:
+                return self._sync(session_id)
+            return session_id in self._sessions
+
+    def __getitem__(self, session_id: Hashable) -> Any:
+        with self._lock:
+            if session_id not in self:
+                raise KeyError(session_id)
+            if self.backend is not None:
+                now = time.monotonic()
+                if now - self._backend_touched.get(session_id, 0.0) > self.BACKEND_TOUCH_INTERVAL:
+                    self.backend.touch(self._backend_key(session_id))
+                    self._backend_touched[session_id] = now
+            self._touch(session_id)
+            return self._sessions[session_id]
+
+    def __setitem__(self, session_id: Hashable, value: Any) -> None:
+        with self._lock:
+            if self.backend is not None:
+                self._versions[session_id] = self.backend.write(
+                    self._backend_key(session_id), self.codec.export_state(value), replace=True
+                )
+            self._sessions[session_id] = value
+            self._touch(session_id)
+            self._sizes[session_id] = self._measure(value)
+            self._enforce_limits(keep=session_id)
+
+    def __delitem__(self, session_id: Hashable) -> None:
+        with self._lock:
+            if session_id not in self:
+                raise KeyError(session_id)
+            self._remove(session_id)
+            if self.backend is not None:
+                self.backend.delete(self._backend_key(session_id))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._sessions))
+
+    def get(self, session_id: Hashable, default: Any = None) -> Any:
+        """Return a session value, or `default` if missing or expired"""
+        try:
+            return self[session_id]
+        except KeyError:
+            return default
+
+    def discard(self, session_id: Hashable) -> None:
+        """Remove a session if present, without invoking the eviction callback"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id)
+            if self.backend is not None:
+                self.backend.delete(self._backend_key(session_id))
+
+    def commit(self, session_id: Hashable) -> None:
+        """Persist the changes made to a session during this request and re-measure it"""
+        with self._lock:
+            if session_id not in self._sessions:
+                return
+            if self.backend is not None:
+                changes = self.codec.collect_changes(self._sessions[session_id])
+                if has_changes(changes):
+                    expected = self._versions.get(session_id, 0) + 1
+                    version = self.backend.write(self._backend_key(session_id), changes)
+                    # If another worker wrote in between, reload on next access instead of trusting this copy
+                    self._versions[session_id] = version if version == expected else -1
+            self.update_size(session_id)
+
+    def update_size(self, session_id: Hashable) -> None:
+        """Re-measure a session after it was mutated in place, enforcing the memory budget"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._sizes[session_id] = self._measure(self._sessions[session_id])
+                self._enforce_limits(keep=session_id)
+
+    def memory_usage(self) -> int:
+        """Estimated bytes held by all sessions (as of the last measurement)"""
+        return sum(self._sizes.values())
+
+    def stats(self) -> Dict[str, int]:
+        """Return store statistics"""
+        return {"sessions": len(self._sessions), "memory_bytes": self.memory_usage()}
+
+    def sweep(self) -> int:
+        """Expire idle sessions, re-measure the rest and enforce limits
+
+        Returns:
+            Number of sessions removed
+        """
+        removed = 0
+        with self._lock:
+            now = time.monotonic()
+            if self.backend is not None:
+                prefix = self._backend_key('')
+                for key in self.backend.expire(prefix, self.ttl_seconds):
+                    local_id = self._ids.get(key[len(prefix):])
+                    if local_id is not None:
+                        self._evict(local_id, "expired")
+                    else:
+                        # Not cached here: the session still ends, with no live value to pass
+                        self._ended(key[len(prefix):], None)
+                    removed += 1
+            for session_id in list(self._sessions):
+                if self._is_expired(session_id, now):
+                    if self.backend is None:
+                        self._evict(session_id, "expired")
+                    else:
+                        self._drop_cached(session_id, "idle")
+                    removed += 1
+            for session_id, value in self._sessions.items():
+                self._sizes[session_id] = self._measure(value)
+            removed += self._enforce_limits()
+        if removed:
+            logger.info(f"{self.name}: swept {removed} sessions, {len(self._sessions)} live, ~{self.memory_usage() / (1024 * 1024):.1f}MB")
+        return removed
+
+    async def run_sweeper(self, interval_seconds: int) -> None:
+        """Background task that sweeps the store every `interval_seconds`"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"{self.name}: session sweep failed: {e}")
+
+    def _backend_key(self, session_id: Hashable) -> str:
+        """Namespace session ids per store so several stores can share one backend"""
+        return f"{self.name}:{session_id}"
+
+    def _sync(self, session_id: Hashable) -> bool:
+        """Make the cached value match the backend, loading or dropping it as needed"""
+        cached = session_id in self._sessions
+        if cached and not self.backend.shared and self._versions.get(session_id, -1) >= 0:
+            return True
+
+        key = self._backend_key(session_id)
+        version = self.backend.version(key)
+        if version is None:
+            if cached:
+                self._drop_cached(session_id, "deleted")
+            return False
+        if cached and version == self._versions.get(session_id):
+            return True
+
+        loaded = self.backend.load(key)
+        if loaded is None:
+            return False
+        version, state = loaded
+        self._sessions[session_id] = self.codec.restore(state)
+        self._versions[session_id] = version
+        self._touch(session_id)
+        self._sizes[session_id] = self._measure(self._sessions[session_id])
+        self._enforce_limits(keep=session_id)
+        return True
+
+    def _touch(self, session_id: Hashable) -> None:
+        self._ids[str(session_id)] = session_id
+        self._sessions.move_to_end(session_id)
+        self._last_access[session_id] = time.monotonic()
+
+    def _is_expired(self, session_id: Hashable, now: float) -> bool:
+        return now - self._last_access.get(session_id, now) > self.ttl_seconds
+
+    def _measure(self, value: Any) -> int:
+        try:
+            return self.size_of(value)
+        except Exception as e:
+            logger.warning(f"{self.name}: could not measure session size: {e}")
+            return 0
+
+    def _enforce_limits(self, keep: Optional[Hashable] = None) -> int:
+        """Evict least recently used sessions until count and memory fit (never `keep`)"""
+        removed = 0
+        candidates: List[Hashable] = [sid for sid in self._sessions if sid != keep]
+        while candidates and (
+            len(self._sessions) > self.max_sessions
+            or (self.max_bytes is not None and self.memory_usage() > self.max_bytes)
+        ):
+            self._evict(candidates.pop(0), "capacity")
+            removed += 1
+        return removed
+
+    def _remove(self, session_id: Hashable) -> Any:
+        self._last_access.pop(session_id, None)
+        self._sizes.pop(session_id, None)
+        self._versions.pop(session_id, None)
+        self._backend_touched.pop(session_id, None)
+        self._ids.pop(str(session_id), None)
+        return self._sessions.pop(session_id)
+
+    def _release(self, session_id: Hashable, value: Any) -> None:
+        if self.on_release:
+            try:
+                self.on_release(session_id, value)
+            except Exception as e:
+                logger.warning(f"{self.name}: release callback failed for {session_id}: {e}")
+
+    def _drop_cached(self, session_id: Hashable, reason: str) -> None:
+        """Drop this worker's copy of a session that may live on in the backend"""
+        value = self._remove(session_id)
+        logger.info(f"{self.name}: dropped cached session {session_id} ({reason})")
+        self._release(session_id, value)
+
+    def _evict(self, session_id: Hashable, reason: str) -> None:
+        if self.backend is not None and reason == "capacity":
+            # Only the cached copy is dropped; the session lives on in the backend
+            self._drop_cached(session_id, reason)
+            return
+        value = self._remove(session_id)
+        logger.info(f"{self.name}: evicted session {session_id} ({reason})")
+        self._release(session_id, value)
+        self._ended(session_id, value)
+
+    def _ended(self, session_id: Hashable, value: Any) -> None:
+        if self.on_evict:
+            try:
+                self.on_evict(session_id, value)
+            except Exception as e:
+                logger.warning(f"{self.name}: eviction callback failed for {session_id}: {e}")
@@ -0,0 +1,134 @@
+import logging
+from datetime import date, datetime, time
+from typing import Any, BinaryIO, Dict, Iterator, List, Sequence, Tuple
+
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+from src.models.entity_processor import EntityProcessor
+
+logger = logging.getLogger(__name__)
+
+class SpreadsheetScanner:
+    """Entity detection over spreadsheet cells, column by column
+
+    Rows are streamed from a read-only workbook in blocks of `block_rows`.
+    Within a block, the cells of each column are analyzed together. Each cell
+    is a separate input, so no context leaks between neighbouring cells. Text
+    columns go through the model in batches, and a value repeated down a
+    column is predicted once.
+
+    Columns whose values in the block are all numbers or dates skip the model.
+    Their cells only go through the model's rule-based detection (patterns and
+    validators), which still catches IDs, card numbers and phone numbers
+    stored as numbers.
+
+    The first row of each sheet is the header. Entities are reported with a
+    'cell' holding the sheet, the data row (1 for the row below the header),
+    the column name and the column index.
+    """
+
+    TYPED_VALUES = (int, float, datetime, date, time)
+
+    def __init__(self, model, batch_size: int, block_rows: int = 500):
+        """Initialize the scanner
+
+        Args:
+            model: Model implementing `predict_batch` and `detect_patterns`
+            batch_size: Cell values per model forward pass
+            block_rows: Rows read before their columns are analyzed
+        """
+        self.model = model
+        self.batch_size = max(batch_size, 1)
+        self.block_rows = max(block_rows, 1)
+        self.entity_processor = EntityProcessor()
+        self.stats = {'sheets': 0, 'rows': 0, 'cells': 0, 'model_cells': 0, 'pattern_cells': 0}
+
+    def _cell_text(self, value: Any) -> str:
+        if isinstance(value, float) and value.is_integer():
+            # IDs and phone numbers typed into Excel come back as floats
+            return str(int(value))
+        if isinstance(value, (datetime, date, time)):
+            return value.isoformat()
+        return str(value)
+
+    def _column_names(self, header: Sequence[Any], width: int) -> List[str]:
+        names = []
+        for index in range(width):
+            value = header[index] if index < len(header) else None
+            name = self._cell_text(value).strip() if value is not None else ''
+            names.append(name or get_column_letter(index + 1))
+        return names
+
+    def _scan_column(self, values: List[Any]) -> List[List[Tuple[str, str, int, int]]]:
+        """Entities per cell value, predicting each distinct value once"""
+        texts = [self._cell_text(value) for value in values]
+        unique = list(dict.fromkeys(texts))
+        if all(isinstance(value, self.TYPED_VALUES) for value in values):
+            predictions = [self.model.detect_patterns(text) for text in unique]
+            self.stats['pattern_cells'] += len(values)
+        else:
+            predictions = self.model.predict_batch(unique, self.batch_size)
+            self.stats['model_cells'] += len(values)
+
+        found = {}
+        for text, entities in zip(unique, predictions):
+            entities = [tuple(entity[:4]) for entity in entities or [] if len(entity) >= 4]
+            found[text] = self.entity_processor.split_combined_entities(text, entities)
+        return [found[text] for text in texts]
+
+    def _scan_block(self, sheet: str, header: Sequence[Any], rows: List[Sequence[Any]],
+                    first_row: int) -> List[Dict[str, Any]]:
+        width = max(len(row) for row in rows)
+        columns = self._column_names(header, width)
+        entities = []
+        for column in range(width):
+            cells = [
+                (first_row + offset, row[column]) for offset, row in enumerate(rows)
+                if column < len(row) and row[column] is not None
+                and not (isinstance(row[column], str) and not row[column].strip())
+            ]
+            if not cells:
+                continue
+            self.stats['cells'] += len(cells)
+            per_cell = self._scan_column([value for _, value in cells])
+            for (row, _), cell_entities in zip(cells, per_cell):
+                for entity_text, entity_type, start, end in cell_entities:
+                    entities.append({
+                        'text': entity_text,
+                        'entity_type': entity_type,
+                        'start': start,
+                        'end': end,
+                        'cell': {'sheet': sheet, 'row': row, 'column': columns[column], 'column_index': column}
+                    })
+        entities.sort(key=lambda e: (e['cell']['row'], e['cell']['column_index'], e['start']))
+        return entities
+
+    def scan(self, source: BinaryIO) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Detect entities in the cells of a workbook as its rows are read
+
+        Yields:
+            (sheet name, entity dicts) per block of rows, in sheet and row order
+        """
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                self.stats['sheets'] += 1
+                rows = worksheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+                block: List[Sequence[Any]] = []
+                first_row = 1
+                for row in rows:
+                    block.append(row)
+                    if len(block) >= self.block_rows:
+                        yield worksheet.title, self._scan_block(worksheet.title, header, block, first_row)
+                        first_row += len(block)
+                        block = []
+                if block:
+                    yield worksheet.title, self._scan_block(worksheet.title, header, block, first_row)
+                    first_row += len(block)
+                self.stats['rows'] += first_row - 1
+        finally:
+            workbook.close()
@@ -0,0 +1,71 @@
+import logging
+from typing import Iterable, Iterator, List, Tuple
+
+from src.models.entity_processor import EntityProcessor
+
+logger = logging.getLogger(__name__)
+
+class StreamingDetector:
+    """Entity detection over a stream of text segments
+
+    Segments are grouped into windows of roughly `window_chars` characters (a
+    window never splits a segment), and windows are sent to the model in
+    batches. Entities are reported per window with offsets into the whole
+    streamed text, i.e. the segments joined with `separator`. Only the current
+    batch of windows is held in memory.
+    """
+
+    def __init__(self, model, window_chars: int, batch_size: int, separator: str = '\n'):
+        """Initialize the detector
+
+        Args:
+            model: Model implementing `predict_batch`
+            window_chars: Target number of characters per window
+            batch_size: Windows per model call
+            separator: String the segments are joined with
+        """
+        self.model = model
+        self.window_chars = window_chars
+        self.batch_size = max(batch_size, 1)
+        self.separator = separator
+        self.entity_processor = EntityProcessor()
+
+    def _windows(self, segments: Iterable[str]) -> Iterator[str]:
+        window: List[str] = []
+        size = 0
+        for segment in segments:
+            window.append(segment)
+            size += len(segment) + len(self.separator)
+            if size >= self.window_chars:
+                yield self.separator.join(window)
+                window, size = [], 0
+        if window:
+            yield self.separator.join(window)
+
+    def _detect_batch(self, offset: int, batch: List[str]) -> Iterator[Tuple[int, str, List[Tuple[str, str, int, int]]]]:
+        predictions = self.model.predict_batch(batch)
+        for window, entities in zip(batch, predictions):
+            entities = [tuple(entity[:4]) for entity in entities or [] if len(entity) >= 4]
+            entities = self.entity_processor.split_combined_entities(window, entities)
+            yield offset, window, [(text, entity_type, start + offset, end + offset)
+                                   for text, entity_type, start, end in entities]
+            offset += len(window) + len(self.separator)
+
+    def detect(self, segments: Iterable[str]) -> Iterator[Tuple[int, str, List[Tuple[str, str, int, int]]]]:
+        """Detect entities in `segments` as they arrive
+
+        Yields:
+            (window offset, window text, entities) per window, in order; entity
+            offsets are global
+        """
+        offset = 0
+        batch: List[str] = []
+        for window in self._windows(segments):
+            batch.append(window)
+            if len(batch) >= self.batch_size:
+                for item in self._detect_batch(offset, batch):
+                    offset = item[0] + len(item[1]) + len(self.separator)
+                    yield item
+                batch = []
+        if batch:
+            yield from self._detect_batch(offset, batch)
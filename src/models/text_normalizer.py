@@ -0,0 +1,169 @@
+import re
+import sys
+from array import array
+from functools import lru_cache
+from typing import Optional, Pattern, Tuple
+
+# One-to-one substitutions (applied with str.translate, offsets unchanged)
+ARABIC_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+ALEF_VARIANTS = str.maketrans('آأإٱٲٳ', 'اااااا')
+TATWEEL = 'ـ'
+
+def _char_ranges(first: int, last: int, extra: str = '', spaces: bool = False) -> str:
+    """Regex character class of the non-printable characters in [first, last]
+
+    Whitespace is left out of the class unless `spaces` is set.
+    """
+    ranges = []
+    start = None
+    for code in range(first, last + 2):
+        char = chr(code) if code <= last else ''
+        dropped = bool(char) and not char.isprintable() and (spaces or not char.isspace())
+        if dropped and start is None:
+            start = code
+        elif not dropped and start is not None:
+            ranges.append(re.escape(chr(start)) + ('-' + re.escape(chr(code - 1)) if code - 1 > start else ''))
+            start = None
+    return '[' + ''.join(ranges) + extra + ']'
+
+@lru_cache(maxsize=None)
+def _run_pattern(fold_arabic: bool, astral: bool) -> Pattern:
+    """Runs of whitespace and dropped characters that need rewriting
+
+    A run starts at a line break, tab or other non-blank space, a dropped
+    character or two blanks; single blanks between words are left alone.
+    Characters above the BMP are only included for texts that contain some:
+    a class holding them is matched by scanning its ranges rather than by a
+    bitmap lookup.
+    """
+    dropped = _char_ranges(0, 0xFFFF, TATWEEL if fold_arabic else '')[1:-1]
+    if astral:
+        dropped += _char_ranges(0x10000, sys.maxunicode)[1:-1]
+    return re.compile('(?:[^\\S ]|[' + dropped + ']|  )[\\s' + dropped + ']*')
+
+@lru_cache(maxsize=None)
+def _unprintable_pattern(fold_arabic: bool, astral: bool) -> Pattern:
+    """Characters removed by `TextNormalizer.clean`: everything non-printable except line breaks"""
+    dropped = (_char_ranges(0, 0x9, spaces=True)[1:-1]
+               + _char_ranges(0xB, 0xFFFF, TATWEEL if fold_arabic else '', spaces=True)[1:-1])
+    if astral:
+        dropped += _char_ranges(0x10000, sys.maxunicode)[1:-1]
+    return re.compile('[' + dropped + ']+')
+
+BLANK_LINES = re.compile(r'\n\s*\n\s*\n+')
+BLANKS = re.compile(r'[ \t]+')
+
+@lru_cache(maxsize=4096)
+def _replacement(run: str) -> str:
+    """Three or more line breaks become a blank line, fewer are kept, other whitespace becomes one space"""
+    breaks = run.count('\n') + run.count('\r') - run.count('\r\n')
+    if breaks >= 3:
+        return '\n\n'
+    if breaks:
+        return '\n' * breaks
+    return ' ' if any(char.isspace() for char in run) else ''
+
+class NormalizedText:
+    """Normalized text plus the map from its offsets back to the original text"""
+
+    __slots__ = ('text', 'origins', 'original_length')
+
+    def __init__(self, text: str, origins: Optional[array], original_length: int):
+        """Initialize the result
+
+        Args:
+            text: Normalized text
+            origins: Original offset of each normalized character (int32), or
+                None when offsets are unchanged
+            original_length: Length of the original text
+        """
+        self.text = text
+        self.origins = origins
+        self.original_length = original_length
+
+    def to_original(self, start: int, end: int) -> Tuple[int, int]:
+        """Map a [start, end) span of the normalized text to the original text"""
+        if self.origins is None:
+            return start, end
+        if end <= start:
+            position = self.origins[start] if start < len(self.origins) else self.original_length
+            return position, position
+        return self.origins[start], self.origins[end - 1] + 1
+
+class TextNormalizer:
+    """Normalization of extracted and user text
+
+    `normalize` prepares text for detection. Line endings become '\\n', three or more line breaks become one blank
+    line (blanks around line breaks are dropped), runs of spaces, tabs and
+    other Unicode spaces become one space, control and format characters are
+    dropped and the result is stripped. With `fold_arabic`, Arabic-Indic digits become ASCII digits,
+    alef variants become bare alef and tatweel is dropped, so detection sees
+    one spelling of each.
+
+    Substitutions that keep the length use str.translate; everything else is
+    one scan with a compiled regex. Each normalized character's original offset is
+    recorded in an int32 array, so spans found in the normalized text can be
+    reported in original coordinates.
+
+    `clean` keeps the rules extracted documents have always been cleaned with:
+    three or more line breaks (with any whitespace between them) become one
+    blank line, runs of spaces and tabs become one space, other non-printable
+    characters are removed and the result is stripped. The one change is that
+    a lone '\\r' is a line break rather than being removed.
+    """
+
+    def __init__(self, fold_arabic: bool = False):
+        """Initialize the normalizer
+
+        Args:
+            fold_arabic: Also fold Arabic digits, alef variants and tatweel
+        """
+        self.fold_arabic = fold_arabic
+        self._table = {**ARABIC_DIGITS, **ALEF_VARIANTS} if fold_arabic else None
+
+    def _runs(self, text: str) -> Pattern:
+        return _run_pattern(self.fold_arabic, bool(text) and max(text) > '\uffff')
+
+    def normalize(self, text: str) -> NormalizedText:
+        """Normalize `text`, keeping the offset map"""
+        folded = text.translate(self._table) if self._table else text
+        pieces = []
+        origins = None
+        position = 0
+        for match in self._runs(folded).finditer(folded):
+            run = match.group()
+            replacement = _replacement(run)
+            if replacement == run:
+                continue
+            if origins is None:
+                origins = array('i')
+            start, end = match.span()
+            pieces.append(folded[position:start])
+            origins.extend(range(position, start))
+            pieces.append(replacement)
+            origins.extend([start] * len(replacement))
+            position = end
+
+        if origins is None:
+            normalized = folded
+        else:
+            pieces.append(folded[position:])
+            origins.extend(range(position, len(folded)))
+            normalized = ''.join(pieces)
+
+        stripped = normalized.strip()
+        if len(stripped) != len(normalized):
+            leading = len(normalized) - len(normalized.lstrip())
+            if origins is None:
+                origins = array('i', range(len(normalized)))
+            origins = origins[leading:leading + len(stripped)]
+        return NormalizedText(stripped, origins, len(text))
+
+    def clean(self, text: str) -> str:
+        """Cleaned extracted text (no offset map)"""
+        folded = text.translate(self._table) if self._table else text
+        folded = folded.replace('\r\n', '\n').replace('\r', '\n')
+        folded = BLANK_LINES.sub('\n\n', folded)
+        folded = BLANKS.sub(' ', folded)
+        astral = bool(folded) and max(folded) > '\uffff'
+        return _unprintable_pattern(self.fold_arabic, astral).sub('', folded).strip()
@@ -0,0 +1,133 @@
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+from typing import BinaryIO, Optional
+
+logger = logging.getLogger(__name__)
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the allowed size while it is being read"""
+    pass
+
+class SpooledUpload:
+    """Content of an uploaded file, kept in memory when small and in a temp file otherwise
+
+    Holds only the bytes or the temp file path plus metadata, so it can be
+    pickled and handed to extraction processes (a spooled file travels as its
+    path). Readers get their own file object from `open`.
+    """
+
+    def __init__(self, filename: str, size: int, md5: str, data: Optional[bytes] = None,
+                 path: Optional[str] = None):
+        """Initialize the upload
+
+        Args:
+            filename: Client file name
+            size: Content size in bytes
+            md5: Hex MD5 digest of the content
+            data: Content, when held in memory
+            path: Temp file holding the content, when spooled to disk
+        """
+        self.filename = filename
+        self.size = size
+        self.md5 = md5
+        self.data = data
+        self.path = path
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    def open(self) -> BinaryIO:
+        """A new binary file object positioned at the start of the content"""
+        if self.path is None:
+            return io.BytesIO(self.data)
+        return open(self.path, 'rb')
+
+    def read(self) -> bytes:
+        """The whole content as bytes"""
+        if self.path is None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def move_to(self, destination: str) -> None:
+        """Persist the content at `destination`, taking over the temp file if there is one"""
+        if self.path is None:
+            with open(destination, 'wb') as f:
+                f.write(self.data)
+        else:
+            shutil.move(self.path, destination)
+        # The destination now owns the content; close() must not delete it
+        self.path = None
+        self.data = None
+
+    def close(self) -> None:
+        """Release the content and delete the temp file"""
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self.path = None
+        self.data = None
+
+async def spool_upload(upload, max_size: int, threshold: int, chunk_size: int = 64 * 1024,
+                       suffix: str = '') -> SpooledUpload:
+    """Read an upload in chunks, enforcing `max_size` and hashing as it streams
+
+    Content stays in memory up to `threshold` bytes and is spooled to a temp
+    file beyond that; reading stops as soon as the size limit is crossed.
+
+    Args:
+        upload: Uploaded file (FastAPI UploadFile)
+        max_size: Maximum accepted size in bytes
+        threshold: Size above which the content is written to a temp file
+        chunk_size: Bytes read per chunk
+        suffix: Temp file name suffix
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than `max_size`
+    """
+    limit_message = f"File too large. Maximum size: {max_size / (1024 * 1024):.1f}MB"
+    if getattr(upload, 'size', None) is not None and upload.size > max_size:
+        raise UploadTooLargeError(limit_message)
+
+    digest = hashlib.md5()
+    buffer = bytearray()
+    temp_file = None
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(limit_message)
+            digest.update(chunk)
+            if temp_file is None and size > threshold:
+                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+                temp_file.write(buffer)
+                buffer = bytearray()
+            if temp_file is not None:
+                temp_file.write(chunk)
+            else:
+                buffer.extend(chunk)
+    except BaseException:
+        if temp_file is not None:
+            temp_file.close()
+            os.remove(temp_file.name)
+        raise
+
+    if temp_file is not None:
+        temp_file.close()
+        logger.info(f"Spooled upload {upload.filename} ({size} bytes) to {temp_file.name}")
+        return SpooledUpload(upload.filename, size, digest.hexdigest(), path=temp_file.name)
+    return SpooledUpload(upload.filename, size, digest.hexdigest(), data=bytes(buffer))
@@ -14,6 +14,10 @@ class PIIShieldApp {
             analysisHistory: []
         };
         
+        // Inputs of this many characters are analyzed with /api/extract/stream
+        // and rendered as the highlighted HTML arrives
+        this.streamingThreshold = 20000;
+        
         this.entityConfig = {
             'PER': { color: '#667eea', emoji: '👤', name: 'Person', description: 'Personal names and identities' },
             'LOC': { color: '#764ba2', emoji: '📍', name: 'Location', description: 'Addresses and geographic locations' },
@@ -173,6 +177,24 @@ class PIIShieldApp {
         try {
             const modelVersion = this.elements['model-selector']?.value || 'v2';
             
+            if (text.length >= this.streamingThreshold) {
+                // Rendered and added to the entity dictionary while streaming
+                const data = await this.streamExtract(text, modelVersion);
+                
+                this.state.lastAnalysis = {
+                    timestamp: Date.now(),
+                    model: modelVersion,
+                    results: data,
+                    textLength: text.length
+                };
+                
+                this.updateEntityStats(data.entity_counts);
+                this.updateTotalCounter(data.entity_counts);
+                this.addToHistory(this.state.lastAnalysis);
+                this.showSuccessFeedback();
+                return;
+            }
+            
             const response = await fetch('/api/extract', {
                 method: 'POST',
                 headers: {
@@ -181,7 +203,8 @@ class PIIShieldApp {
                 },
                 body: JSON.stringify({
                     text: text,
-                    model_version: modelVersion
+                    model_version: modelVersion,
+                    render: false
                 })
             });
             
@@ -190,7 +213,8 @@ class PIIShieldApp {
                 throw new Error(`HTTP ${response.status}: ${errorText}`);
             }
             
-            const data = await response.json();
+            // Entities come back as columns; highlights are rendered here
+            const data = this.renderEntityColumns(text, await response.json());
             
             // Store analysis
             this.state.lastAnalysis = {
@@ -225,6 +249,143 @@ class PIIShieldApp {
         }
     }
     
+    renderEntityColumns(text, columns) {
+        // Build the response /api/extract gives with render enabled from its
+        // columnar form: entity list plus the same highlighted HTML
+        const entities = columns.starts.map((start, index) => {
+            const end = columns.ends[index];
+            return {
+                text: text.slice(start, end),
+                entity_type: columns.types[columns.type_ids[index]].name,
+                start: start,
+                end: end
+            };
+        });
+        const styles = columns.types.map(type => type.color);
+        const textColors = columns.types.map(type => type.text_color);
+        
+        // Nearby IDs of the same type are highlighted as one span, without spaces
+        const groups = [];
+        const order = columns.starts.map((_, index) => index).sort((a, b) => columns.starts[a] - columns.starts[b]);
+        order.forEach(index => {
+            const entity = entities[index];
+            const isId = entity.entity_type === 'PASSPORT-ID' || entity.entity_type === 'CIVIL-ID';
+            const last = groups[groups.length - 1];
+            if (isId && last && last.isId && last.type === entity.entity_type && entity.start - last.end <= 5) {
+                last.end = entity.end;
+                last.joined = true;
+            } else {
+                groups.push({ type: entity.entity_type, typeId: columns.type_ids[index], start: entity.start, end: entity.end, isId: isId, joined: false });
+            }
+        });
+        
+        const parts = [];
+        let position = 0;
+        groups.forEach(group => {
+            if (group.start < position) return;
+            let display = text.slice(group.start, group.end);
+            if (group.joined) {
+                display = display.replace(/ /g, '');
+            }
+            parts.push(text.slice(position, group.start));
+            parts.push(`<span class="entity-highlight" style="background-color: ${styles[group.typeId]}; color: ${textColors[group.typeId]};">${display}</span>`);
+            position = group.end;
+        });
+        parts.push(text.slice(position));
+        
+        return {
+            highlighted_text: parts.join(''),
+            entities: entities,
+            entity_counts: columns.entity_counts
+        };
+    }
+    
+    async streamExtract(text, modelVersion) {
+        // Append each window's highlighted HTML as soon as the server sends it
+        const response = await fetch('/api/extract/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Requested-With': 'XMLHttpRequest'
+            },
+            body: JSON.stringify({
+                text: text,
+                model_version: modelVersion
+            })
+        });
+        
+        if (!response.ok) {
+            const errorText = await response.text();
+            throw new Error(`HTTP ${response.status}: ${errorText}`);
+        }
+        
+        const container = this.elements['result-text'];
+        const arabicRegex = /[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]/;
+        const hasArabic = arabicRegex.test(text);
+        const textDirection = hasArabic ? 'rtl' : 'ltr';
+        const textAlign = hasArabic ? 'right' : 'left';
+        container.innerHTML = `<div class="results-text" style="direction: ${textDirection}; text-align: ${textAlign}; unicode-bidi: plaintext;"></div>`;
+        const output = container.firstElementChild;
+        
+        const privacyMode = document.getElementById('privacy-mode');
+        const entities = [];
+        let entityCounts = null;
+        
+        // Fresh dictionary for this analysis, filled window by window in text order
+        this.entityDictionary.clearMappings();
+        
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const message = JSON.parse(line);
+            if (message.event === 'error') {
+                throw new Error(message.error);
+            }
+            if (message.event === 'done') {
+                entityCounts = message.entity_counts;
+                return;
+            }
+            
+            message.entities.forEach(entity => {
+                this.entityDictionary.generateMaskedEntity(entity.text, entity.entity_type);
+                entities.push(entity);
+            });
+            
+            let html = message.html;
+            if (privacyMode && privacyMode.checked) {
+                html = this.applyEntityDictionaryReplacement(html, message.entities);
+            }
+            output.insertAdjacentHTML('beforeend', html);
+        };
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffered + decoder.decode());
+        
+        if (entityCounts === null) {
+            throw new Error('Analysis stream ended unexpectedly');
+        }
+        
+        this.entityDictionary.updateDictionaryDisplay();
+        this.entityDictionary.persistMappings();
+        
+        if (entities.length === 0) {
+            this.updateResults({ highlighted_text: '' });
+        } else {
+            this.attachEntityClickHandlers(entities);
+        }
+        
+        return { entities: entities, entity_counts: entityCounts };
+    }
+    
     handleClear() {
         // Clear input
         if (this.elements['input-text']) {
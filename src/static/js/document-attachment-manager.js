@@ -7,6 +7,7 @@ class DocumentAttachmentManager {
     constructor(privacyChat) {
         this.privacyChat = privacyChat;
         this.attachedDocuments = []; // Store multiple attached documents
+        this.pageSize = 50000; // Characters per document page request
         this.init();
     }
     
@@ -165,7 +166,7 @@ class DocumentAttachmentManager {
                 if (bar) bar.style.width = '50%';
             });
             
-            const response = await fetch(`/api/document/upload?session_id=${this.privacyChat.currentSession || 1}`, {
+            const response = await fetch(`/api/document/upload?session_id=${this.privacyChat.currentSession || 1}&background=true`, {
                 method: 'POST',
                 body: formData
             });
@@ -178,8 +179,20 @@ class DocumentAttachmentManager {
                 throw new Error(`Upload failed: ${response.status} ${response.statusText}`);
             }
             
-            const result = await response.json();
-            // console.log('Upload result:', result);
+            const queued = await response.json();
+            // console.log('Upload result:', queued);
+            
+            // Processing runs as a background job; follow its extract -> detect -> mask stages
+            const job = await this.waitForJob(queued.events_url, (progress) => {
+                uploadButtons.forEach(btn => {
+                    const bar = btn.querySelector('.upload-progress-bar');
+                    if (bar) bar.style.width = `${50 + Math.round(progress * 20)}%`;
+                });
+            });
+            if (job.status !== 'completed') {
+                throw new Error(`Upload failed: ${job.error || 'processing error'}`);
+            }
+            const result = { success: true, document: job.result.document };
             
             if (result.success) {
                 // Update progress to 70%
@@ -190,14 +203,7 @@ class DocumentAttachmentManager {
                 
                 // Get the document details
                 // console.log('Fetching document details for ID:', result.document.id);
-                const docResponse = await fetch(`/api/document/${this.privacyChat.currentSession || 1}/${result.document.id}`);
-                
-                if (!docResponse.ok) {
-                    console.error('Failed to fetch document details:', docResponse.status);
-                    throw new Error('Failed to get document details');
-                }
-                
-                const docData = await docResponse.json();
+                const docData = await this.fetchDocumentPages(this.privacyChat.currentSession || 1, result.document.id);
                 // console.log('Document data:', docData);
                 
                 // Store the attached document
@@ -290,6 +296,50 @@ class DocumentAttachmentManager {
         }
     }
     
+    waitForJob(eventsUrl, onProgress) {
+        // Resolve with the final job state streamed from the server
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(eventsUrl);
+            source.onmessage = (event) => {
+                const job = JSON.parse(event.data);
+                if (onProgress) onProgress(job.progress);
+                if (job.status === 'completed' || job.status === 'failed') {
+                    source.close();
+                    resolve(job);
+                }
+            };
+            source.onerror = () => {
+                source.close();
+                reject(new Error('Lost connection while processing the document'));
+            };
+        });
+    }
+    
+    async fetchDocumentPages(sessionId, docId) {
+        // Fetch the document page by page so large documents are never rendered in one response
+        let docData = null;
+        let offset = 0;
+        while (offset !== null) {
+            const docResponse = await fetch(`/api/document/${sessionId}/${docId}?views=masked&offset=${offset}&limit=${this.pageSize}`);
+            
+            if (!docResponse.ok) {
+                console.error('Failed to fetch document details:', docResponse.status);
+                throw new Error('Failed to get document details');
+            }
+            
+            const page = await docResponse.json();
+            if (docData === null) {
+                docData = page;
+            } else {
+                docData.original_text += page.original_text;
+                docData.masked_text += page.masked_text;
+                docData.entities = docData.entities.concat(page.entities);
+            }
+            offset = page.next_offset;
+        }
+        return docData;
+    }
+    
     showAttachmentIndicator() {
         if (!this.attachedDocuments || this.attachedDocuments.length === 0) return;
         
@@ -0,0 +1,14 @@
+from src.models.document_processor import DocumentProcessor
+
+
+def test_extract_from_csv_maps_cell_offsets():
+    processor = DocumentProcessor()
+    text, cell_map = processor._extract_from_csv(b"name,phone\nAli,99123456\nSa\x01ra ,  5551\n")
+
+    assert text == ("[CSV Data]\n\nname | phone\n------------\n"
+                    "Ali | 99123456\nSara | 5551\n\n[End CSV Data]")
+    assert cell_map.columns == ['name', 'phone']
+    assert cell_map.row_count == 2
+    cells = ['Ali', '99123456', 'Sara', '5551']
+    assert [text[offset:offset + len(cell)] for offset, cell in zip(cell_map.offsets, cells)] == cells
+    assert cell_map.cell_at(text.index('99123456') + 3) == (1, 1)